@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+说话人时间段与转写片段的对齐
+转写片段只按开始时间排序一次并建立索引，每个说话人时间段通过二分查找定位候选片段，
+重叠时长和重叠比例用NumPy批量计算，不再对每个时间段扫描全部转写片段。
+匹配规则与 find_matching_transcript 完全一致
+"""
+
+import argparse
+import random
+import time
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+# 单批计算的最大候选对数，避免超长片段导致候选对过多时占用过多内存
+MAX_PAIRS_PER_BATCH = 1 << 20
+
+
+def find_matching_transcript(segment_start, segment_end, transcript_segments, overlap_threshold=0.3):
+    """查找与时间段匹配的转写内容，使用重叠度阈值（逐个扫描的参考实现）"""
+    matching_texts = []
+    total_overlap = 0
+
+    for seg in transcript_segments:
+        seg_start = seg['start']
+        seg_end = seg['end']
+
+        # 计算重叠时间
+        overlap_start = max(segment_start, seg_start)
+        overlap_end = min(segment_end, seg_end)
+        overlap_duration = max(0, overlap_end - overlap_start)
+
+        # 计算重叠比例
+        segment_duration = segment_end - segment_start
+        seg_duration = seg_end - seg_start
+
+        if overlap_duration > 0:
+            # 计算重叠比例
+            overlap_ratio = overlap_duration / min(segment_duration, seg_duration)
+
+            # 如果重叠比例超过阈值，认为匹配
+            if overlap_ratio >= overlap_threshold:
+                matching_texts.append({
+                    'text': seg.get('text', ''),
+                    'overlap_ratio': overlap_ratio,
+                    'overlap_duration': overlap_duration,
+                    'seg_start': seg_start,
+                    'seg_end': seg_end
+                })
+                total_overlap += overlap_duration
+
+    # 按重叠比例排序，优先选择重叠度高的
+    matching_texts.sort(key=lambda x: x['overlap_ratio'], reverse=True)
+
+    # 返回匹配的文本
+    if matching_texts:
+        return ' '.join([item['text'] for item in matching_texts]), total_overlap
+    else:
+        return '', 0
+
+
+def _expand_pairs(lo: np.ndarray, counts: np.ndarray, first: int = 0):
+    """将每个查询的候选范围 [lo, lo + count) 展开为 (查询下标, 候选位置) 数组"""
+    total = int(counts.sum())
+    query = np.repeat(np.arange(first, first + len(counts)), counts)
+    offsets = np.cumsum(counts) - counts
+    pos = np.repeat(lo - offsets, counts) + np.arange(total)
+    return query, pos
+
+
+class IntervalIndex:
+    """区间索引：按开始时间排序，并记录结束时间的前缀最大值"""
+
+    def __init__(self, starts, ends):
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+
+        # 稳定排序，保留原始下标用于还原原始顺序
+        self._order = np.argsort(starts, kind='stable')
+        self._starts = starts[self._order]
+        self._ends = ends[self._order]
+        # 前缀最大结束时间单调不减，可以二分查找第一个可能与查询区间重叠的区间
+        self._max_ends = np.maximum.accumulate(self._ends) if len(self._ends) else self._ends
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _candidates(self, query_starts: np.ndarray, query_ends: np.ndarray):
+        """返回每个查询区间的候选范围 [lo, hi)（排序后的位置）"""
+        # 开始时间早于查询区间结束的区间
+        hi = np.searchsorted(self._starts, query_ends, side='left')
+        # 跳过之前所有区间都已在查询区间开始前结束的部分
+        lo = np.searchsorted(self._max_ends, query_starts, side='right')
+        return lo, np.maximum(hi, lo)
+
+
+class TranscriptIndex(IntervalIndex):
+    """转写片段的区间索引"""
+
+    def __init__(self, transcript_segments: List[Dict[str, Any]]):
+        """
+        建立索引
+
+        Args:
+            transcript_segments: Whisper转写片段列表 [{'start', 'end', 'text', ...}]
+        """
+        super().__init__(
+            [seg['start'] for seg in transcript_segments],
+            [seg['end'] for seg in transcript_segments]
+        )
+        self.texts = [seg.get('text', '') for seg in transcript_segments]
+
+    def match(self, turns: List[Tuple[float, float]], overlap_threshold: float = 0.3) -> List[Tuple[str, float]]:
+        """
+        批量查找每个时间段匹配的转写内容
+
+        Args:
+            turns: 说话人时间段 [(start, end)]
+            overlap_threshold: 重叠比例阈值，重叠时长除以两者中较短的时长
+
+        Returns:
+            与 turns 一一对应的 [(匹配文本, 总重叠时长)]，结果与 find_matching_transcript 相同
+        """
+        results = [('', 0)] * len(turns)
+        if not turns or not len(self):
+            return results
+
+        turn_starts = np.array([start for start, _ in turns], dtype=np.float64)
+        turn_ends = np.array([end for _, end in turns], dtype=np.float64)
+        lo, hi = self._candidates(turn_starts, turn_ends)
+        counts = hi - lo
+
+        # 按候选对数量分批，每批内全部候选对一次性计算
+        cumulative = np.cumsum(counts)
+        first = 0
+        while first < len(turns):
+            base = cumulative[first - 1] if first else 0
+            last = int(np.searchsorted(cumulative, base + MAX_PAIRS_PER_BATCH, side='right'))
+            last = max(last, first + 1)
+            self._match_batch(turn_starts, turn_ends, lo, counts, first, min(last, len(turns)),
+                              overlap_threshold, results)
+            first = last
+
+        return results
+
+    def _match_batch(self, turn_starts, turn_ends, lo, counts, first, last, overlap_threshold, results):
+        """计算 [first, last) 范围内时间段的全部候选对并写入结果"""
+        batch_counts = counts[first:last]
+        total = int(batch_counts.sum())
+        if total == 0:
+            return
+
+        # 展开候选对：(时间段下标, 片段在排序后数组中的位置)
+        pair_turn, pair_pos = _expand_pairs(lo[first:last], batch_counts, first)
+
+        seg_starts = self._starts[pair_pos]
+        seg_ends = self._ends[pair_pos]
+        ts = turn_starts[pair_turn]
+        te = turn_ends[pair_turn]
+
+        overlap = np.minimum(te, seg_ends) - np.maximum(ts, seg_starts)
+        keep = overlap > 0
+        ratio = np.zeros_like(overlap)
+        ratio[keep] = overlap[keep] / np.minimum(te - ts, seg_ends - seg_starts)[keep]
+        keep &= ratio >= overlap_threshold
+        if not keep.any():
+            return
+
+        pair_turn = pair_turn[keep]
+        pair_index = self._order[pair_pos[keep]]
+        overlap = overlap[keep]
+        ratio = ratio[keep]
+
+        # 按 (时间段, 原始转写顺序) 排列，与逐个扫描时的累加顺序一致
+        order = np.lexsort((pair_index, pair_turn))
+        pair_turn = pair_turn[order].tolist()
+        pair_index = pair_index[order].tolist()
+        overlap = overlap[order].tolist()
+        ratio = ratio[order].tolist()
+
+        start = 0
+        while start < len(pair_turn):
+            turn = pair_turn[start]
+            end = start
+            total_overlap = 0
+            while end < len(pair_turn) and pair_turn[end] == turn:
+                total_overlap += overlap[end]
+                end += 1
+            # 稳定排序：重叠比例相同时保持原始转写顺序
+            matches = sorted(range(start, end), key=lambda k: ratio[k], reverse=True)
+            results[turn] = (' '.join(self.texts[pair_index[k]] for k in matches), total_overlap)
+            start = end
+
+
+def assign_words_to_speakers(words: List[Dict[str, Any]],
+                             speaker_segments: Dict[str, list]) -> List[Tuple[Any, float]]:
+    """
+    将每个词分配给重叠时长最大的说话人时间段，一次性批量计算
+
+    与任何时间段都不重叠的词（如落在两个时间段之间的间隙里）分配给时间上最近的时间段
+
+    Args:
+        words: Whisper词级时间戳 [{'word', 'start', 'end', ...}]
+        speaker_segments: {说话人: [{'start', 'end', ...}]}
+
+    Returns:
+        与 words 一一对应的 [(说话人, 重叠时长)]，没有任何说话人时间段时说话人为 None
+    """
+    speakers = [speaker for speaker, segments in speaker_segments.items() for _ in segments]
+    if not words or not speakers:
+        return [(None, 0.0)] * len(words)
+
+    turns = IntervalIndex(
+        [seg['start'] for segments in speaker_segments.values() for seg in segments],
+        [seg['end'] for segments in speaker_segments.values() for seg in segments]
+    )
+    word_starts = np.array([word['start'] for word in words], dtype=np.float64)
+    word_ends = np.array([word['end'] for word in words], dtype=np.float64)
+
+    assigned = np.full(len(words), -1, dtype=np.int64)
+    assigned_overlap = np.zeros(len(words), dtype=np.float64)
+
+    lo, hi = turns._candidates(word_starts, word_ends)
+    pair_word, pair_pos = _expand_pairs(lo, hi - lo)
+    if len(pair_word):
+        overlap = np.minimum(word_ends[pair_word], turns._ends[pair_pos]) - \
+            np.maximum(word_starts[pair_word], turns._starts[pair_pos])
+        # 每个词按重叠时长降序取第一个，重叠相同时取开始较早的时间段
+        order = np.lexsort((pair_pos, -overlap, pair_word))
+        pair_word, pair_pos, overlap = pair_word[order], pair_pos[order], overlap[order]
+        best = np.ones(len(pair_word), dtype=bool)
+        best[1:] = pair_word[1:] != pair_word[:-1]
+        best &= overlap > 0
+        assigned[pair_word[best]] = pair_pos[best]
+        assigned_overlap[pair_word[best]] = overlap[best]
+
+    # 没有重叠的词：比较之前结束最晚的时间段和之后最近开始的时间段
+    missing = np.flatnonzero(assigned < 0)
+    if len(missing):
+        middle = (word_starts[missing] + word_ends[missing]) / 2
+        following = np.searchsorted(turns._starts, middle, side='left')
+        preceding = following - 1
+        # 前缀中结束最晚的时间段位置，结束时间相同时取开始较早的时间段（与有重叠时的规则一致）
+        is_record = np.ones(len(turns), dtype=bool)
+        is_record[1:] = turns._ends[1:] > turns._max_ends[:-1]
+        latest = np.maximum.accumulate(np.where(is_record, np.arange(len(turns)), 0))
+
+        after = np.where(following < len(turns),
+                         turns._starts[np.minimum(following, len(turns) - 1)] - middle, np.inf)
+        before_pos = latest[np.maximum(preceding, 0)]
+        before = np.where(preceding >= 0, middle - turns._ends[before_pos], np.inf)
+        assigned[missing] = np.where(before <= after, before_pos, np.minimum(following, len(turns) - 1))
+
+    speaker_of = [speakers[i] for i in turns._order.tolist()]
+    return [(speaker_of[pos], overlap) for pos, overlap in zip(assigned.tolist(), assigned_overlap.tolist())]
+
+
+def word_level_transcripts(asr_segments: List[Dict[str, Any]], speaker_segments: Dict[str, list],
+                           max_gap: float = 1.0) -> Dict[str, list]:
+    """
+    词级说话人归属：逐词分配说话人后，把同一说话人连续的词重新拼成语句
+
+    每个词只属于一个说话人，不会出现同一段文字被分给多个说话人、再靠去重清理的情况
+
+    Args:
+        asr_segments: 带 words 字段的Whisper转写片段
+        speaker_segments: {说话人: [{'start', 'end', ...}]}
+        max_gap: 同一说话人相邻两个词之间超过该间隔（秒）时断开为新的语句
+
+    Returns:
+        {说话人: [{'start', 'end', 'text', 'duration', 'overlap_duration', 'overlap_ratio'}]}
+    """
+    words = [word for seg in asr_segments for word in seg.get('words') or []]
+    assignment = assign_words_to_speakers(words, speaker_segments)
+
+    speaker_transcripts = {}
+    current = None
+    for word, (speaker, overlap) in zip(words, assignment):
+        if speaker is None:
+            continue
+        if current and current['speaker'] == speaker and word['start'] - current['end'] <= max_gap:
+            current['end'] = max(current['end'], word['end'])
+            current['words'].append(word['word'])
+            current['overlap_duration'] += overlap
+            continue
+        current = {'speaker': speaker, 'start': word['start'], 'end': word['end'],
+                   'words': [word['word']], 'overlap_duration': overlap}
+        speaker_transcripts.setdefault(speaker, []).append(current)
+
+    for speaker, utterances in speaker_transcripts.items():
+        speaker_transcripts[speaker] = [
+            {
+                'start': utt['start'],
+                'end': utt['end'],
+                'text': ''.join(utt['words']).strip(),
+                'duration': utt['end'] - utt['start'],
+                'overlap_duration': utt['overlap_duration'],
+                'overlap_ratio': utt['overlap_duration'] / (utt['end'] - utt['start']) if utt['end'] > utt['start'] else 0
+            }
+            for utt in utterances
+        ]
+    return speaker_transcripts
+
+
+def benchmark(num_turns: int = 10000, num_segments: int = 10000, reference_turns: int = 1000,
+              overlap_threshold: float = 0.3, seed: int = 0) -> Dict[str, Any]:
+    """
+    对齐性能测试：随机生成说话人时间段和转写片段，比较索引对齐与逐个扫描的耗时
+
+    逐个扫描在 10k×10k 规模下过慢，只对前 reference_turns 个时间段运行并按比例估算总耗时，
+    同时校验这部分结果完全一致
+
+    Returns:
+        {'index_seconds', 'reference_seconds', 'reference_estimated_seconds', 'speedup', 'identical'}
+    """
+    rng = random.Random(seed)
+
+    def timeline(count, mean_duration):
+        segments = []
+        t = 0.0
+        for i in range(count):
+            t += rng.uniform(0, 1.0)
+            duration = rng.uniform(0.2, 2 * mean_duration)
+            segments.append({'start': t, 'end': t + duration, 'text': f'片段{i}'})
+            t += duration * rng.uniform(0.5, 1.0)
+        return segments
+
+    turns = [(seg['start'], seg['end']) for seg in timeline(num_turns, 3.0)]
+    asr_segments = timeline(num_segments, 3.0)
+
+    started = time.perf_counter()
+    index = TranscriptIndex(asr_segments)
+    results = index.match(turns, overlap_threshold)
+    index_seconds = time.perf_counter() - started
+
+    sample = turns[:reference_turns]
+    started = time.perf_counter()
+    reference = [find_matching_transcript(start, end, asr_segments, overlap_threshold) for start, end in sample]
+    reference_seconds = time.perf_counter() - started
+    estimated = reference_seconds * len(turns) / max(1, len(sample))
+
+    return {
+        'index_seconds': index_seconds,
+        'reference_seconds': reference_seconds,
+        'reference_estimated_seconds': estimated,
+        'speedup': estimated / index_seconds if index_seconds > 0 else float('inf'),
+        'identical': reference == results[:len(sample)]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="说话人对齐性能测试")
+    parser.add_argument("--turns", type=int, default=10000, help="说话人时间段数量")
+    parser.add_argument("--segments", type=int, default=10000, help="转写片段数量")
+    parser.add_argument("--reference-turns", type=int, default=1000, help="逐个扫描参考实现运行的时间段数量")
+    args = parser.parse_args()
+
+    stats = benchmark(args.turns, args.segments, args.reference_turns)
+    print(f"📊 {args.turns} 个时间段 × {args.segments} 个转写片段")
+    print(f"索引对齐: {stats['index_seconds']:.3f}秒")
+    print(f"逐个扫描: {stats['reference_seconds']:.3f}秒 ({args.reference_turns} 个时间段)，"
+          f"估算全部 {stats['reference_estimated_seconds']:.1f}秒")
+    print(f"加速比: {stats['speedup']:.0f}x")
+    print(f"结果一致: {'✅' if stats['identical'] else '❌'}")
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+语音识别后端
+转写阶段通过统一接口调用不同的Whisper实现，返回与 openai-whisper 相同结构的结果：
+
+    openai-whisper   官方PyTorch实现，支持GPU；CPU上 compute_type="int8" 时做动态int8量化
+    faster-whisper   基于CTranslate2的实现，CPU上使用int8量化，速度通常快数倍
+
+内置性能测试比较各后端在同一音频上的实时率（RTF）和词错误率（WER/CER）：
+
+    python asr_backends.py fixture.wav --reference fixture.txt --backends openai-whisper faster-whisper
+"""
+
+import argparse
+import time
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+try:
+    from faster_whisper import WhisperModel
+    FASTER_WHISPER_AVAILABLE = True
+except ImportError:
+    FASTER_WHISPER_AVAILABLE = False
+
+DEFAULT_BACKEND = "openai-whisper"
+SAMPLE_RATE = 16000
+
+
+class ASRBackend:
+    """语音识别后端接口"""
+
+    name = None
+
+    def __init__(self, model_size: str, device: Optional[str] = None, cpu_threads: int = 0):
+        """
+        Args:
+            model_size: Whisper模型大小
+            device: 运行设备，为None时自动选择
+            cpu_threads: CPU推理线程数，0表示使用默认值
+        """
+        self.model_size = model_size
+        self.device = device
+        self.cpu_threads = cpu_threads
+        self.model = None
+
+    @classmethod
+    def version(cls) -> str:
+        """后端库的版本，用于结果缓存的键"""
+        raise NotImplementedError
+
+    def load(self):
+        """加载模型（幂等）"""
+        raise NotImplementedError
+
+    def transcribe(self, audio, progress: Optional[Callable] = None, **options) -> Dict[str, Any]:
+        """
+        转写音频
+
+        Args:
+            audio: 16kHz单声道float32波形或音频文件路径
+            progress: 进度回调 progress(fraction)，fraction 为已转写音频的比例
+            **options: 转写参数，与 whisper transcribe 的参数同名
+
+        Returns:
+            {'text': 完整文本, 'segments': 与 openai-whisper 结构相同的片段列表}
+        """
+        raise NotImplementedError
+
+
+class OpenAIWhisperBackend(ASRBackend):
+    """openai-whisper 官方实现"""
+
+    name = "openai-whisper"
+
+    def __init__(self, model_size: str, device: Optional[str] = None, cpu_threads: int = 0,
+                 compute_type: Optional[str] = None):
+        """
+        Args:
+            cpu_threads: 不在此处生效：torch 线程数是进程级设置，多个工作线程各自设置会互相覆盖，
+                由调用方通过 cpu_inference.configure_threads 配置
+            compute_type: 为 "int8" 且在CPU上运行时对线性层做动态int8量化，其他取值使用fp32
+        """
+        super().__init__(model_size, device, cpu_threads)
+        self.compute_type = compute_type
+
+    @classmethod
+    def version(cls) -> str:
+        import whisper
+        return getattr(whisper, '__version__', 'unknown')
+
+    def load(self):
+        if self.model is None:
+            import torch
+            import whisper
+
+            self.device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+            model = whisper.load_model(self.model_size, device=self.device)
+            if self.device == "cpu" and self.compute_type == "int8":
+                from cpu_inference import quantize_whisper
+                model = quantize_whisper(model)
+            self.model = model
+        return self.model
+
+    def transcribe(self, audio, progress: Optional[Callable] = None, **options) -> Dict[str, Any]:
+        model = self.load()
+        if progress is None:
+            return model.transcribe(audio, **options)
+
+        from pipeline_events import whisper_progress
+        with whisper_progress(progress):
+            return model.transcribe(audio, **options)
+
+
+class FasterWhisperBackend(ASRBackend):
+    """基于CTranslate2的 faster-whisper，CPU上默认使用int8量化"""
+
+    name = "faster-whisper"
+
+    # whisper transcribe 参数名到 faster-whisper 参数名的映射，未列出的参数不传递
+    OPTION_NAMES = {
+        'language': 'language',
+        'task': 'task',
+        'initial_prompt': 'initial_prompt',
+        'word_timestamps': 'word_timestamps',
+        'condition_on_previous_text': 'condition_on_previous_text',
+        'temperature': 'temperature',
+        'beam_size': 'beam_size',
+        'best_of': 'best_of',
+        'compression_ratio_threshold': 'compression_ratio_threshold',
+        'logprob_threshold': 'log_prob_threshold',
+        'no_speech_threshold': 'no_speech_threshold'
+    }
+
+    def __init__(self, model_size: str, device: Optional[str] = None, cpu_threads: int = 0,
+                 compute_type: Optional[str] = None):
+        """
+        Args:
+            compute_type: CTranslate2计算精度，默认CPU上为 int8，GPU上为 int8_float16
+        """
+        super().__init__(model_size, device, cpu_threads)
+        self.compute_type = compute_type
+
+    @classmethod
+    def version(cls) -> str:
+        if not FASTER_WHISPER_AVAILABLE:
+            return 'unavailable'
+        import faster_whisper
+        return getattr(faster_whisper, '__version__', 'unknown')
+
+    def load(self):
+        if self.model is None:
+            if not FASTER_WHISPER_AVAILABLE:
+                raise RuntimeError("faster-whisper 未安装，请运行: pip install faster-whisper")
+            if self.device is None:
+                try:
+                    import torch
+                    self.device = "cuda" if torch.cuda.is_available() else "cpu"
+                except ImportError:
+                    self.device = "cpu"
+            compute_type = self.compute_type or ("int8_float16" if self.device == "cuda" else "int8")
+            self.model = WhisperModel(self.model_size, device=self.device, compute_type=compute_type,
+                                      cpu_threads=self.cpu_threads)
+        return self.model
+
+    def transcribe(self, audio, progress: Optional[Callable] = None, **options) -> Dict[str, Any]:
+        model = self.load()
+        kwargs = {self.OPTION_NAMES[k]: v for k, v in options.items() if k in self.OPTION_NAMES and v is not None}
+        # openai-whisper 的 transcribe 默认贪心解码，保持一致
+        kwargs.setdefault('beam_size', 1)
+
+        segments_iter, info = model.transcribe(audio, **kwargs)
+        segments = []
+        # faster-whisper 按片段惰性解码，逐段转换为 openai-whisper 的结构
+        for seg in segments_iter:
+            segment = {
+                'id': len(segments),
+                'seek': seg.seek,
+                'start': seg.start,
+                'end': seg.end,
+                'text': seg.text,
+                'tokens': list(seg.tokens),
+                'temperature': seg.temperature,
+                'avg_logprob': seg.avg_logprob,
+                'compression_ratio': seg.compression_ratio,
+                'no_speech_prob': seg.no_speech_prob
+            }
+            if seg.words is not None:
+                segment['words'] = [
+                    {'word': w.word, 'start': w.start, 'end': w.end, 'probability': w.probability}
+                    for w in seg.words
+                ]
+            segments.append(segment)
+            if progress and info.duration:
+                progress(min(1.0, seg.end / info.duration))
+
+        return {
+            'text': "".join(seg['text'] for seg in segments),
+            'segments': segments,
+            'language': info.language
+        }
+
+
+BACKENDS = {
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend
+}
+
+
+def create_backend(name: str, model_size: str, **kwargs) -> ASRBackend:
+    """
+    按名称创建语音识别后端
+
+    Args:
+        name: 后端名称 ("openai-whisper", "faster-whisper")
+        model_size: Whisper模型大小
+        **kwargs: 传给后端构造函数的参数（device, cpu_threads, compute_type）
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的语音识别后端: {name}，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_size, **kwargs)
+
+
+# =================== 性能测试 ===================
+def _tokenize(text: str) -> List[str]:
+    """中日韩文字按字切分（计算CER），其他文字按空格切分（计算WER），忽略标点"""
+    tokens = []
+    word = []
+    for ch in text.lower():
+        if '一' <= ch <= '鿿' or '぀' <= ch <= 'ヿ' or '가' <= ch <= '힯':
+            if word:
+                tokens.append(''.join(word))
+                word = []
+            tokens.append(ch)
+        elif ch.isalnum() or ch == "'":
+            word.append(ch)
+        elif word:
+            tokens.append(''.join(word))
+            word = []
+    if word:
+        tokens.append(''.join(word))
+    return tokens
+
+
+def error_rate(reference: str, hypothesis: str) -> float:
+    """编辑距离 / 参考文本长度（中文按字即CER，英文按词即WER）"""
+    ref = _tokenize(reference)
+    hyp = _tokenize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, start=1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, start=1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def benchmark(audio_file: str, reference: Optional[str] = None, backends: Optional[List[str]] = None,
+              model_size: str = "small", language: str = "zh", **backend_kwargs) -> List[Dict[str, Any]]:
+    """
+    比较各后端的实时率和错误率
+
+    Args:
+        audio_file: 测试音频
+        reference: 参考文本，为None时只统计速度
+        backends: 要比较的后端名称，默认全部可用后端
+        model_size: Whisper模型大小
+        language: 识别语言
+
+    Returns:
+        [{'backend', 'load_seconds', 'seconds', 'rtf', 'error_rate', 'text'}]
+    """
+    from audio_loader import load_audio
+
+    waveform = load_audio(audio_file)
+    duration = len(waveform) / SAMPLE_RATE
+    if backends is None:
+        backends = [name for name in BACKENDS if name != FasterWhisperBackend.name or FASTER_WHISPER_AVAILABLE]
+
+    results = []
+    for name in backends:
+        backend = create_backend(name, model_size, **backend_kwargs)
+        started = time.perf_counter()
+        backend.load()
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        result = backend.transcribe(np.asarray(waveform, dtype=np.float32), language=language,
+                                    task="transcribe", fp16=False, verbose=None)
+        seconds = time.perf_counter() - started
+
+        results.append({
+            'backend': name,
+            'load_seconds': load_seconds,
+            'seconds': seconds,
+            'rtf': seconds / duration if duration else 0.0,
+            'error_rate': error_rate(reference, result['text']) if reference is not None else None,
+            'text': result['text']
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="语音识别后端性能测试（实时率和错误率）")
+    parser.add_argument("audio", help="测试音频文件")
+    parser.add_argument("--reference", "-r", help="参考文本文件（UTF-8），提供时计算错误率")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), help="要比较的后端，默认全部可用后端")
+    parser.add_argument("--model-size", default="small", help="Whisper模型大小 (默认: small)")
+    parser.add_argument("--language", default="zh", help="识别语言 (默认: zh)")
+    parser.add_argument("--compute-type", help="faster-whisper 计算精度 (默认: CPU上int8)")
+    parser.add_argument("--threads", type=int, default=0, help="CPU推理线程数")
+    args = parser.parse_args()
+
+    reference_text = None
+    if args.reference:
+        with open(args.reference, 'r', encoding='utf-8') as f:
+            reference_text = f.read()
+
+    if args.threads and OpenAIWhisperBackend.name in (args.backends or BACKENDS):
+        # 命令行测试在单个进程中依次运行各后端，可以直接设置进程级的torch线程数
+        from cpu_inference import configure_threads
+        configure_threads(args.threads)
+
+    stats = benchmark(args.audio, reference_text, args.backends, args.model_size, args.language,
+                      compute_type=args.compute_type, cpu_threads=args.threads)
+
+    print(f"\n📊 {args.audio}（模型: {args.model_size}）")
+    print(f"{'后端':<16}{'加载(秒)':>10}{'转写(秒)':>10}{'RTF':>8}{'错误率':>10}")
+    for item in stats:
+        error = f"{item['error_rate']:.2%}" if item['error_rate'] is not None else "-"
+        print(f"{item['backend']:<16}{item['load_seconds']:>10.1f}{item['seconds']:>10.1f}{item['rtf']:>8.3f}{error:>10}")
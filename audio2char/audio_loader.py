@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频解码模块
+将任意格式的音频一次性解码为 16kHz 单声道 float32 波形，
+解码结果直接在内存中交给 Whisper 和 pyannote，不再落地中间 wav 文件。
+优先使用 ffmpeg 流式解码：按固定大小的块写入预分配（或内存映射）的输出数组，
+峰值内存只与输出大小相关，不会在内存中保留整段原始音频的多份拷贝
+"""
+
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 10  # 流式解码每次读取的时长
+
+
+def get_file_format(filename: str) -> str:
+    """获取文件格式"""
+    ext = os.path.splitext(filename)[1].lower()
+    format_map = {
+        '.wav': 'wav',
+        '.mp3': 'mp3',
+        '.m4a': 'm4a',
+        '.flac': 'flac',
+        '.aac': 'aac',
+        '.ogg': 'ogg'
+    }
+    return format_map.get(ext, 'wav')
+
+
+def probe_wav(audio_file: str) -> Optional[Dict[str, Any]]:
+    """
+    只读取 wav 文件头，获取采样率、声道数和位深
+
+    Returns:
+        {'sample_rate', 'channels', 'sample_width', 'frames'}，非PCM wav返回None
+    """
+    try:
+        with wave.open(audio_file, 'rb') as wf:
+            return {
+                'sample_rate': wf.getframerate(),
+                'channels': wf.getnchannels(),
+                'sample_width': wf.getsampwidth(),
+                'frames': wf.getnframes()
+            }
+    except (wave.Error, EOFError, OSError):
+        return None
+
+
+def pcm16_to_float32(pcm: bytes) -> np.ndarray:
+    """将 16bit PCM 字节转换为 [-1, 1) 区间的 float32 波形"""
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def probe_duration(audio_file: str) -> Optional[float]:
+    """使用ffprobe读取音频时长（秒），失败返回None"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", audio_file],
+            capture_output=True, text=True
+        )
+        return float(result.stdout.strip()) if result.returncode == 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def _allocate(num_samples: int, memmap_path: Optional[str] = None) -> np.ndarray:
+    """预分配输出数组，指定 memmap_path 时使用磁盘内存映射"""
+    num_samples = max(1, num_samples)
+    if memmap_path:
+        return np.memmap(memmap_path, dtype=np.float32, mode='w+', shape=(num_samples,))
+    return np.empty(num_samples, dtype=np.float32)
+
+
+def _grow(out: np.ndarray, used: int, required: int, memmap_path: Optional[str] = None) -> np.ndarray:
+    """时长估计不足时扩容输出数组，保留已写入的数据"""
+    capacity = max(required, len(out) * 2)
+    if memmap_path:
+        out.flush()
+        del out
+        with open(memmap_path, 'r+b') as f:
+            f.truncate(capacity * 4)
+        return np.memmap(memmap_path, dtype=np.float32, mode='r+', shape=(capacity,))
+    grown = np.empty(capacity, dtype=np.float32)
+    grown[:used] = out[:used]
+    return grown
+
+
+def _stream_pcm16(read, expected_samples: Optional[int] = None,
+                  memmap_path: Optional[str] = None) -> np.ndarray:
+    """
+    从 16bit PCM 字节流分块读取，直接转换写入预分配的 float32 数组
+
+    Args:
+        read: read(n_bytes) -> bytes，读到末尾时返回空
+        expected_samples: 预计采样点数，用于一次性分配输出数组
+        memmap_path: 指定时输出写入内存映射文件
+
+    Returns:
+        一维 float32 数组（预分配数组的切片，不额外拷贝）
+    """
+    chunk_bytes = CHUNK_SECONDS * SAMPLE_RATE * 2
+    out = _allocate(expected_samples or CHUNK_SECONDS * SAMPLE_RATE * 6, memmap_path)
+    scale = np.float32(1.0 / 32768.0)
+    used = 0
+    leftover = b''
+
+    while True:
+        data = read(chunk_bytes)
+        if not data:
+            break
+        if leftover:
+            data = leftover + data
+        usable = len(data) - len(data) % 2
+        leftover = data[usable:]
+
+        samples = np.frombuffer(data, dtype=np.int16, count=usable // 2)
+        if used + len(samples) > len(out):
+            out = _grow(out, used, used + len(samples), memmap_path)
+        np.multiply(samples, scale, out=out[used:used + len(samples)])
+        used += len(samples)
+
+    if memmap_path:
+        out.flush()
+    return out[:used]
+
+
+def _read_wav_direct(audio_file: str, memmap_path: Optional[str] = None) -> np.ndarray:
+    """直接分块读取已符合要求的 16kHz 单声道 16bit wav，无需重新解码"""
+    with wave.open(audio_file, 'rb') as wf:
+        return _stream_pcm16(lambda n: wf.readframes(n // 2), wf.getnframes(), memmap_path)
+
+
+def _decode_with_ffmpeg_stream(audio_file: str, memmap_path: Optional[str] = None) -> np.ndarray:
+    """ffmpeg解码并重采样为 16kHz 单声道 16bit PCM，通过管道流式读入输出数组"""
+    duration = probe_duration(audio_file)
+    # 多预留1秒，避免重采样带来的长度误差触发扩容
+    expected_samples = math.ceil((duration + 1) * SAMPLE_RATE) if duration else None
+
+    cmd = [
+        "ffmpeg", "-nostdin", "-i", audio_file,
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-acodec", "pcm_s16le",
+        "-loglevel", "error", "-"
+    ]
+    # 错误输出写入临时文件：若用管道而只在标准输出读完后才读取，损坏的输入产生大量警告时
+    # ffmpeg 会因错误输出管道写满而阻塞，这里又在等待标准输出，解码就此死锁
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file) as process:
+            waveform = _stream_pcm16(process.stdout.read, expected_samples, memmap_path)
+            process.wait()
+        if process.returncode != 0:
+            stderr_file.seek(0)
+            raise RuntimeError(stderr_file.read().decode('utf-8', errors='replace'))
+    return waveform
+
+
+def _decode_with_pydub(audio_file: str, file_format: str) -> np.ndarray:
+    """使用pydub解码并重采样"""
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(audio_file, format=file_format)
+    # 16kHz采样率、单声道、16bit，适合语音识别
+    audio = audio.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    return pcm16_to_float32(audio.raw_data)
+
+
+def _decode_with_command(cmd: list) -> np.ndarray:
+    """运行外部解码命令，从标准输出读取 16kHz 单声道 16bit 原始PCM"""
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', errors='replace'))
+    return pcm16_to_float32(result.stdout)
+
+
+def load_audio(audio_file: str, memmap_path: Optional[str] = None) -> np.ndarray:
+    """
+    将音频解码为 16kHz 单声道 float32 波形，支持多种输入格式
+
+    Args:
+        audio_file: 音频文件路径
+        memmap_path: 指定时将波形写入该内存映射文件，适合超长录音
+
+    Returns:
+        一维 float32 NumPy 数组
+    """
+    print("正在解码音频...")
+
+    file_format = get_file_format(audio_file)
+    print(f"检测到文件格式：{file_format}")
+
+    # 先探测文件头，已经是 16kHz 单声道 16bit 的wav直接读取
+    if file_format == 'wav':
+        info = probe_wav(audio_file)
+        if info and info['sample_rate'] == SAMPLE_RATE and info['channels'] == 1 and info['sample_width'] == 2:
+            print("现有wav文件已符合要求，直接读取")
+            return _read_wav_direct(audio_file, memmap_path)
+
+    if shutil.which("ffmpeg"):
+        try:
+            # 使用ffmpeg流式解码，峰值内存只与输出大小相关
+            print("使用ffmpeg流式解码...")
+            waveform = _decode_with_ffmpeg_stream(audio_file, memmap_path)
+            print(f"音频解码完成：{len(waveform) / SAMPLE_RATE:.1f}秒")
+            return waveform
+        except Exception as e:
+            print(f"ffmpeg解码失败：{e}")
+
+    try:
+        # 备用方案：使用pydub解码（整段音频驻留内存）
+        print("使用pydub进行音频解码...")
+        waveform = _decode_with_pydub(audio_file, file_format)
+        print(f"音频解码完成：{len(waveform) / SAMPLE_RATE:.1f}秒")
+        return waveform
+    except Exception as e:
+        print(f"pydub解码失败：{e}")
+
+    print("尝试使用sox解码...")
+    try:
+        # 备用方案：使用sox
+        waveform = _decode_with_command([
+            "sox", audio_file, "-t", "raw", "-r", str(SAMPLE_RATE), "-c", "1",
+            "-e", "signed-integer", "-b", "16", "-"
+        ])
+        print("sox解码成功")
+        return waveform
+    except Exception as e:
+        print(f"sox解码失败：{e}")
+
+    print("所有解码方法都失败，请确保安装了ffmpeg或sox")
+    raise RuntimeError("所有解码方法都失败，请确保安装了ffmpeg或sox")
@@ -5,18 +5,17 @@
 整合了音频处理和Web界面功能
 """
 
+import asyncio
 import os
 import sys
 import json
 import shutil
-import subprocess
 import threading
 import zipfile
-import re
-from datetime import datetime
+import uuid
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify, render_template, send_file
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from werkzeug.utils import secure_filename
 
 # 加载配置文件
@@ -29,6 +28,14 @@ try:
 except ImportError:
     LOCAL_MODEL_AVAILABLE = False
 
+from model_server import ModelServer, QueueFullError
+from staged_executor import Stage
+from cache import get_cache
+from streaming import StreamingTranscriber
+from audio_loader import SAMPLE_RATE
+from make_grapth import generate_mindmap, agenerate_mindmap
+from http_session import run_async, AIOHTTP_AVAILABLE, DEFAULT_MAX_CONCURRENCY
+
 class AudioProcessor:
     """音频处理和思维导图生成的控制器"""
     
@@ -37,6 +44,7 @@ class AudioProcessor:
         self.graph_script = "make_grapth.py"
         self.output_dir = None
         self.summary_file = None
+        self.mindmap_file = None
         
         # 本地模型配置
         self.use_local_model = os.getenv("USE_LOCAL_MODEL", "false").lower() == "true"
@@ -59,36 +67,59 @@ class AudioProcessor:
         latest_dir = max(transcript_dirs, key=os.path.getctime)
         return latest_dir
     
-    def set_local_model_env(self):
-        """设置本地模型环境变量"""
-        if self.use_local_model and LOCAL_MODEL_AVAILABLE:
-            os.environ["USE_LOCAL_MODEL"] = "true"
-            os.environ["LOCAL_MODEL_TYPE"] = self.local_model_type
-            os.environ["LOCAL_MODEL_NAME"] = self.local_model_name
-        else:
-            os.environ["USE_LOCAL_MODEL"] = "false"
+    def local_model_settings(self):
+        """传给 generate_mindmap() 的本地模型参数"""
+        return {
+            'use_local_model': self.use_local_model,
+            'local_model_type': self.local_model_type,
+            'local_model_name': self.local_model_name
+        }
     
-    def update_graph_script_path(self, transcript_dir):
-        """更新make_grapth.py中的转写目录路径"""
+    def process_audio(self, audio_file, work_dir='.'):
+        """
+        通过常驻模型服务转写单个音频文件
+        
+        Returns:
+            是否成功，成功时 output_dir 和 summary_file 指向本次的转写结果
+        """
+        if not audio_file or not os.path.exists(audio_file):
+            print(f"❌ 音频文件不存在: {audio_file}")
+            return False
         try:
-            # 读取make_grapth.py文件
-            with open(self.graph_script, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 更新目录路径 - 使用相对路径
-            pattern = r'specific_dir = "[^"]*"'
-            replacement = f'specific_dir = "{transcript_dir}"'
-            
-            new_content = re.sub(pattern, replacement, content)
-            
-            # 写回文件
-            with open(self.graph_script, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-            
-            return True
+            result = model_server.submit(audio_file, work_dir=work_dir).future.result()
+        except Exception as e:
+            print(f"❌ 音频处理失败: {e}")
+            return False
+        self.output_dir = result['output_dir']
+        self.summary_file = result['summary_file']
+        return True
+    
+    def generate_mindmap(self, transcript_dir=None, output_path=None):
+        """
+        根据转写结果生成思维导图
+        
+        Args:
+            transcript_dir: 转写结果目录，默认使用本次处理的结果，其次为当前目录下最新的 transcripts_* 目录
+            output_path: 输出HTML路径，默认 output/mindmap.html
+        """
+        transcript_dir = transcript_dir or self.output_dir or self.find_latest_transcript_dir()
+        if not transcript_dir:
+            print("❌ 未找到转写结果目录")
+            return False
+        try:
+            self.mindmap_file = generate_mindmap(transcript_dir, output_path, **self.local_model_settings())
         except Exception as e:
-            print(f"更新脚本路径失败: {e}")
+            print(f"❌ 思维导图生成失败: {e}")
             return False
+        return True
+    
+    def run_full_pipeline(self, audio_file=None, transcript_dir=None):
+        """转写音频（未指定音频时使用已有的转写目录）并生成思维导图"""
+        if audio_file:
+            if not self.process_audio(audio_file):
+                return False
+            transcript_dir = self.output_dir
+        return self.generate_mindmap(transcript_dir)
 
 # 从配置文件读取设置
 WEB_HOST = os.getenv('WEB_HOST', '0.0.0.0')
@@ -96,18 +127,51 @@ WEB_PORT = int(os.getenv('WEB_PORT', '5000'))
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', '500'))
 SUPPORTED_FORMATS = os.getenv('SUPPORTED_FORMATS', 'wav,mp3,m4a,flac,aac,ogg').split(',')
 WHISPER_MODEL_SIZE = os.getenv('WHISPER_MODEL_SIZE', 'medium')
+ASR_BACKEND = os.getenv('ASR_BACKEND', 'openai-whisper')
+ASR_COMPUTE_TYPE = os.getenv('ASR_COMPUTE_TYPE', '') or None
+CPU_THREADS = int(os.getenv('CPU_THREADS', '0'))
+CPU_INTEROP_THREADS = int(os.getenv('CPU_INTEROP_THREADS', '0'))
+CPU_AFFINITY = os.getenv('CPU_AFFINITY', '') or None
+CONCURRENT_DIARIZATION = os.getenv('CONCURRENT_DIARIZATION', 'false').lower() == 'true'
+DIARIZATION_THREADS = int(os.getenv('DIARIZATION_THREADS', '0'))
 MIN_SPEAKERS = int(os.getenv('MIN_SPEAKERS', '2'))
 MAX_SPEAKERS = int(os.getenv('MAX_SPEAKERS', '5'))
 MIN_SEGMENT_DURATION = float(os.getenv('MIN_SEGMENT_DURATION', '0.5'))
+# 上传时允许单独选择的模型大小，例如用 small 快速出草稿
+ALLOWED_MODEL_SIZES = [size.strip() for size in os.getenv('ALLOWED_MODEL_SIZES', 'small,medium').split(',') if size.strip()]
+WORKER_COUNT = int(os.getenv('WORKER_COUNT', '1'))
+MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', '10'))
+QUEUE_POLICY = os.getenv('QUEUE_POLICY', 'fifo')
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', '1'))
+MINDMAP_WORKERS = int(os.getenv('MINDMAP_WORKERS', '2'))
+# 安装了 aiohttp 时异步调用大模型，等待响应不占用思维导图线程
+ASYNC_LLM = os.getenv('ASYNC_LLM', 'true').lower() == 'true' and AIOHTTP_AVAILABLE
+DECODE_MEMMAP = os.getenv('DECODE_MEMMAP', 'false').lower() == 'true'
+TRANSCRIBE_MODE = os.getenv('TRANSCRIBE_MODE', 'full')
+DRAFT_MODEL_SIZE = os.getenv('DRAFT_MODEL_SIZE', 'base')
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '0')) or None
+CHUNK_SECONDS = float(os.getenv('CHUNK_SECONDS', '120'))
+ASR_BATCH_SIZE = int(os.getenv('ASR_BATCH_SIZE', '8'))
+ALIGNMENT_MODE = os.getenv('ALIGNMENT_MODE', 'word')
+
+# 结果缓存配置，CACHE_DIR 为空时不缓存
+CACHE_DIR = os.getenv('CACHE_DIR', 'cache')
+CACHE_MAX_SIZE_MB = float(os.getenv('CACHE_MAX_SIZE_MB', '2048'))
+
+# 实时流式转写配置
+STREAM_MODEL_SIZE = os.getenv('STREAM_MODEL_SIZE', 'small')
+STREAM_STEP_SECONDS = float(os.getenv('STREAM_STEP_SECONDS', '2'))
+STREAM_MAX_SESSIONS = int(os.getenv('STREAM_MAX_SESSIONS', '4'))
+STREAM_SPEAKER_THRESHOLD = float(os.getenv('STREAM_SPEAKER_THRESHOLD', '0.5'))
 
 # Flask应用配置
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'audio-transcription-unified-app'
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['JOBS_FOLDER'] = 'jobs'
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE * 1024 * 1024  # MB to bytes
 
-# 创建上传目录
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# 创建任务目录，每个任务在其中拥有独立的子目录
+os.makedirs(app.config['JOBS_FOLDER'], exist_ok=True)
 
 # 初始化SocketIO
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
@@ -118,6 +182,58 @@ ALLOWED_EXTENSIONS = set(SUPPORTED_FORMATS)
 # 全局音频处理器实例
 audio_processor = AudioProcessor()
 
+# 已完成任务的结果，按任务ID索引
+job_results = {}
+
+# 常驻模型服务，模型只加载一次，任务在有界队列中排队
+model_server = ModelServer(
+    model_size=WHISPER_MODEL_SIZE,
+    num_workers=WORKER_COUNT,
+    max_queue_size=MAX_QUEUE_SIZE,
+    policy=QUEUE_POLICY,
+    decode_workers=DECODE_WORKERS,
+    decode_memmap=DECODE_MEMMAP,
+    transcribe_mode=TRANSCRIBE_MODE,
+    draft_model_size=DRAFT_MODEL_SIZE,
+    transcribe_workers=TRANSCRIBE_WORKERS,
+    chunk_seconds=CHUNK_SECONDS,
+    asr_batch_size=ASR_BATCH_SIZE,
+    alignment_mode=ALIGNMENT_MODE,
+    cache_dir=CACHE_DIR or None,
+    cache_max_size_mb=CACHE_MAX_SIZE_MB,
+    asr_backend=ASR_BACKEND,
+    asr_compute_type=ASR_COMPUTE_TYPE,
+    cpu_threads=CPU_THREADS,
+    cpu_interop_threads=CPU_INTEROP_THREADS,
+    cpu_affinity=CPU_AFFINITY,
+    concurrent_diarization=CONCURRENT_DIARIZATION,
+    diarization_threads=DIARIZATION_THREADS,
+    min_speakers=MIN_SPEAKERS,
+    max_speakers=MAX_SPEAKERS,
+    min_segment_duration=MIN_SEGMENT_DURATION
+)
+
+# 思维导图阶段：转写完成的任务在此排队调用大模型，与其他任务的解码和识别同时进行。
+# 队列已满时模型工作线程在交付结果时等待，不再继续积压
+mindmap_stage = Stage('mindmap', lambda task: process_audio_task(*task), workers=MINDMAP_WORKERS,
+                      queue_size=MAX_QUEUE_SIZE)
+# 异步调用大模型时思维导图线程交出任务后立即返回，用信号量限制同时在途的思维导图和打包任务数；
+# 名额用尽时思维导图线程等待，队列随之积压，模型工作线程交付结果时同样受到背压
+mindmap_slots = threading.BoundedSemaphore(max(1, MINDMAP_WORKERS))
+
+# 上传请求中可以单独指定的处理参数（表单字段名与 TranscriptionPipeline 的参数名一致）
+UPLOAD_SETTINGS = ('model_size', 'language', 'min_speakers', 'max_speakers', 'min_segment_duration', 'transcribe_mode')
+
+# 实时流式转写共用一份小模型，会话按SocketIO连接索引
+stream_transcriber = StreamingTranscriber(
+    model_size=STREAM_MODEL_SIZE,
+    speaker_threshold=STREAM_SPEAKER_THRESHOLD,
+    backend=ASR_BACKEND,
+    compute_type=ASR_COMPUTE_TYPE
+)
+stream_sessions = {}
+stream_sessions_lock = threading.Lock()
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -142,183 +258,206 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'error': f'不支持的文件格式，支持的格式：{", ".join(SUPPORTED_FORMATS)}'}), 400
         
-        # 保存文件
+        # 每个任务使用唯一ID和独立的工作目录，避免并发任务互相覆盖
+        task_id = uuid.uuid4().hex
+        job_dir = get_job_dir(task_id)
+        os.makedirs(job_dir, exist_ok=True)
+        
+        # 保存文件（保留原始扩展名用于格式识别）
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        filepath = os.path.join(job_dir, f"input.{extension}")
         file.save(filepath)
         
-        # 启动后台处理任务
-        task_id = timestamp
-        thread = threading.Thread(target=process_audio_task, args=(filepath, filename, task_id))
-        thread.daemon = True
-        thread.start()
+        # 提交到任务队列，队列已满时返回429
+        try:
+            priority = int(request.form.get('priority', 0))
+        except ValueError:
+            priority = 0
+        
+        # 上传方的SocketIO连接加入以任务ID命名的房间，任务进度和转写内容只推送给上传方
+        socket_id = request.form.get('socket_id')
+        if socket_id:
+            join_room(task_id, sid=socket_id, namespace='/')
+        
+        # 本任务单独指定的处理参数，未填写的使用 config.env 中的默认值
+        settings = {name: request.form.get(name) for name in UPLOAD_SETTINGS}
+        
+        try:
+            if settings['model_size'] and settings['model_size'] not in ALLOWED_MODEL_SIZES:
+                raise ValueError(f"不支持的模型大小，可选：{', '.join(ALLOWED_MODEL_SIZES)}")
+            job = model_server.submit(
+                filepath,
+                priority=priority,
+                work_dir=job_dir,
+                progress_callback=make_progress_reporter(task_id),
+                settings=settings
+            )
+        except ValueError as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return jsonify({'error': str(e)}), 400
+        except QueueFullError as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            response = jsonify({
+                'error': f'服务器繁忙，请 {e.retry_after} 秒后重试',
+                'retry_after': e.retry_after
+            })
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        
+        # 转写完成（或失败）后进入思维导图阶段
+        job.future.add_done_callback(lambda _: mindmap_stage.put((job, filepath, job_dir, task_id)))
         
         return jsonify({
             'success': True,
             'task_id': task_id,
             'filename': filename,
+            'queue_position': job.queue_position,
             'message': '文件上传成功，正在处理中...'
         })
         
     except Exception as e:
         return jsonify({'error': f'上传失败：{str(e)}'}), 500
 
-def process_audio_task(filepath, filename, task_id):
-    """后台音频处理任务"""
-    try:
-        # 发送开始处理消息
-        socketio.emit('progress', {
-            'task_id': task_id,
-            'stage': 'start',
-            'message': '开始处理音频文件...',
-            'progress': 5
-        })
-        
-        # 复制文件到工作目录
-        target_path = filename
-        shutil.copy2(filepath, target_path)
-        
-        socketio.emit('progress', {
+def get_job_dir(task_id):
+    """返回任务的独立工作目录"""
+    return os.path.join(app.config['JOBS_FOLDER'], secure_filename(task_id))
+
+def make_progress_reporter(task_id):
+    """
+    创建向前端推送任务进度的回调，已转写的片段单独以 transcript_segment 事件推送，
+    two_pass 模式精修后的片段以 transcript_segment_update 事件替换草稿片段
+    """
+    def report_progress(stage, message, progress, **extra):
+        if extra.get('event') == 'segment':
+            socketio.emit('transcript_segment', dict(extra['segment'], task_id=task_id), to=task_id)
+            return
+        if extra.get('event') == 'segment_update':
+            socketio.emit('transcript_segment_update', {
+                'task_id': task_id,
+                'replaces': extra['replaces'],
+                'segments': extra['segments']
+            }, to=task_id)
+            return
+        payload = {
             'task_id': task_id,
-            'stage': 'transcription',
-            'message': '正在进行语音识别和说话人分离...',
-            'progress': 15
-        })
-        
-        # 步骤1: 调用音频处理程序
-        cmd = ['conda', 'run', '-n', 'rag4', 'python', 'main.py']
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8'
-        )
-        
-        # 实时读取输出并更新进度
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                if "正在加载说话人分离模型" in output:
-                    socketio.emit('progress', {
-                        'task_id': task_id,
-                        'stage': 'diarization',
-                        'message': '正在加载说话人分离模型...',
-                        'progress': 25
-                    })
-                elif "正在加载语音识别模型" in output:
-                    socketio.emit('progress', {
-                        'task_id': task_id,
-                        'stage': 'recognition',
-                        'message': '正在加载语音识别模型...',
-                        'progress': 40
-                    })
-                elif "转写结果已保存" in output:
-                    socketio.emit('progress', {
-                        'task_id': task_id,
-                        'stage': 'transcription_complete',
-                        'message': '语音转写完成',
-                        'progress': 60
-                    })
-        
-        # 等待音频处理完成
-        stdout, stderr = process.communicate()
-        
-        if process.returncode != 0:
-            raise Exception(f"音频处理失败: {stderr}")
-        
-        # 查找生成的转写目录
-        transcript_dir = audio_processor.find_latest_transcript_dir()
-        if not transcript_dir:
-            raise Exception("未找到转写结果目录")
+            'stage': stage,
+            'message': message,
+            'progress': progress
+        }
+        payload.update(extra)
+        socketio.emit('progress', payload, to=task_id)
+    return report_progress
+
+def process_audio_task(job, filepath, job_dir, task_id):
+    """思维导图阶段：转写已完成的任务生成思维导图并打包结果"""
+    try:
+        # 步骤1: 取出常驻模型服务的转写结果，结果目录由流水线直接返回
+        transcript_dir = job.future.result()['output_dir']
+        mindmap_path = os.path.join(job_dir, 'mindmap.html')
         
         socketio.emit('progress', {
             'task_id': task_id,
             'stage': 'mindmap',
             'message': '正在生成思维导图...',
             'progress': 70
-        })
-        
-        # 步骤2: 生成思维导图
-        audio_processor.set_local_model_env()
-        audio_processor.update_graph_script_path(transcript_dir)
-        
-        cmd = ['conda', 'run', '-n', 'rag4', 'python', 'make_grapth.py']
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-        
-        if result.returncode != 0:
-            raise Exception(f"思维导图生成失败: {result.stderr}")
+        }, to=task_id)
         
-        socketio.emit('progress', {
-            'task_id': task_id,
-            'stage': 'packaging',
-            'message': '正在打包结果文件...',
-            'progress': 90
-        })
-        
-        # 创建结果包
-        result_info = create_result_package(transcript_dir, task_id)
-        
-        # 清理临时文件
-        for path in [filepath, target_path]:
+        if ASYNC_LLM:
+            # 交给后台事件循环，本线程处理下一个任务；在途任务数受 MINDMAP_WORKERS 限制，
+            # 同一后端同时在途的请求数受 LLM_MAX_CONCURRENCY 限制
+            mindmap_slots.acquire()
             try:
-                if os.path.exists(path):
-                    os.remove(path)
-            except:
-                pass
+                future = run_async(finish_task_async(transcript_dir, mindmap_path, filepath, job_dir, task_id))
+            except Exception:
+                mindmap_slots.release()
+                raise
+            future.add_done_callback(lambda _: mindmap_slots.release())
+            return
+        
+        # 步骤2: 在进程内生成思维导图，转写目录和输出路径以参数传入
+        try:
+            generate_mindmap(transcript_dir, mindmap_path, **audio_processor.local_model_settings())
+        except Exception as e:
+            raise Exception(f"思维导图生成失败: {e}")
         
-        # 发送完成消息
-        socketio.emit('progress', {
-            'task_id': task_id,
-            'stage': 'complete',
-            'message': '处理完成！',
-            'progress': 100,
-            'result': result_info
-        })
+        finish_task(transcript_dir, mindmap_path, filepath, job_dir, task_id)
         
     except Exception as e:
-        socketio.emit('progress', {
-            'task_id': task_id,
-            'stage': 'error',
-            'message': f'处理失败：{str(e)}',
-            'progress': -1
-        })
-        
-        # 清理文件
-        for path in [filepath, target_path]:
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-            except:
-                pass
+        fail_task(task_id, filepath, e)
 
-def create_result_package(transcript_dir, task_id):
+async def finish_task_async(transcript_dir, mindmap_path, filepath, job_dir, task_id):
+    """异步生成思维导图，打包结果在线程池中进行，避免阻塞事件循环"""
+    try:
+        try:
+            await agenerate_mindmap(transcript_dir, mindmap_path, **audio_processor.local_model_settings())
+        except Exception as e:
+            raise Exception(f"思维导图生成失败: {e}")
+        await asyncio.get_running_loop().run_in_executor(
+            None, finish_task, transcript_dir, mindmap_path, filepath, job_dir, task_id)
+    except Exception as e:
+        fail_task(task_id, filepath, e)
+
+def finish_task(transcript_dir, mindmap_path, filepath, job_dir, task_id):
+    """打包结果文件并通知前端任务完成"""
+    socketio.emit('progress', {
+        'task_id': task_id,
+        'stage': 'packaging',
+        'message': '正在打包结果文件...',
+        'progress': 90
+    }, to=task_id)
+    
+    # 创建结果包
+    result_info = create_result_package(transcript_dir, mindmap_path, job_dir, task_id)
+    job_results[task_id] = result_info
+    
+    # 清理临时文件
+    try:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    except:
+        pass
+    
+    # 发送完成消息
+    socketio.emit('progress', {
+        'task_id': task_id,
+        'stage': 'complete',
+        'message': '处理完成！',
+        'progress': 100,
+        'result': result_info
+    }, to=task_id)
+
+def fail_task(task_id, filepath, error):
+    """通知前端任务失败并清理上传的文件"""
+    socketio.emit('progress', {
+        'task_id': task_id,
+        'stage': 'error',
+        'message': f'处理失败：{str(error)}',
+        'progress': -1
+    }, to=task_id)
+    
+    # 清理文件
+    try:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    except:
+        pass
+
+def create_result_package(transcript_dir, mindmap_path, job_dir, task_id):
     """创建结果文件包"""
     try:
-        result_dir = f"results_{task_id}"
-        os.makedirs(result_dir, exist_ok=True)
-        
-        # 复制转写结果
-        if os.path.exists(transcript_dir):
-            shutil.copytree(transcript_dir, os.path.join(result_dir, 'transcripts'), dirs_exist_ok=True)
-        
-        # 复制思维导图
-        mindmap_path = "output/mindmap.html"
-        if os.path.exists(mindmap_path):
-            shutil.copy2(mindmap_path, os.path.join(result_dir, 'mindmap.html'))
-        
-        # 创建ZIP包
-        zip_filename = f"results_{task_id}.zip"
+        # 创建ZIP包，直接从任务目录打包转写结果和思维导图
+        zip_filename = os.path.join(job_dir, f"results_{task_id}.zip")
         with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(result_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, result_dir)
-                    zipf.write(file_path, arcname)
+            if os.path.exists(transcript_dir):
+                for root, dirs, files in os.walk(transcript_dir):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        arcname = os.path.join('transcripts', os.path.relpath(file_path, transcript_dir))
+                        zipf.write(file_path, arcname)
+            
+            if os.path.exists(mindmap_path):
+                zipf.write(mindmap_path, 'mindmap.html')
         
         # 读取汇总信息
         summary_path = os.path.join(transcript_dir, 'summary.txt')
@@ -327,12 +466,10 @@ def create_result_package(transcript_dir, task_id):
             with open(summary_path, 'r', encoding='utf-8') as f:
                 summary_content = f.read()
         
-        # 清理临时目录
-        shutil.rmtree(result_dir)
-        
         return {
             'transcript_dir': transcript_dir,
             'zip_file': zip_filename,
+            'mindmap_path': mindmap_path,
             'mindmap_available': os.path.exists(mindmap_path),
             'summary': summary_content[:500] + "..." if len(summary_content) > 500 else summary_content
         }
@@ -355,7 +492,8 @@ def download_file(filename):
 @app.route('/view_mindmap/<task_id>')
 def view_mindmap(task_id):
     """查看思维导图"""
-    mindmap_path = "output/mindmap.html"
+    result_info = job_results.get(task_id)
+    mindmap_path = result_info['mindmap_path'] if result_info else os.path.join(get_job_dir(task_id), 'mindmap.html')
     if os.path.exists(mindmap_path):
         return send_file(mindmap_path)
     else:
@@ -371,8 +509,14 @@ def api_status():
         'local_model_available': LOCAL_MODEL_AVAILABLE,
         'use_local_model': audio_processor.use_local_model,
         'whisper_model_size': WHISPER_MODEL_SIZE,
+        'asr_backend': ASR_BACKEND,
         'min_speakers': MIN_SPEAKERS,
-        'max_speakers': MAX_SPEAKERS
+        'max_speakers': MAX_SPEAKERS,
+        'min_segment_duration': MIN_SEGMENT_DURATION,
+        'allowed_model_sizes': ALLOWED_MODEL_SIZES,
+        'queue': model_server.stats(),
+        'mindmap': mindmap_stage.stats(),
+        'cache': get_cache(CACHE_DIR, CACHE_MAX_SIZE_MB).stats() if CACHE_DIR else None
     })
 
 @app.route('/api/process', methods=['POST'])
@@ -390,15 +534,11 @@ def api_process():
         success = processor.run_full_pipeline(audio_file)
         
         if success:
-            # 查找结果
-            transcript_dir = processor.find_latest_transcript_dir()
-            mindmap_file = "output/mindmap.html"
-            
             return jsonify({
                 'success': True,
-                'transcript_dir': transcript_dir,
-                'mindmap_file': mindmap_file if os.path.exists(mindmap_file) else None,
-                'summary_file': os.path.join(transcript_dir, 'summary.txt') if transcript_dir else None
+                'transcript_dir': processor.output_dir,
+                'mindmap_file': processor.mindmap_file,
+                'summary_file': processor.summary_file
             })
         else:
             return jsonify({'error': '处理失败'}), 500
@@ -412,8 +552,75 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    with stream_sessions_lock:
+        stream_sessions.pop(request.sid, None)
     print('客户端已断开')
 
+@socketio.on('join_task')
+def handle_join_task(data):
+    """重新连接后加入任务的房间，继续接收该任务的进度和转写内容"""
+    task_id = (data or {}).get('task_id')
+    if task_id:
+        join_room(task_id)
+
+@socketio.on('stream_start')
+def handle_stream_start(data=None):
+    """开始实时流式转写，客户端随后以 16kHz 单声道 16bit PCM 发送 stream_chunk"""
+    with stream_sessions_lock:
+        if request.sid not in stream_sessions and len(stream_sessions) >= STREAM_MAX_SESSIONS:
+            emit('stream_error', {'error': f'实时转写会话已达上限（{STREAM_MAX_SESSIONS}），请稍后重试'})
+            return
+        stream_sessions[request.sid] = stream_transcriber.create_session(step_seconds=STREAM_STEP_SECONDS)
+    
+    try:
+        stream_transcriber.load()
+    except Exception as e:
+        with stream_sessions_lock:
+            stream_sessions.pop(request.sid, None)
+        emit('stream_error', {'error': f'流式转写模型加载失败：{str(e)}'})
+        return
+    
+    print(f'🎙️ 实时转写会话开始: {request.sid}')
+    emit('stream_started', {'sample_rate': SAMPLE_RATE, 'channels': 1, 'format': 's16le'})
+
+@socketio.on('stream_chunk')
+def handle_stream_chunk(data):
+    """接收音频块：原始PCM字节，或 {'seq': 序号, 'audio': PCM字节}"""
+    with stream_sessions_lock:
+        session = stream_sessions.get(request.sid)
+    if session is None:
+        emit('stream_error', {'error': '请先发送 stream_start'})
+        return
+    
+    if isinstance(data, dict):
+        events = session.feed(data['audio'], data.get('seq'))
+    else:
+        events = session.feed(data)
+    for event, payload in events:
+        emit(event, payload)
+
+@socketio.on('stream_stop')
+def handle_stream_stop(data=None):
+    """停止推流，确认剩余的转写结果"""
+    # 会话在确认完剩余片段后才移除：停止请求之前发出的音频块可能仍在其他线程中处理
+    with stream_sessions_lock:
+        session = stream_sessions.get(request.sid)
+        if session is None or session.stopping:
+            return
+        session.stopping = True
+    
+    total_chunks = (data or {}).get('chunks')
+    try:
+        for event, payload in session.finish(total_chunks):
+            emit(event, payload)
+    finally:
+        with stream_sessions_lock:
+            # 期间重新开始的会话不能被移除
+            if stream_sessions.get(request.sid) is session:
+                stream_sessions.pop(request.sid)
+    print(f'🎙️ 实时转写会话结束: {request.sid}（{session.duration:.1f}秒）')
+    emit('stream_stopped', {'duration': session.duration})
+
 def run_full_pipeline_command_line(audio_file=None, transcript_dir=None, audio_only=False, graph_only=False):
     """命令行模式的完整流程"""
     processor = AudioProcessor()
@@ -450,10 +657,17 @@ def main():
         print("📁 支持格式:", ", ".join(SUPPORTED_FORMATS))
         print(f"💾 最大文件大小: {MAX_FILE_SIZE}MB")
         print(f"🏠 本地模型: {'可用' if LOCAL_MODEL_AVAILABLE else '不可用'}")
-        print(f"🎤 Whisper模型: {WHISPER_MODEL_SIZE}")
+        print(f"🎤 Whisper模型: {WHISPER_MODEL_SIZE}（{ASR_BACKEND}）")
         print(f"👥 说话人数量: {MIN_SPEAKERS}-{MAX_SPEAKERS}")
+        print(f"⚙️  工作线程: {WORKER_COUNT}，队列上限: {MAX_QUEUE_SIZE}（{QUEUE_POLICY}）")
+        print(f"⚙️  解码线程: {DECODE_WORKERS}，思维导图线程: {MINDMAP_WORKERS}")
+        if ASYNC_LLM:
+            print(f"⚙️  异步调用大模型，每个后端最多同时 {DEFAULT_MAX_CONCURRENCY} 个请求")
         print("=" * 50)
         
+        # 启动常驻模型服务，提前预热模型
+        model_server.start()
+        
         socketio.run(app, host=args.host, port=args.port, debug=False)
     else:
         # 命令行模式
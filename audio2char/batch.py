@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量转写
+一次加载模型，依次处理目录、通配符或 JSONL 清单中的全部录音，每个文件写入独立的输出目录。
+处理第 N 个文件时在后台线程中提前解码第 N+1 个文件；每完成一个文件就追加记录到
+batch_state.jsonl，中断后重新运行同一命令会跳过已完成的文件，未完成的文件按阶段清单增量续跑
+
+用法:
+    python batch.py recordings/
+    python batch.py "recordings/**/*.mp3" --output-root nightly
+    python batch.py backfill.jsonl --transcribe-mode chunked
+
+JSONL 清单每行一个任务，audio 为必填项，相对路径相对于清单所在目录：
+    {"audio": "2024/meeting.mp3", "output_dir": "out/meeting", "settings": {"max_speakers": 3}}
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from main import (TranscriptionPipeline, JOB_SETTINGS, TRANSCRIBE_MODES, settings_from_env,
+                  validate_settings)
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.aac', '.ogg')
+STATE_FILE = "batch_state.jsonl"
+
+
+def _is_audio(path: str) -> bool:
+    return path.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(path)
+
+
+def _read_manifest(manifest_file: str) -> List[Dict[str, Any]]:
+    """读取 JSONL 清单"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    items = []
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{manifest_file}:{line_no} 不是有效的JSON: {e}")
+            if not entry.get('audio'):
+                raise ValueError(f"{manifest_file}:{line_no} 缺少 audio 字段")
+            item = {'audio': os.path.join(base_dir, entry['audio']), 'settings': entry.get('settings') or {}}
+            if entry.get('output_dir'):
+                item['output_dir'] = os.path.join(base_dir, entry['output_dir'])
+            items.append(item)
+    return items
+
+
+def collect_items(sources: List[str], output_root: str) -> List[Dict[str, Any]]:
+    """
+    展开输入为任务列表
+
+    Args:
+        sources: 目录（递归查找音频文件）、通配符、JSONL 清单或单个音频文件
+        output_root: 未指定输出目录的任务写入 output_root/<文件名>_<路径哈希>
+
+    Returns:
+        [{'audio', 'output_dir', 'settings'}]，同一文件只保留第一次出现
+    """
+    items = []
+    for source in sources:
+        if os.path.isfile(source) and source.lower().endswith('.jsonl'):
+            items.extend(_read_manifest(source))
+        elif os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                items.extend({'audio': os.path.join(root, name)} for name in sorted(files)
+                             if _is_audio(os.path.join(root, name)))
+        elif glob.has_magic(source):
+            items.extend({'audio': path} for path in sorted(glob.glob(source, recursive=True)) if _is_audio(path))
+        elif _is_audio(source):
+            items.append({'audio': source})
+        else:
+            print(f"⚠️ 跳过无法识别的输入: {source}")
+
+    unique = []
+    seen = set()
+    for item in items:
+        path = os.path.abspath(item['audio'])
+        if path in seen:
+            continue
+        seen.add(path)
+        if not item.get('output_dir'):
+            # 文件名加路径哈希，不同目录下的同名文件互不覆盖，重新运行时目录名不变
+            stem = os.path.splitext(os.path.basename(path))[0]
+            digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]
+            item['output_dir'] = os.path.join(output_root, f"{stem}_{digest}")
+        item.setdefault('settings', {})
+        unique.append(item)
+    return unique
+
+
+class BatchRunner:
+    """批量转写：共用一条已加载模型的流水线，提前解码下一个文件，按状态文件断点续跑"""
+
+    def __init__(self, pipeline: TranscriptionPipeline, output_root: str, prefetch: int = 1,
+                 resume: bool = True):
+        """
+        Args:
+            pipeline: 转写流水线，模型只加载一次
+            output_root: 批处理输出根目录，状态文件 batch_state.jsonl 写在其中
+            prefetch: 提前解码的文件数，0表示不预取（内存中最多同时保留 prefetch+1 个波形）
+            resume: 是否跳过状态文件中已完成且未修改的文件
+        """
+        self.pipeline = pipeline
+        # 流水线的默认参数，解码线程按此计算缓存键，不读取主线程中正在处理的任务参数
+        self.default_config = dict(pipeline.config)
+        self.output_root = output_root
+        self.prefetch = max(0, prefetch)
+        self.resume = resume
+        self.state_file = os.path.join(output_root, STATE_FILE)
+
+    def load_state(self) -> Dict[str, Dict[str, Any]]:
+        """读取各文件最近一次的处理记录，按音频绝对路径索引"""
+        state = {}
+        if not os.path.exists(self.state_file):
+            return state
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时可能留下写了一半的最后一行
+                    continue
+                state[record['audio']] = record
+        return state
+
+    def _append_state(self, record: Dict[str, Any]):
+        """追加一条处理记录并立即落盘"""
+        with open(self.state_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _is_finished(item: Dict[str, Any], record: Optional[Dict[str, Any]]) -> bool:
+        """状态文件记录已完成、音频未修改且输出文件仍然存在"""
+        if not record or record.get('status') != 'done':
+            return False
+        try:
+            stat = os.stat(item['audio'])
+        except OSError:
+            return False
+        return (record.get('size') == stat.st_size and record.get('mtime') == stat.st_mtime
+                and os.path.exists(record.get('summary_file') or ''))
+
+    def _prefetch(self, item: Dict[str, Any]) -> Optional[Any]:
+        """解码线程：输出目录或结果缓存中已有可复用的识别结果时跳过解码，由流水线直接复用"""
+        # 只用于计算缓存键，不加载模型
+        pipeline = TranscriptionPipeline(**self.default_config)
+        with pipeline.job_settings(item['settings']):
+            if not pipeline.needs_decode(item['audio'], item['output_dir']):
+                print(f"♻️ 已有可复用的识别结果，跳过提前解码: {item['audio']}")
+                return None
+        return self.pipeline.convert(item['audio'])
+
+    def run(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        依次处理全部任务
+
+        Returns:
+            {'total', 'done', 'skipped', 'failed', 'seconds', 'failures': [{'audio', 'error'}]}
+        """
+        os.makedirs(self.output_root, exist_ok=True)
+        state = self.load_state()
+        pending = []
+        skipped = 0
+        for item in items:
+            if self.resume and self._is_finished(item, state.get(os.path.abspath(item['audio']))):
+                skipped += 1
+            else:
+                pending.append(item)
+        print(f"📦 批量转写：共 {len(items)} 个文件，已完成 {skipped} 个，待处理 {len(pending)} 个")
+
+        started = time.time()
+        done = 0
+        failures = []
+        # 单线程解码：ffmpeg 子进程解码期间不占用GIL，与模型推理并行
+        decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-decode") if self.prefetch else None
+        decoding = deque()
+        next_index = 0
+        try:
+            for index, item in enumerate(pending, start=1):
+                while decoder and next_index < len(pending) and len(decoding) <= self.prefetch:
+                    decoding.append(decoder.submit(self._prefetch, pending[next_index]))
+                    next_index += 1
+
+                print(f"\n[{index}/{len(pending)}] {item['audio']}")
+                item_started = time.time()
+                record = {'audio': os.path.abspath(item['audio']), 'output_dir': item['output_dir']}
+                try:
+                    waveform = decoding.popleft().result() if decoder else None
+                    result = self.pipeline.run(item['audio'], output_dir=item['output_dir'],
+                                               settings=item['settings'], waveform=waveform)
+                    del waveform
+                    stat = os.stat(item['audio'])
+                    record.update(status='done', size=stat.st_size, mtime=stat.st_mtime,
+                                  summary_file=result['summary_file'])
+                    done += 1
+                except Exception as e:
+                    print(f"❌ 处理失败: {e}")
+                    record.update(status='failed', error=str(e))
+                    failures.append({'audio': item['audio'], 'error': str(e)})
+                record.update(seconds=round(time.time() - item_started, 2),
+                              finished_at=datetime.now().isoformat(timespec='seconds'))
+                self._append_state(record)
+        finally:
+            if decoder:
+                for future in decoding:
+                    future.cancel()
+                decoder.shutdown(wait=True)
+
+        seconds = time.time() - started
+        print(f"\n📦 批量转写结束：完成 {done} 个，跳过 {skipped} 个，失败 {len(failures)} 个，用时 {seconds:.0f} 秒")
+        for failure in failures:
+            print(f"  ❌ {failure['audio']}: {failure['error']}")
+        return {
+            'total': len(items),
+            'done': done,
+            'skipped': skipped,
+            'failed': len(failures),
+            'seconds': seconds,
+            'failures': failures
+        }
+
+
+if __name__ == "__main__":
+    # 与Web应用共用 config.env 中的处理参数
+    try:
+        from dotenv import load_dotenv
+        load_dotenv('config.env')
+    except ImportError:
+        pass
+
+    parser = argparse.ArgumentParser(description='批量转写目录、通配符或 JSONL 清单中的录音')
+    parser.add_argument('sources', nargs='+', help='目录、通配符（需加引号）、JSONL 清单或音频文件')
+    parser.add_argument('--output-root', '-o', default='batch_outputs', help='输出根目录 (默认: batch_outputs)')
+    parser.add_argument('--prefetch', type=int, default=1, help='提前解码的文件数，0表示不预取 (默认: 1)')
+    parser.add_argument('--no-resume', action='store_true', help='忽略状态文件，重新处理全部文件')
+    parser.add_argument('--model-size', help='Whisper模型大小（默认读取 WHISPER_MODEL_SIZE）')
+    parser.add_argument('--language', help='识别语言')
+    parser.add_argument('--min-speakers', type=int, help='最少说话人数')
+    parser.add_argument('--max-speakers', type=int, help='最多说话人数')
+    parser.add_argument('--transcribe-mode', choices=TRANSCRIBE_MODES, help='转写模式')
+    parser.add_argument('--cache-dir', help='结果缓存目录')
+    args = parser.parse_args()
+
+    overrides = settings_from_env()
+    overrides.update({
+        name: value for name, value in (
+            ('model_size', args.model_size),
+            ('language', args.language),
+            ('min_speakers', args.min_speakers),
+            ('max_speakers', args.max_speakers),
+            ('transcribe_mode', args.transcribe_mode),
+            ('cache_dir', args.cache_dir)
+        ) if value is not None
+    })
+    try:
+        validate_settings({name: overrides[name] for name in JOB_SETTINGS if name in overrides})
+        batch_items = collect_items(args.sources, args.output_root)
+    except ValueError as e:
+        print(f"参数错误: {e}")
+        exit(1)
+    if not batch_items:
+        print("错误：没有找到音频文件")
+        print("支持的格式：", ', '.join(AUDIO_EXTENSIONS))
+        exit(1)
+
+    batch_pipeline = TranscriptionPipeline(**overrides)
+    batch_pipeline.load_models()
+    summary = BatchRunner(batch_pipeline, args.output_root, prefetch=args.prefetch,
+                          resume=not args.no_resume).run(batch_items)
+    exit(1 if summary['failed'] else 0)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容寻址的结果缓存
+以音频内容的 SHA-256 加上模型版本和处理参数作为键，把解码后的波形、说话人分离结果和
+语音识别结果保存在磁盘上。重复上传同一段录音或只调整对齐参数时，直接复用已有结果；
+缓存总大小超过上限时按最近使用时间淘汰。总大小在写入时累加，只在超过上限时才扫描缓存目录
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# 同一缓存目录在进程内共用一个实例，命中统计在各工作线程之间共享
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(cache_dir: str, max_size_mb: float = 2048) -> "ResultCache":
+    """获取指定目录的共享缓存实例"""
+    path = os.path.abspath(cache_dir)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ResultCache(path, max_size_mb)
+        return _caches[path]
+
+
+def file_digest(path: str, block_size: int = 1 << 20) -> str:
+    """分块计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """磁盘结果缓存：波形保存为 .npy，说话人分离和识别结果保存为 .json"""
+
+    def __init__(self, cache_dir: str = "cache", max_size_mb: float = 2048):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存总大小上限（MB），超过时淘汰最久未使用的条目
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None  # 缓存总大小（字节），首次写入时扫描一次，之后按写入累加
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(stage: str, audio_digest: str, params: Dict[str, Any]) -> str:
+        """由阶段名、音频内容哈希和参数生成缓存键"""
+        payload = json.dumps({'stage': stage, 'audio': audio_digest, 'params': params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ext)
+
+    def _record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _lookup(self, key: str, ext: str) -> Optional[str]:
+        """查找缓存文件，命中时刷新使用时间"""
+        path = self._path(key, ext)
+        if not os.path.exists(path):
+            self._record(False)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._record(True)
+        return path
+
+    def _store(self, key: str, ext: str, write):
+        """先写临时文件再原子替换，避免并发读到不完整的条目"""
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            new_size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ 写入缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._add_size(new_size - old_size)
+
+    def _add_size(self, delta: int):
+        """累加缓存总大小，超过上限时才扫描目录淘汰"""
+        with self._lock:
+            if self._size is None:
+                # 首次写入：扫描结果已包含刚写入的文件
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += delta
+            over_limit = self._size > self.max_size_bytes
+        if over_limit:
+            self.evict()
+
+    def _entries(self):
+        """扫描缓存目录，返回 [(最近使用时间, 大小, 路径)]，跳过写入中的临时文件"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def contains(self, key: str, ext: str = '.json') -> bool:
+        """条目是否存在，不计入命中统计"""
+        return os.path.exists(self._path(key, ext))
+
+    def get_json(self, key: str) -> Optional[Any]:
+        """读取JSON结果，未命中返回None"""
+        path = self._lookup(key, '.json')
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_json(self, key: str, value: Any):
+        """保存JSON结果"""
+        data = json.dumps(value, ensure_ascii=False, default=float).encode('utf-8')
+        self._store(key, '.json', lambda f: f.write(data))
+
+    def get_waveform(self, key: str, mmap: bool = False) -> Optional[np.ndarray]:
+        """读取波形，mmap 为 True 时以写时复制方式映射而不整体读入内存"""
+        path = self._lookup(key, '.npy')
+        if path is None:
+            return None
+        try:
+            return np.load(path, mmap_mode='c' if mmap else None)
+        except (OSError, ValueError):
+            return None
+
+    def put_waveform(self, key: str, waveform: np.ndarray):
+        """保存波形"""
+        self._store(key, '.npy', lambda f: np.save(f, np.asarray(waveform, dtype=np.float32)))
+
+    def evict(self):
+        """缓存总大小超过上限时，按最近使用时间从旧到新删除条目"""
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_size_bytes:
+                for _, size, path in sorted(entries):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    if total <= self.max_size_bytes:
+                        break
+            # 以扫描结果校正累加的总大小
+            self._size = total
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计和当前占用"""
+        entries = self._entries()
+        size = sum(size for _, size, _ in entries)
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': len(entries),
+            'size_mb': round(size / 1024 / 1024, 1),
+            'max_size_mb': round(self.max_size_bytes / 1024 / 1024, 1)
+        }
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU推理优化
+没有GPU时，openai-whisper 默认以fp32运行并使用torch的默认线程数。本模块提供：
+
+    quantize_whisper()     对Whisper的全部线性层做动态int8量化（权重int8，激活运行时量化）
+    configure_threads()    显式设置 intra-op / inter-op 线程数
+    pin_process()          把进程绑定到指定的CPU核（多个任务共用一台机器时互不争抢）
+    pin_thread()           只把当前线程绑定到指定的CPU核（同一进程中的多个模型工作线程各用一组核）
+
+内置性能测试比较fp32和int8在同一音频上的耗时、内存和错误率：
+
+    python cpu_inference.py fixture.wav --reference fixture.txt --model-size small --threads 8
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+def parse_cpu_list(spec: Optional[str]) -> Optional[List[int]]:
+    """
+    解析CPU核列表，格式与 taskset -c 相同
+
+    Args:
+        spec: 如 "0-3,8,10-11"，为空时返回None
+
+    Returns:
+        排好序的CPU核编号列表
+    """
+    if not spec or not spec.strip():
+        return None
+    cores = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cores.update(range(int(first), int(last) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def split_cores(cores: List[int], parts: int) -> List[List[int]]:
+    """把CPU核尽量平均地分成 parts 组，每组至少一个核（核数不足时各组循环复用）"""
+    parts = max(1, parts)
+    if len(cores) < parts:
+        return [[cores[i % len(cores)]] for i in range(parts)]
+    size, extra = divmod(len(cores), parts)
+    groups = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(cores[start:end])
+        start = end
+    return groups
+
+
+def available_cores() -> List[int]:
+    """当前进程可使用的CPU核"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pin_process(cores: List[int]):
+    """
+    把当前进程的全部线程绑定到指定CPU核，之后创建的线程继承该绑定
+
+    Linux 上 sched_setaffinity 只作用于单个线程，因此逐个设置 /proc/self/task 下的线程
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        print("⚠️ 当前系统不支持绑定CPU核，已忽略 cpu_affinity")
+        return
+    task_dir = "/proc/self/task"
+    thread_ids = [int(tid) for tid in os.listdir(task_dir)] if os.path.isdir(task_dir) else [0]
+    for tid in thread_ids:
+        try:
+            os.sched_setaffinity(tid, cores)
+        except OSError:
+            # 线程可能已经退出
+            pass
+
+
+def pin_thread(cores: List[int]):
+    """
+    只把当前线程绑定到指定CPU核，之后由该线程创建的线程（如torch的计算线程）继承该绑定
+
+    进程中的其他线程（Web服务、解码等）不受影响
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        print("⚠️ 当前系统不支持绑定CPU核，已忽略 cpu_affinity")
+        return
+    # Linux 上 pid 为0时只作用于调用线程
+    os.sched_setaffinity(0, cores)
+
+
+def configure_threads(intra_op: int = 0, inter_op: int = 0) -> Dict[str, int]:
+    """
+    显式设置torch的线程数
+
+    Args:
+        intra_op: 单个算子内部的并行线程数，0表示使用可用CPU核数
+        inter_op: 算子之间的并行线程数，0表示保持torch默认值
+
+    Returns:
+        {'intra_op', 'inter_op'} 实际生效的线程数
+    """
+    import torch
+
+    torch.set_num_threads(intra_op or len(available_cores()))
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            # inter-op 线程池只能在首次并行计算之前设置
+            print("⚠️ inter-op 线程数已无法修改，保持当前值")
+    return {'intra_op': torch.get_num_threads(), 'inter_op': torch.get_num_interop_threads()}
+
+
+def quantize_whisper(model):
+    """
+    对Whisper模型做动态int8量化，只能在CPU上运行
+
+    whisper 使用自定义的 Linear 子类（前向时把权重转换为输入的精度），quantize_dynamic
+    按模块的确切类型匹配，不会量化这些层，因此先替换为等价的 nn.Linear
+    """
+    import torch
+    from torch import nn
+
+    def replace_linear(module):
+        for name, child in module.named_children():
+            if isinstance(child, nn.Linear) and type(child) is not nn.Linear:
+                linear = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.load_state_dict(child.state_dict())
+                setattr(module, name, linear)
+            else:
+                replace_linear(child)
+
+    model = model.cpu().float().eval()
+    replace_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def model_size_mb(model) -> float:
+    """模型参数和缓冲区占用的内存（MB），包括动态量化层打包的int8权重"""
+    import torch
+
+    quantized_linear = torch.ao.nn.quantized.dynamic.Linear
+    total = 0
+    for module in model.modules():
+        if isinstance(module, quantized_linear):
+            weight, bias = module._weight_bias()
+            total += weight.numel() * weight.element_size()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+        for tensor in list(module.parameters(recurse=False)) + list(module.buffers(recurse=False)):
+            total += tensor.numel() * tensor.element_size()
+    return total / 1024 / 1024
+
+
+def peak_memory_mb() -> float:
+    """当前进程的峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位为字节，Linux 上为KB
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def mean_confidence(segments: List[Dict[str, Any]]) -> Optional[float]:
+    """转写片段的平均置信度（avg_logprob 的指数，按片段时长加权），没有可用片段时返回None"""
+    weights = []
+    values = []
+    for seg in segments:
+        if seg.get('avg_logprob') is None:
+            continue
+        weights.append(max(seg['end'] - seg['start'], 1e-3))
+        values.append(seg['avg_logprob'])
+    if not values:
+        return None
+    return float(np.exp(np.average(values, weights=weights)))
+
+
+# =================== 性能测试 ===================
+def benchmark(audio_file: str, reference: Optional[str] = None, model_size: str = "small",
+              language: str = "zh", threads: int = 0, interop_threads: int = 0) -> List[Dict[str, Any]]:
+    """
+    比较fp32和动态int8量化的Whisper在CPU上的表现
+
+    Args:
+        audio_file: 测试音频
+        reference: 参考文本，为None时以fp32的转写结果作为参考
+        model_size: Whisper模型大小
+        language: 识别语言
+        threads: intra-op 线程数
+        interop_threads: inter-op 线程数
+
+    Returns:
+        [{'mode', 'seconds', 'rtf', 'model_mb', 'peak_mb', 'confidence', 'error_rate', 'text'}]
+    """
+    import whisper
+    from asr_backends import error_rate
+    from audio_loader import load_audio, SAMPLE_RATE
+
+    configure_threads(threads, interop_threads)
+    waveform = np.asarray(load_audio(audio_file), dtype=np.float32)
+    duration = len(waveform) / SAMPLE_RATE
+
+    results = []
+    for mode in ('fp32', 'int8'):
+        model = whisper.load_model(model_size, device="cpu")
+        if mode == 'int8':
+            model = quantize_whisper(model)
+
+        started = time.perf_counter()
+        result = model.transcribe(waveform, language=language, task="transcribe", fp16=False, verbose=None)
+        seconds = time.perf_counter() - started
+
+        results.append({
+            'mode': mode,
+            'seconds': seconds,
+            'rtf': seconds / duration if duration else 0.0,
+            'model_mb': model_size_mb(model),
+            # 峰值内存是进程累计值，int8 一行包含之前fp32的峰值，仅供参考
+            'peak_mb': peak_memory_mb(),
+            'confidence': mean_confidence(result['segments']),
+            'text': result['text']
+        })
+        del model
+
+    reference = reference if reference is not None else results[0]['text']
+    for item in results:
+        item['error_rate'] = error_rate(reference, item['text'])
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Whisper CPU推理性能测试（fp32 与动态int8量化）")
+    parser.add_argument("audio", help="测试音频文件")
+    parser.add_argument("--reference", "-r", help="参考文本文件（UTF-8），未提供时以fp32结果为参考")
+    parser.add_argument("--model-size", default="small", help="Whisper模型大小 (默认: small)")
+    parser.add_argument("--language", default="zh", help="识别语言 (默认: zh)")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op 线程数 (默认: 可用CPU核数)")
+    parser.add_argument("--interop-threads", type=int, default=0, help="inter-op 线程数 (默认: torch默认值)")
+    parser.add_argument("--cpu-affinity", help="绑定的CPU核，如 0-7")
+    args = parser.parse_args()
+
+    if args.cpu_affinity:
+        pin_process(parse_cpu_list(args.cpu_affinity))
+
+    reference_text = None
+    if args.reference:
+        with open(args.reference, 'r', encoding='utf-8') as f:
+            reference_text = f.read()
+
+    stats = benchmark(args.audio, reference_text, args.model_size, args.language,
+                      args.threads, args.interop_threads)
+
+    print(f"\n📊 {args.audio}（模型: {args.model_size}）")
+    print(f"{'模式':<8}{'转写(秒)':>10}{'RTF':>8}{'模型(MB)':>10}{'峰值内存(MB)':>14}{'置信度':>8}{'错误率':>10}")
+    for item in stats:
+        confidence = f"{item['confidence']:.3f}" if item['confidence'] is not None else "-"
+        print(f"{item['mode']:<8}{item['seconds']:>10.1f}{item['rtf']:>8.3f}{item['model_mb']:>10.0f}"
+              f"{item['peak_mb']:>14.0f}{confidence:>8}{item['error_rate']:>10.2%}")
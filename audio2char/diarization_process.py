@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+独立进程中的说话人分离
+说话人分离和语音识别只依赖同一份解码后的波形，互不依赖。本模块在常驻的子进程中加载 pyannote，
+与主进程中的 Whisper 同时运行，各自使用分到的CPU核和线程数，在对齐阶段汇合，
+单个任务的耗时接近 max(说话人分离, 语音识别) 而不是两者之和
+
+波形通过共享内存传给子进程，不经过管道序列化；启用 decode_memmap 时子进程直接映射同一个文件
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+# 子进程中常驻的说话人分离流水线
+_worker_pipeline = None
+
+
+def _init_worker(config: Dict[str, Any]):
+    """子进程初始化：按分到的CPU核绑定、设置线程数并加载一次说话人分离模型"""
+    global _worker_pipeline
+    from main import TranscriptionPipeline
+
+    _worker_pipeline = TranscriptionPipeline(**config)
+    _worker_pipeline.load_diarization_model()
+
+
+def _ready() -> Dict[str, Any]:
+    """预热：返回子进程的推理配置"""
+    return _worker_pipeline.inference_info
+
+
+def _diarize(source: Dict[str, Any], settings: Dict[str, Any]) -> Dict[str, Any]:
+    """在子进程中对共享的波形做说话人分离"""
+    if source.get('memmap'):
+        waveform = np.memmap(source['memmap'], dtype=np.float32, mode='c', offset=source['offset'],
+                             shape=(source['length'],))
+        with _worker_pipeline.job_settings(settings):
+            return _worker_pipeline.diarize(waveform)
+
+    shm = shared_memory.SharedMemory(name=source['shm'])
+    try:
+        # 复制一份再关闭共享内存：pyannote 内部的张量可能仍引用缓冲区，导致无法关闭
+        waveform = np.array(np.ndarray((source['length'],), dtype=np.float32, buffer=shm.buf))
+    finally:
+        shm.close()
+    with _worker_pipeline.job_settings(settings):
+        return _worker_pipeline.diarize(waveform)
+
+
+class DiarizationProcess:
+    """常驻的说话人分离子进程"""
+
+    def __init__(self, config: Dict[str, Any], cores: Optional[List[int]] = None, num_threads: int = 1):
+        """
+        Args:
+            config: 流水线的处理参数，子进程按其中的参数构造 TranscriptionPipeline
+            cores: 绑定给子进程的CPU核，为None时不绑定
+            num_threads: 子进程的torch线程数
+        """
+        self.cores = cores
+        self.num_threads = max(1, num_threads)
+        self.config = dict(
+            config,
+            cpu_affinity=",".join(str(core) for core in cores) if cores else None,
+            cpu_pin_thread=False,
+            cpu_threads=self.num_threads,
+            cpu_interop_threads=1,
+            concurrent_diarization=False
+        )
+        self._executor = None
+
+    def start(self):
+        """启动子进程并加载模型（幂等）"""
+        if self._executor is None:
+            # 使用spawn避免fork后torch/CUDA状态不一致
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.config,)
+            )
+            info = self._executor.submit(_ready).result()
+            print(f"说话人分离子进程已就绪：{info['intra_op_threads']} 个线程"
+                  + (f"，绑定CPU核 {info['cpu_affinity']}" if info.get('cpu_affinity') else ""))
+        return self
+
+    def shutdown(self):
+        """关闭子进程"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def submit(self, waveform: np.ndarray, settings: Optional[Dict[str, Any]] = None) -> Future:
+        """
+        提交说话人分离，立即返回
+
+        Args:
+            waveform: 16kHz单声道float32波形
+            settings: 本任务的说话人数等参数
+
+        Returns:
+            Future，结果为 TranscriptionPipeline.diarize() 的返回值
+        """
+        self.start()
+        filename = getattr(waveform, 'filename', None)
+        if isinstance(waveform, np.memmap) and filename and waveform.dtype == np.float32 and waveform.ndim == 1:
+            # 解码得到的内存映射文件或缓存中的 .npy 文件（offset 跳过文件头）
+            source = {'memmap': filename, 'offset': waveform.offset, 'length': len(waveform)}
+            return self._executor.submit(_diarize, source, settings or {})
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, waveform.nbytes))
+        try:
+            shared = np.ndarray((len(waveform),), dtype=np.float32, buffer=shm.buf)
+            shared[:] = waveform
+            del shared
+            future = self._executor.submit(_diarize, {'shm': shm.name, 'length': len(waveform)}, settings or {})
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+
+        def release(_):
+            shm.close()
+            shm.unlink()
+        future.add_done_callback(release)
+        return future
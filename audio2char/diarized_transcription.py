@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按说话人分离结果转写
+只转写说话人分离得到的语音区间：相邻的同一说话人片段合并为不超过30秒的窗口，
+多个窗口拼成一批一起送入Whisper编码器和解码器，静音和音乐部分不再参与计算，
+每段转写结果天然带有说话人标签
+"""
+
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+MAX_WINDOW_SECONDS = 30.0  # Whisper单次输入的最大时长
+
+
+def build_speaker_windows(speaker_segments: Dict[str, list], max_window: float = MAX_WINDOW_SECONDS,
+                          max_gap: float = 1.0, min_duration: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    将说话人片段合并为转写窗口
+
+    Args:
+        speaker_segments: {说话人: [{'start', 'end', ...}]}
+        max_window: 窗口最大时长（秒）
+        max_gap: 同一说话人相邻片段之间允许合并的最大间隔（秒）
+        min_duration: 短于该时长的片段不参与转写
+
+    Returns:
+        按开始时间排序的窗口列表 [{'speaker', 'start', 'end'}]
+    """
+    turns = sorted(
+        (seg['start'], seg['end'], speaker)
+        for speaker, segments in speaker_segments.items()
+        for seg in segments
+        if seg['end'] - seg['start'] >= min_duration
+    )
+
+    windows = []
+    for start, end, speaker in turns:
+        last = windows[-1] if windows else None
+        if (last and last['speaker'] == speaker and start - last['end'] <= max_gap
+                and end - last['start'] <= max_window):
+            last['end'] = max(last['end'], end)
+            continue
+
+        # 超长片段按最大窗口时长切开
+        while end - start > max_window:
+            windows.append({'speaker': speaker, 'start': start, 'end': start + max_window})
+            start += max_window
+        windows.append({'speaker': speaker, 'start': start, 'end': end})
+
+    return windows
+
+
+def transcribe_windows(model, waveform: np.ndarray, windows: List[Dict[str, Any]],
+                       options: Dict[str, Any], batch_size: int = 8,
+                       on_batch: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    批量转写说话人窗口
+
+    Args:
+        model: 已加载的Whisper模型
+        waveform: 16kHz单声道float32波形
+        windows: build_speaker_windows() 的返回值
+        options: 转写参数（language, initial_prompt, fp16）
+        batch_size: 每批送入模型的窗口数
+        on_batch: 每完成一批时调用 on_batch(segments, completed, total)
+
+    Returns:
+        {'text': 完整转写文本, 'segments': 带 speaker 字段的转写片段列表}
+    """
+    import torch
+    import whisper
+
+    decode_options = whisper.DecodingOptions(
+        task="transcribe",
+        language=options.get('language'),
+        prompt=options.get('initial_prompt'),
+        fp16=options.get('fp16', False),
+        without_timestamps=True
+    )
+
+    segments = []
+    for i in range(0, len(windows), batch_size):
+        batch = windows[i:i + batch_size]
+        mels = [
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(
+                    np.array(waveform[int(w['start'] * SAMPLE_RATE):int(w['end'] * SAMPLE_RATE)], dtype=np.float32)
+                ),
+                n_mels=model.dims.n_mels
+            )
+            for w in batch
+        ]
+        mel = torch.stack(mels).to(model.device)
+
+        # 整批窗口一次通过编码器和解码器
+        results = whisper.decode(model, mel, decode_options)
+        print(f"  已转写窗口 {i + len(batch)}/{len(windows)}")
+
+        batch_segments = []
+        for window, result in zip(batch, results):
+            # 与Whisper的静音判定一致：大概率无语音且置信度低时丢弃
+            if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+                continue
+            text = result.text.strip()
+            if not text:
+                continue
+            batch_segments.append({
+                'id': len(segments) + len(batch_segments),
+                'start': window['start'],
+                'end': window['end'],
+                'text': text,
+                'speaker': window['speaker'],
+                'tokens': result.tokens,
+                'temperature': result.temperature,
+                'avg_logprob': result.avg_logprob,
+                'compression_ratio': result.compression_ratio,
+                'no_speech_prob': result.no_speech_prob
+            })
+        segments.extend(batch_segments)
+        if on_batch:
+            on_batch(batch_segments, i + len(batch), len(windows))
+
+    return {'text': "".join(seg['text'] for seg in segments), 'segments': segments}
+
+
+def transcribe_windows_with_backend(backend, waveform: np.ndarray, windows: List[Dict[str, Any]],
+                                    options: Dict[str, Any], batch_size: int = 8,
+                                    on_batch: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    逐个转写说话人窗口（用于不支持批量解码的后端，如 faster-whisper）
+
+    参数和返回值与 transcribe_windows() 相同，backend 为 asr_backends 中已加载的后端，
+    每完成 batch_size 个窗口调用一次 on_batch
+    """
+    window_options = dict(options, word_timestamps=False, condition_on_previous_text=False)
+
+    segments = []
+    batch_segments = []
+    for i, window in enumerate(windows, start=1):
+        audio = np.array(waveform[int(window['start'] * SAMPLE_RATE):int(window['end'] * SAMPLE_RATE)],
+                         dtype=np.float32)
+        result = backend.transcribe(audio, **window_options)
+        window_segments = result.get('segments', [])
+        text = "".join(seg['text'] for seg in window_segments).strip()
+        if text:
+            batch_segments.append({
+                'id': len(segments) + len(batch_segments),
+                'start': window['start'],
+                'end': window['end'],
+                'text': text,
+                'speaker': window['speaker'],
+                'avg_logprob': float(np.mean([seg['avg_logprob'] for seg in window_segments])),
+                'no_speech_prob': float(np.max([seg['no_speech_prob'] for seg in window_segments]))
+            })
+
+        if i % batch_size == 0 or i == len(windows):
+            print(f"  已转写窗口 {i}/{len(windows)}")
+            segments.extend(batch_segments)
+            if on_batch:
+                on_batch(batch_segments, i, len(windows))
+            batch_segments = []
+
+    return {'text': "".join(seg['text'] for seg in segments), 'segments': segments}
+
+
+def speaker_transcripts_from_segments(segments: List[Dict[str, Any]]) -> Dict[str, list]:
+    """
+    按说话人归集已带标签的转写片段，输出格式与时间重叠匹配的结果一致
+
+    Returns:
+        {说话人: [{'start', 'end', 'text', 'duration', 'overlap_duration', 'overlap_ratio'}]}
+    """
+    speaker_transcripts = {}
+    for seg in segments:
+        duration = seg['end'] - seg['start']
+        speaker_transcripts.setdefault(seg['speaker'], []).append({
+            'start': seg['start'],
+            'end': seg['end'],
+            'text': seg['text'],
+            'duration': duration,
+            'overlap_duration': duration,
+            'overlap_ratio': 1.0 if duration > 0 else 0
+        })
+    return speaker_transcripts
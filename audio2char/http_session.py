@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享的HTTP会话
+本地模型接口和云端API共用连接池化的 requests.Session：同一主机的连接保持 keep-alive 复用，
+不必每次调用都重新建立TCP（云端API还有TLS）握手；遇到429、5xx和连接失败按指数退避自动重试，
+优先遵循服务端返回的 Retry-After。读取超时和已发出请求后断开的连接不重试：生成请求不是幂等的，
+重新提交会让服务端重复生成，调用方也要多等若干个超时
+
+连接池大小和重试参数由 config.env 中的 HTTP_POOL_SIZE、HTTP_MAX_RETRIES、HTTP_BACKOFF_FACTOR 配置。
+
+安装 aiohttp 后还提供异步版本：apost_json() 在事件循环中发送请求，重试规则与同步会话一致，
+每个后端（ollama、vllm、cloud 等）有各自的并发上限 LLM_MAX_CONCURRENCY，大量总结请求可以同时等待响应
+而不必各占一个线程；run_async() 把协程提交到后台常驻的事件循环，供同步代码调用。
+内置演示在本地启动一个HTTP桩服务，比较每次新建连接和复用会话的耗时，并验证重试：
+
+    python http_session.py --requests 50
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Tuple, Optional, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+DEFAULT_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+DEFAULT_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+DEFAULT_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+# 异步请求时每个后端同时在途的请求数上限
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+
+# 需要重试的状态码：限流和服务端临时错误
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_sessions: Dict[Tuple[int, int, float], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES,
+                   backoff_factor: float = DEFAULT_BACKOFF_FACTOR) -> requests.Session:
+    """
+    创建带连接池和重试的会话
+
+    Args:
+        pool_size: 每个主机保持的连接数，应不少于并发调用同一主机的线程数
+        max_retries: 连接失败、429和5xx的最大重试次数，0表示不重试；读取超时不重试
+        backoff_factor: 指数退避系数，第n次重试前等待 backoff_factor * 2^(n-1) 秒
+
+    Returns:
+        requests.Session
+    """
+    retry = Retry(
+        total=max_retries,
+        # 请求发出后的读取超时和断开不重试，避免重复提交耗时的生成请求
+        read=0,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        # 大模型接口都是POST，默认不会重试POST
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        # 重试用尽后返回最后一次的响应，由调用方按状态码处理
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES,
+                backoff_factor: float = DEFAULT_BACKOFF_FACTOR) -> requests.Session:
+    """返回进程内共享的会话，相同参数只创建一次，可在多个线程中同时使用"""
+    key = (pool_size, max_retries, backoff_factor)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = create_session(pool_size, max_retries, backoff_factor)
+        return _sessions[key]
+
+
+# =================== 异步请求 ===================
+# aiohttp 会话和信号量都绑定在创建它们的事件循环上，按事件循环分别保存
+_async_state = weakref.WeakKeyDictionary()
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def _loop_state() -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    if loop not in _async_state:
+        _async_state[loop] = {'session': None, 'semaphores': {}}
+    return _async_state[loop]
+
+
+def get_async_session(pool_size: int = DEFAULT_POOL_SIZE) -> "aiohttp.ClientSession":
+    """返回当前事件循环共享的 aiohttp 会话，连接保持 keep-alive 复用"""
+    if not AIOHTTP_AVAILABLE:
+        raise RuntimeError("异步请求需要安装 aiohttp: pip install aiohttp")
+    state = _loop_state()
+    if state['session'] is None or state['session'].closed:
+        state['session'] = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=pool_size))
+    return state['session']
+
+
+def backend_semaphore(backend: str, limit: int = DEFAULT_MAX_CONCURRENCY) -> asyncio.Semaphore:
+    """返回后端的并发上限信号量，同一事件循环中同名后端共用一个"""
+    semaphores = _loop_state()['semaphores']
+    if backend not in semaphores:
+        semaphores[backend] = asyncio.Semaphore(max(1, limit))
+    return semaphores[backend]
+
+
+async def apost_json(url: str, payload: Dict[str, Any], backend: str, headers: Optional[Dict[str, str]] = None,
+                     timeout: float = 60, max_retries: int = DEFAULT_MAX_RETRIES,
+                     backoff_factor: float = DEFAULT_BACKOFF_FACTOR) -> Tuple[int, str]:
+    """
+    异步发送JSON POST请求
+
+    Args:
+        url: 请求地址
+        payload: 请求体
+        backend: 后端名称，同名后端共用并发上限
+        headers: 请求头
+        timeout: 单次请求超时（秒）
+        max_retries: 连接失败、429和5xx的最大重试次数，读取超时不重试
+        backoff_factor: 指数退避系数，与同步会话相同
+
+    Returns:
+        (状态码, 响应文本)，重试用尽后返回最后一次的响应
+
+    Raises:
+        aiohttp.ClientError / asyncio.TimeoutError: 重试用尽后仍无法连接，或请求超时
+    """
+    session = get_async_session()
+    semaphore = backend_semaphore(backend)
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            # 只在请求期间占用并发名额，退避等待时让给其他请求
+            async with semaphore:
+                async with session.post(url, json=payload, headers=headers,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    text = await response.text()
+                    if response.status not in RETRY_STATUS_CODES or attempt == max_retries:
+                        return response.status, text
+                    retry_after = response.headers.get('Retry-After')
+        except aiohttp.ClientConnectorError:
+            # 只重试未能建立连接的请求，请求发出后的超时和断开直接抛出，避免重复提交生成请求
+            if attempt == max_retries:
+                raise
+        delay = backoff_factor * (2 ** attempt)
+        if retry_after and retry_after.isdigit():
+            delay = int(retry_after)
+        await asyncio.sleep(delay)
+
+
+def run_async(coro) -> concurrent.futures.Future:
+    """在后台常驻的事件循环中运行协程，供同步代码（如Web应用的工作线程）提交异步任务"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="http-async-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop)
+
+
+# =================== 本地桩服务演示 ===================
+def _start_stub_server(fail_first: int = 0, delay: float = 0.0, status: int = 503):
+    """启动本地HTTP桩服务，模拟OpenAI兼容接口；前 fail_first 次请求返回 status，每次响应前等待 delay 秒"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    stats = {'requests': 0, 'connections': set(), 'in_flight': 0, 'max_in_flight': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 才能保持连接；响应头和响应体一次写出，避免复用连接时触发Nagle与延迟确认的等待
+        protocol_version = "HTTP/1.1"
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with lock:
+                stats['requests'] += 1
+                stats['connections'].add(self.client_address)
+                failing = stats['requests'] <= fail_first
+                stats['in_flight'] += 1
+                stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+            time.sleep(delay)
+            with lock:
+                stats['in_flight'] -= 1
+            if failing:
+                body = b'{"error": "busy"}'
+                self.send_response(status)
+                self.send_header('Retry-After', '0')
+            else:
+                body = b'{"choices": [{"message": {"content": "ok"}}]}'
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def demo(num_requests: int = 50) -> Dict[str, float]:
+    """
+    对本地桩服务分别用 requests.post 和共享会话发送 num_requests 次请求；安装了 aiohttp 时
+    再异步并发发送 num_requests 次慢请求（每次0.2秒），验证并发上限
+
+    Returns:
+        {'plain_seconds', 'plain_connections', 'session_seconds', 'session_connections',
+         'retry_status', 'retry_attempts', 'async_seconds', 'async_max_in_flight'}
+    """
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "你好"}]}
+    results = {}
+
+    server, stats = _start_stub_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    started = time.perf_counter()
+    for _ in range(num_requests):
+        requests.post(url, json=payload, timeout=10).json()
+    results['plain_seconds'] = time.perf_counter() - started
+    results['plain_connections'] = len(stats['connections'])
+
+    stats['connections'].clear()
+    session = create_session()
+    started = time.perf_counter()
+    for _ in range(num_requests):
+        session.post(url, json=payload, timeout=10).json()
+    results['session_seconds'] = time.perf_counter() - started
+    results['session_connections'] = len(stats['connections'])
+    server.shutdown()
+
+    # 前两次返回503，第三次成功
+    server, stats = _start_stub_server(fail_first=2)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    response = create_session(max_retries=3, backoff_factor=0.1).post(url, json=payload, timeout=10)
+    results['retry_status'] = response.status_code
+    results['retry_attempts'] = stats['requests']
+    server.shutdown()
+
+    if AIOHTTP_AVAILABLE:
+        server, stats = _start_stub_server(delay=0.2)
+        url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+        async def fan_out():
+            return await asyncio.gather(*(apost_json(url, payload, backend="stub") for _ in range(num_requests)))
+
+        started = time.perf_counter()
+        run_async(fan_out()).result()
+        results['async_seconds'] = time.perf_counter() - started
+        results['async_max_in_flight'] = stats['max_in_flight']
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="共享HTTP会话演示（本地桩服务）")
+    parser.add_argument("--requests", type=int, default=50, help="请求次数 (默认: 50)")
+    args = parser.parse_args()
+
+    result = demo(args.requests)
+    print(f"📊 {args.requests} 次请求")
+    print(f"  requests.post: {result['plain_seconds'] * 1000:.0f}ms，建立连接 {result['plain_connections']} 次")
+    print(f"  共享会话:      {result['session_seconds'] * 1000:.0f}ms，建立连接 {result['session_connections']} 次")
+    print(f"  503重试: 共发送 {result['retry_attempts']} 次，最终状态码 {result['retry_status']}")
+    if 'async_seconds' in result:
+        print(f"  异步并发（每次0.2秒，上限 {DEFAULT_MAX_CONCURRENCY}）: {result['async_seconds']:.1f}秒，"
+              f"最多同时 {result['async_max_in_flight']} 个请求")
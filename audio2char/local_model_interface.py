@@ -10,6 +10,8 @@ import os
 import time
 from typing import Optional, Dict, Any
 
+from http_session import get_session, apost_json
+
 class LocalModelInterface:
     """本地大模型接口类"""
     
@@ -24,6 +26,8 @@ class LocalModelInterface:
         self.model_type = model_type.lower()
         self.config = self._get_default_config()
         self.config.update(kwargs)
+        # 各后端共用连接池化的会话，多次调用复用同一连接，429和5xx自动重试
+        self.session = get_session()
         
     def _get_default_config(self) -> Dict[str, Any]:
         """获取默认配置"""
@@ -77,129 +81,105 @@ class LocalModelInterface:
             print(f"❌ 本地模型调用失败: {e}")
             return None
     
-    def _call_ollama(self, messages: list, **kwargs) -> Optional[str]:
-        """调用Ollama模型"""
-        config = self.config["ollama"]
-        
-        # 构建Ollama格式的请求
-        prompt = self._messages_to_prompt(messages)
+    def _request_spec(self, model_type: str, messages: list, **kwargs) -> Dict[str, Any]:
+        """
+        构造各后端的请求，同步和异步调用共用
         
-        payload = {
-            "model": config["model_name"],
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": kwargs.get("temperature", 0.3),
-                "top_p": kwargs.get("top_p", 0.9),
-                "max_tokens": kwargs.get("max_tokens", 2000)
+        Returns:
+            {'label': 日志中的后端名称, 'url', 'payload', 'timeout', 'extract': 从响应JSON中取出文本的函数}
+        """
+        config = self.config[model_type]
+        
+        if model_type == "ollama":
+            # 构建Ollama格式的请求
+            return {
+                'label': "Ollama",
+                'url': f"{config['base_url']}/api/generate",
+                'payload': {
+                    "model": config["model_name"],
+                    "prompt": self._messages_to_prompt(messages),
+                    "stream": False,
+                    "options": {
+                        "temperature": kwargs.get("temperature", 0.3),
+                        "top_p": kwargs.get("top_p", 0.9),
+                        "max_tokens": kwargs.get("max_tokens", 2000)
+                    }
+                },
+                'timeout': config["timeout"],
+                'extract': lambda result: result.get("response", "")
             }
-        }
-        
-        try:
-            response = requests.post(
-                f"{config['base_url']}/api/generate",
-                json=payload,
-                timeout=config["timeout"]
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("response", "")
-            else:
-                print(f"❌ Ollama API错误: {response.status_code} - {response.text}")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Ollama连接失败: {e}")
-            return None
-    
-    def _call_lmstudio(self, messages: list, **kwargs) -> Optional[str]:
-        """调用LM Studio模型"""
-        config = self.config["lmstudio"]
         
+        # 其余后端都是OpenAI兼容的 chat/completions 接口，LM Studio 不需要模型名称
         payload = {
             "messages": messages,
             "temperature": kwargs.get("temperature", 0.3),
             "max_tokens": kwargs.get("max_tokens", 2000),
             "stream": False
         }
-        
+        if model_type != "lmstudio":
+            payload = dict({"model": config["model_name"]}, **payload)
+        return {
+            'label': {"lmstudio": "LM Studio", "vllm": "vLLM", "openai_local": "本地OpenAI"}[model_type],
+            'url': f"{config['base_url']}/v1/chat/completions",
+            'payload': payload,
+            'timeout': config["timeout"],
+            'extract': lambda result: result["choices"][0]["message"]["content"]
+        }
+    
+    def _post(self, spec: Dict[str, Any]) -> Optional[str]:
+        """通过共享会话发送请求并取出响应文本"""
         try:
-            response = requests.post(
-                f"{config['base_url']}/v1/chat/completions",
-                json=payload,
-                timeout=config["timeout"]
-            )
+            response = self.session.post(spec['url'], json=spec['payload'], timeout=spec['timeout'])
             
             if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
+                return spec['extract'](response.json())
             else:
-                print(f"❌ LM Studio API错误: {response.status_code} - {response.text}")
+                print(f"❌ {spec['label']} API错误: {response.status_code} - {response.text}")
                 return None
                 
         except requests.exceptions.RequestException as e:
-            print(f"❌ LM Studio连接失败: {e}")
+            print(f"❌ {spec['label']}连接失败: {e}")
             return None
     
+    def _call_ollama(self, messages: list, **kwargs) -> Optional[str]:
+        """调用Ollama模型"""
+        return self._post(self._request_spec("ollama", messages, **kwargs))
+    
+    def _call_lmstudio(self, messages: list, **kwargs) -> Optional[str]:
+        """调用LM Studio模型"""
+        return self._post(self._request_spec("lmstudio", messages, **kwargs))
+    
     def _call_vllm(self, messages: list, **kwargs) -> Optional[str]:
         """调用vLLM模型"""
-        config = self.config["vllm"]
-        
-        payload = {
-            "model": config["model_name"],
-            "messages": messages,
-            "temperature": kwargs.get("temperature", 0.3),
-            "max_tokens": kwargs.get("max_tokens", 2000),
-            "stream": False
-        }
-        
-        try:
-            response = requests.post(
-                f"{config['base_url']}/v1/chat/completions",
-                json=payload,
-                timeout=config["timeout"]
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            else:
-                print(f"❌ vLLM API错误: {response.status_code} - {response.text}")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ vLLM连接失败: {e}")
-            return None
+        return self._post(self._request_spec("vllm", messages, **kwargs))
     
     def _call_openai_local(self, messages: list, **kwargs) -> Optional[str]:
         """调用本地OpenAI兼容API"""
-        config = self.config["openai_local"]
+        return self._post(self._request_spec("openai_local", messages, **kwargs))
+    
+    async def achat_completion(self, messages: list, **kwargs) -> Optional[str]:
+        """
+        chat_completion() 的异步版本，需要安装 aiohttp
         
-        payload = {
-            "model": config["model_name"],
-            "messages": messages,
-            "temperature": kwargs.get("temperature", 0.3),
-            "max_tokens": kwargs.get("max_tokens", 2000),
-            "stream": False
-        }
+        同一后端的并发请求数受 LLM_MAX_CONCURRENCY 限制，等待响应时不占用线程，
+        适合同时为多个任务或长转写的多个分段生成总结
         
+        Returns:
+            模型响应文本，失败返回None
+        """
+        if self.model_type not in self.config or not isinstance(self.config[self.model_type], dict):
+            print(f"❌ 不支持的模型类型: {self.model_type}")
+            return None
+        spec = self._request_spec(self.model_type, messages, **kwargs)
         try:
-            response = requests.post(
-                f"{config['base_url']}/v1/chat/completions",
-                json=payload,
-                timeout=config["timeout"]
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            else:
-                print(f"❌ 本地OpenAI API错误: {response.status_code} - {response.text}")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ 本地OpenAI连接失败: {e}")
+            status, text = await apost_json(spec['url'], spec['payload'], backend=self.model_type,
+                                            timeout=spec['timeout'])
+            if status == 200:
+                return spec['extract'](json.loads(text))
+            print(f"❌ {spec['label']} API错误: {status} - {text}")
+            return None
+        except Exception as e:
+            print(f"❌ {spec['label']}连接失败: {e}")
             return None
     
     def _messages_to_prompt(self, messages: list) -> str:
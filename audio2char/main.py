@@ -1,11 +1,106 @@
 from pyannote.audio import Pipeline
-from pydub import AudioSegment
 import os
 import whisper
 import json
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 import torch
 import numpy as np
+from typing import Optional, Dict, Any, List, Tuple
+
+from audio_loader import load_audio, SAMPLE_RATE
+from parallel_transcription import ChunkedTranscriber, speech_regions_from_diarization
+from alignment import TranscriptIndex, word_level_transcripts
+from cache import ResultCache, get_cache
+from manifest import load_manifest, save_manifest, audio_fingerprint, load_stage, save_stage, stage_outputs
+from pipeline_events import PipelineEvents, STAGE_LABELS, label_segments
+from diarized_transcription import (build_speaker_windows, transcribe_windows, transcribe_windows_with_backend,
+                                    speaker_transcripts_from_segments)
+from refinement import refine_transcription
+from asr_backends import DEFAULT_BACKEND, BACKENDS, OpenAIWhisperBackend, create_backend
+from cpu_inference import (parse_cpu_list, available_cores, pin_process, pin_thread, configure_threads,
+                           quantize_whisper, model_size_mb, peak_memory_mb, mean_confidence)
+from diarization_process import DiarizationProcess
+
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
+DEFAULT_MODEL_SIZE = "medium"  # 可选: "tiny", "base", "small", "medium", "large"
+
+# 可以按任务单独指定的处理参数，例如用 small 模型快速出草稿
+JOB_SETTINGS = ('model_size', 'draft_model_size', 'language', 'initial_prompt', 'min_speakers', 'max_speakers',
+                'min_segment_duration', 'transcribe_mode', 'alignment_mode')
+TRANSCRIBE_MODES = ('full', 'chunked', 'diarized', 'two_pass')
+ALIGNMENT_MODES = ('word', 'segment')
+
+
+def validate_settings(settings: Optional[Dict[str, Any]],
+                      defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    校验并规范化任务处理参数（如上传请求中的表单字段）
+    
+    Args:
+        settings: {参数名: 值}，值可以是字符串；值为None或空字符串的参数忽略
+        defaults: 未指定的参数使用的默认值，用于检查 min_speakers 和 max_speakers 的组合
+        
+    Returns:
+        转换为正确类型的参数
+        
+    Raises:
+        ValueError: 参数名未知或取值无效
+    """
+    converters = {
+        'model_size': str,
+        'draft_model_size': str,
+        'language': str,
+        'initial_prompt': str,
+        'min_speakers': int,
+        'max_speakers': int,
+        'min_segment_duration': float,
+        'transcribe_mode': str,
+        'alignment_mode': str
+    }
+    result = {}
+    for name, value in (settings or {}).items():
+        if value is None or value == '':
+            continue
+        if name not in converters:
+            raise ValueError(f"不支持的处理参数: {name}")
+        try:
+            result[name] = converters[name](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"处理参数 {name} 的取值无效: {value}")
+    
+    for name in ('model_size', 'draft_model_size'):
+        if name in result and result[name] not in whisper.available_models():
+            raise ValueError(f"不支持的模型大小: {result[name]}")
+    if 'transcribe_mode' in result and result['transcribe_mode'] not in TRANSCRIBE_MODES:
+        raise ValueError(f"不支持的转写模式: {result['transcribe_mode']}")
+    if 'alignment_mode' in result and result['alignment_mode'] not in ALIGNMENT_MODES:
+        raise ValueError(f"不支持的对齐方式: {result['alignment_mode']}")
+    for name in ('min_speakers', 'max_speakers'):
+        if name in result and result[name] < 1:
+            raise ValueError(f"{name} 必须大于0")
+    merged = dict(defaults or {}, **result)
+    if merged.get('min_speakers', 1) > merged.get('max_speakers', merged.get('min_speakers', 1)):
+        raise ValueError("min_speakers 不能大于 max_speakers")
+    if result.get('min_segment_duration', 0) < 0:
+        raise ValueError("min_segment_duration 不能为负数")
+    return result
+
+
+def settings_from_env() -> Dict[str, Any]:
+    """从环境变量（config.env）读取处理参数，未设置的参数不返回"""
+    names = {
+        'WHISPER_MODEL_SIZE': 'model_size',
+        'DRAFT_MODEL_SIZE': 'draft_model_size',
+        'MIN_SPEAKERS': 'min_speakers',
+        'MAX_SPEAKERS': 'max_speakers',
+        'MIN_SEGMENT_DURATION': 'min_segment_duration',
+        'TRANSCRIBE_MODE': 'transcribe_mode',
+        'ALIGNMENT_MODE': 'alignment_mode'
+    }
+    return validate_settings({name: os.getenv(env) for env, name in names.items()})
 
 # 音频文件路径 - 支持多种格式
 def find_audio_file():
@@ -20,11 +115,14 @@ def find_audio_file():
     if not audio_files:
         print("错误：当前目录下没有找到音频文件")
         print("支持的格式：", ', '.join(audio_extensions))
-        exit(1)
+        return None
     
     # 优先选择 wav 文件，然后是 mp3，最后是其他格式
     priority_order = ['.wav', '.mp3', '.m4a', '.flac', '.aac', '.ogg']
     
+    if len(audio_files) > 1:
+        print(f"⚠️ 当前目录下有 {len(audio_files)} 个音频文件，只处理其中一个；批量处理请使用: python batch.py .")
+    
     for ext in priority_order:
         for file in audio_files:
             if file.lower().endswith(ext):
@@ -32,437 +130,1185 @@ def find_audio_file():
     
     return audio_files[0]  # 如果没找到优先格式，返回第一个
 
-audio_file = find_audio_file()
-wav_file = "audio_converted.wav"
-
-# 创建输出目录
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-output_dir = f"transcripts_{timestamp}"
-os.makedirs(output_dir, exist_ok=True)
-
-print(f"找到音频文件：{audio_file}")
-
-print(f"正在处理音频文件：{audio_file}")
-
-# 将音频转换为 wav 格式，支持多种输入格式
-print("正在转换音频格式...")
-
-def get_file_format(filename):
-    """获取文件格式"""
-    ext = os.path.splitext(filename)[1].lower()
-    format_map = {
-        '.wav': 'wav',
-        '.mp3': 'mp3', 
-        '.m4a': 'm4a',
-        '.flac': 'flac',
-        '.aac': 'aac',
-        '.ogg': 'ogg'
-    }
-    return format_map.get(ext, 'wav')
-
-file_format = get_file_format(audio_file)
-print(f"检测到文件格式：{file_format}")
-
-try:
-    # 尝试使用pydub转换
-    print("使用pydub进行音频转换...")
-    audio = AudioSegment.from_file(audio_file, format=file_format)
+def deduplicate_segments(segments, similarity_threshold=0.8, window_seconds=5.0):
+    """
+    去除重复的语音片段
     
-    # 提升音频质量：16kHz采样率、单声道，适合语音识别
-    audio = audio.set_frame_rate(16000).set_channels(1)
+    按开始时间顺序扫描，只与时间窗口内已保留的片段比较，字符集合每个片段只计算一次
+    """
+    if not segments:
+        return segments
     
-    # 如果是wav格式且质量已经符合要求，直接复制
-    if file_format == 'wav':
-        # 检查现有wav文件是否已经是16kHz单声道
-        try:
-            existing_audio = AudioSegment.from_wav(audio_file)
-            if existing_audio.frame_rate == 16000 and existing_audio.channels == 1:
-                print("现有wav文件已符合要求，直接使用")
-                import shutil
-                shutil.copy2(audio_file, wav_file)
-                print(f"音频文件已复制为：{wav_file}")
-            else:
-                audio.export(wav_file, format="wav")
-                print(f"音频已转换为：{wav_file}")
-        except:
-            audio.export(wav_file, format="wav")
-            print(f"音频已转换为：{wav_file}")
-    else:
-        audio.export(wav_file, format="wav")
-        print(f"音频已转换为：{wav_file}")
+    # 按开始时间排序
+    segments = sorted(segments, key=lambda x: x['start'])
+    
+    # 去除重复
+    deduplicated = []
+    window = deque()  # 时间窗口内已保留的片段 (开始时间, 字符集合)
+    for current_seg in segments:
+        # 移出与当前片段开始时间相差超过窗口的片段
+        while window and current_seg['start'] - window[0][0] >= window_seconds:
+            window.popleft()
         
-except Exception as e:
-    print(f"pydub转换失败：{e}")
-    print("尝试使用ffmpeg直接转换...")
-    try:
-        import subprocess
-        # 使用ffmpeg直接转换，支持更多格式
-        cmd = [
-            "ffmpeg", "-i", audio_file, 
-            "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le",
-            "-y", wav_file
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"ffmpeg转换成功：{wav_file}")
-        else:
-            print(f"ffmpeg转换失败：{result.stderr}")
-            print("尝试使用sox转换...")
-            # 备用方案：使用sox
-            try:
-                cmd_sox = ["sox", audio_file, "-r", "16000", "-c", "1", wav_file]
-                result_sox = subprocess.run(cmd_sox, capture_output=True, text=True)
-                if result_sox.returncode == 0:
-                    print(f"sox转换成功：{wav_file}")
-                else:
-                    print(f"sox转换失败：{result_sox.stderr}")
-                    exit(1)
-            except:
-                print("所有转换方法都失败，请确保安装了ffmpeg或sox")
-                exit(1)
-    except Exception as e2:
-        print(f"ffmpeg转换也失败：{e2}")
-        exit(1)
+        current_chars = set(current_seg['text']) if current_seg['text'] else None
+        is_duplicate = False
+        if current_chars:
+            for _, prev_chars in window:
+                # 简单的字符重叠相似度
+                if prev_chars and len(current_chars & prev_chars) / len(current_chars | prev_chars) > similarity_threshold:
+                    is_duplicate = True
+                    break
+        
+        if not is_duplicate:
+            deduplicated.append(current_seg)
+            window.append((current_seg['start'], current_chars))
+    
+    return deduplicated
 
-# 加载说话人分离模型
-print("正在加载说话人分离模型...")
-pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1")
 
-# 优化说话人分离参数
-print("正在对整个音频文件进行说话人分离...")
-diarization = pipeline(
-    wav_file,
-    # 使用正确的参数格式，适合单人讲话
-    min_speakers=1,
-    max_speakers=3
-)
 
-# 收集说话人时间段
-speaker_segments = {}
-speaker_stats = {}
+def _notify(progress_callback, stage, message, progress):
+    """向调用方报告处理进度"""
+    if progress_callback:
+        progress_callback(stage, message, progress)
 
-for turn, _, speaker in diarization.itertracks(yield_label=True):
-    if speaker not in speaker_segments:
-        speaker_segments[speaker] = []
-        speaker_stats[speaker] = {
-            'total_duration': 0,
-            'segment_count': 0,
-            'avg_duration': 0
+class TranscriptionPipeline:
+    """
+    可重入的音频转写流水线
+    
+    各阶段可单独调用，模型只加载一次并在多次调用间复用：
+    convert（格式转换）→ diarize（说话人分离）→ transcribe（语音转写）
+    → align（说话人对齐）→ write（写出结果）
+    """
+    
+    def __init__(self, model_size: str = DEFAULT_MODEL_SIZE, **kwargs):
+        """
+        初始化转写流水线
+        
+        Args:
+            model_size: Whisper模型大小
+            **kwargs: 其他处理参数，见 _get_default_config
+        """
+        self.config = self._get_default_config()
+        self.config['model_size'] = model_size
+        self.config.update(kwargs)
+        
+        self.diarization_pipeline = None
+        self.diarization_process = None  # concurrent_diarization 模式下的说话人分离子进程
+        # 语音识别模型按模型大小缓存，任务可以单独指定模型大小
+        self.whisper_models = {}
+        self.asr_backends = {}
+        self.chunked_transcribers = {}
+        self.device = None
+        self.inference_info = None  # CPU绑定和线程数等推理配置，写入汇总
+        self.model_info = {}  # 按模型大小记录的推理精度和模型内存，two_pass 模式的草稿模型单独记录
+    
+    def _get_default_config(self) -> Dict[str, Any]:
+        """获取默认处理参数"""
+        return {
+            "model_size": DEFAULT_MODEL_SIZE,
+            "language": "zh",
+            # 添加提示词提高准确率
+            "initial_prompt": "这是一段关于科技、金融、投资的对话。",
+            # 使用正确的参数格式，适合单人讲话
+            "min_speakers": 1,
+            "max_speakers": 3,
+            "min_segment_duration": 0.5,  # 最小片段时长0.5秒
+            "overlap_threshold": 0.3,
+            "similarity_threshold": 0.8,
+            # 解码后的波形写入任务目录下的内存映射文件，适合数小时的超长录音
+            "decode_memmap": False,
+            # 转写模式："full" 整段顺序转写，"chunked" 在静音处分块并行转写，
+            # "diarized" 只转写说话人分离得到的语音区间，
+            # "two_pass" 先用小模型快速出草稿，再用大模型只重新转写低置信度片段
+            "transcribe_mode": "full",
+            "draft_model_size": "base",  # two_pass 模式的草稿模型
+            # 草稿片段满足任一条件时用大模型重新转写
+            "refine_logprob_threshold": -0.5,
+            "refine_no_speech_threshold": 0.5,
+            "refine_compression_ratio_threshold": 2.4,
+            "transcribe_workers": None,  # 分块并行转写的进程数，默认CPU核数的一半
+            "chunk_seconds": 120.0,
+            # 语音识别后端："openai-whisper" 或 "faster-whisper"（CTranslate2，CPU上int8量化）
+            "asr_backend": DEFAULT_BACKEND,
+            # 计算精度：faster-whisper 默认CPU上int8；openai-whisper 在CPU上设为 "int8" 时做动态int8量化
+            "asr_compute_type": None,
+            # CPU推理线程：intra-op 为0时使用可绑定的全部核，inter-op 为0时保持torch默认值
+            "cpu_threads": 0,
+            "cpu_interop_threads": 0,
+            # 绑定的CPU核（如 "0-7"），多个任务共用一台机器时为各任务分配不同的核
+            "cpu_affinity": None,
+            # 为True时只绑定加载模型的线程而不是整个进程，供常驻模型服务的各工作线程分别绑定
+            "cpu_pin_thread": False,
+            # full 模式下说话人分离在独立进程中与语音识别同时进行，CPU核按 diarization_threads 划分
+            "concurrent_diarization": False,
+            "diarization_threads": 0,  # 说话人分离子进程的线程数，0表示可用CPU核的一半
+            "asr_batch_size": 8,  # diarized 模式下每批送入Whisper的窗口数
+            # 对齐方式："word" 按词级时间戳逐词分配说话人，"segment" 按整段重叠度匹配后去重
+            "alignment_mode": "word",
+            # 结果缓存目录，为None时不缓存；相同音频和参数直接复用解码、分离和识别结果
+            "cache_dir": None,
+            "cache_max_size_mb": 2048
         }
     
-    segment_info = {
-        'start': turn.start,
-        'end': turn.end,
-        'duration': turn.end - turn.start
-    }
+    # =================== 模型加载 ===================
+    def configure_cpu(self) -> Dict[str, Any]:
+        """绑定CPU核并设置torch线程数（只执行一次），返回推理配置"""
+        if self.inference_info is None:
+            cores = parse_cpu_list(self.config['cpu_affinity'])
+            intra_op = self.config['cpu_threads']
+            if self.config['concurrent_diarization']:
+                # 说话人分离子进程分走一部分核，主进程的语音识别只使用剩下的核
+                asr_cores, diarization_cores = self.split_cores()
+                cores = asr_cores if cores else None
+                intra_op = intra_op or len(asr_cores)
+            if cores:
+                if self.config['cpu_pin_thread']:
+                    pin_thread(cores)
+                else:
+                    pin_process(cores)
+            threads = configure_threads(intra_op, self.config['cpu_interop_threads'])
+            self.inference_info = {
+                'cpu_affinity': ",".join(str(core) for core in cores) if cores else None,
+                'intra_op_threads': threads['intra_op'],
+                'inter_op_threads': threads['inter_op']
+            }
+            if self.config['concurrent_diarization']:
+                self.inference_info['diarization_threads'] = len(diarization_cores)
+            print(f"CPU线程: intra-op {threads['intra_op']}，inter-op {threads['inter_op']}"
+                  + (f"，绑定CPU核 {self.inference_info['cpu_affinity']}" if cores else ""))
+        return self.inference_info
     
-    speaker_segments[speaker].append(segment_info)
-    speaker_stats[speaker]['total_duration'] += segment_info['duration']
-    speaker_stats[speaker]['segment_count'] += 1
-
-# 计算每个说话人的平均时长
-for speaker in speaker_stats:
-    if speaker_stats[speaker]['segment_count'] > 0:
-        speaker_stats[speaker]['avg_duration'] = speaker_stats[speaker]['total_duration'] / speaker_stats[speaker]['segment_count']
-
-print(f"识别到 {len(speaker_segments)} 个说话人")
-
-# 显示说话人统计信息
-print("\n说话人分离统计:")
-for speaker, stats in speaker_stats.items():
-    print(f"{speaker}:")
-    print(f"  - 总时长: {stats['total_duration']:.1f}秒")
-    print(f"  - 片段数: {stats['segment_count']}")
-    print(f"  - 平均时长: {stats['avg_duration']:.1f}秒")
-
-# 过滤过短的片段，提高质量
-print("\n正在过滤过短的语音片段...")
-min_segment_duration = 0.5  # 最小片段时长0.5秒
-filtered_speaker_segments = {}
-
-for speaker, segments in speaker_segments.items():
-    filtered_segments = [seg for seg in segments if seg['duration'] >= min_segment_duration]
-    if filtered_segments:
-        filtered_speaker_segments[speaker] = filtered_segments
-        print(f"{speaker}: {len(segments)} -> {len(filtered_segments)} 片段 (过滤掉 {len(segments) - len(filtered_segments)} 个短片段)")
-
-speaker_segments = filtered_speaker_segments
-
-# 加载更大的语音识别模型以提高准确率
-print("正在加载语音识别模型...")
-# 使用 medium 模型提高准确率，或使用 large 模型获得最佳效果
-model_size = "medium"  # 可选: "tiny", "base", "small", "medium", "large"
-whisper_model = whisper.load_model(model_size)
-
-# 检查是否有GPU可用
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"使用设备: {device}")
-if device == "cuda":
-    whisper_model = whisper_model.to(device)
-
-# 对整个音频进行转写
-print("正在对整个音频进行转写...")
-try:
-    # 使用 Whisper 转写整个音频，添加更多参数提高准确率
-    result = whisper_model.transcribe(
-        wav_file, 
-        language="zh",
-        task="transcribe",
-        fp16=False,  # 如果GPU内存不足，设为True
-        verbose=False,
-        # 添加提示词提高准确率
-        initial_prompt="这是一段关于科技、金融、投资的对话。",
-        # 启用时间戳
-        word_timestamps=True
-    )
-    
-    # 获取转写结果
-    full_transcript = result["text"].strip()
-    asr_segments = result.get("segments", [])
-    
-    print(f"完整转写结果: {full_transcript}")
-    print(f"转写片段数: {len(asr_segments)}")
-    
-except Exception as e:
-    print(f"转写失败: {e}")
-    exit(1)
-
-# 改进的时间戳匹配函数
-def find_matching_transcript(segment_start, segment_end, transcript_segments, overlap_threshold=0.3):
-    """查找与时间段匹配的转写内容，使用重叠度阈值"""
-    matching_texts = []
-    total_overlap = 0
-    
-    for seg in transcript_segments:
-        seg_start = seg['start']
-        seg_end = seg['end']
-        
-        # 计算重叠时间
-        overlap_start = max(segment_start, seg_start)
-        overlap_end = min(segment_end, seg_end)
-        overlap_duration = max(0, overlap_end - overlap_start)
-        
-        # 计算重叠比例
-        segment_duration = segment_end - segment_start
-        seg_duration = seg_end - seg_start
-        
-        if overlap_duration > 0:
-            # 计算重叠比例
-            overlap_ratio = overlap_duration / min(segment_duration, seg_duration)
+    def split_cores(self) -> Tuple[List[int], List[int]]:
+        """
+        concurrent_diarization 模式下把可用CPU核分给语音识别和说话人分离
+        
+        Returns:
+            (语音识别的核, 说话人分离的核)，只有一个核时两者共用
+        """
+        cores = parse_cpu_list(self.config['cpu_affinity']) or available_cores()
+        count = self.config['diarization_threads'] or max(1, len(cores) // 2)
+        if count >= len(cores):
+            return cores, cores
+        return cores[:len(cores) - count], cores[len(cores) - count:]
+    
+    def load_diarization_model(self):
+        """加载说话人分离模型（已加载则直接复用）"""
+        self.configure_cpu()
+        if self.diarization_pipeline is None:
+            print("正在加载说话人分离模型...")
+            self.diarization_pipeline = Pipeline.from_pretrained(DIARIZATION_MODEL)
+        return self.diarization_pipeline
+    
+    def load_diarization_process(self):
+        """启动说话人分离子进程（已启动则直接复用）"""
+        if self.diarization_process is None:
+            asr_cores, diarization_cores = self.split_cores()
+            # 只有配置了 cpu_affinity 时才绑定CPU核，否则只划分线程数
+            self.diarization_process = DiarizationProcess(
+                self.config,
+                cores=diarization_cores if self.config['cpu_affinity'] else None,
+                num_threads=len(diarization_cores)
+            ).start()
+        return self.diarization_process
+    
+    def load_whisper_model(self):
+        """加载语音识别模型（已加载则直接复用）"""
+        self.configure_cpu()
+        model_size = self.config['model_size']
+        if model_size not in self.whisper_models:
+            print(f"正在加载语音识别模型 ({model_size})...")
+            # 使用 medium 模型提高准确率，或使用 large 模型获得最佳效果
+            whisper_model = whisper.load_model(model_size)
             
-            # 如果重叠比例超过阈值，认为匹配
-            if overlap_ratio >= overlap_threshold:
-                matching_texts.append({
-                    'text': seg.get('text', ''),
-                    'overlap_ratio': overlap_ratio,
-                    'overlap_duration': overlap_duration,
-                    'seg_start': seg_start,
-                    'seg_end': seg_end
-                })
-                total_overlap += overlap_duration
+            # 检查是否有GPU可用
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            print(f"使用设备: {self.device}")
+            if self.device == "cuda":
+                whisper_model = whisper_model.to(self.device)
+                self.model_info[model_size] = {'precision': 'fp32'}
+            elif self.config['asr_compute_type'] == 'int8':
+                # CPU上对线性层做动态int8量化
+                fp32_mb = model_size_mb(whisper_model)
+                whisper_model = quantize_whisper(whisper_model)
+                int8_mb = model_size_mb(whisper_model)
+                print(f"已对Whisper做动态int8量化：模型 {fp32_mb:.0f}MB → {int8_mb:.0f}MB")
+                self.model_info[model_size] = {'precision': 'int8 (动态量化)', 'model_mb': round(int8_mb, 1),
+                                               'fp32_model_mb': round(fp32_mb, 1)}
+            else:
+                self.model_info[model_size] = {'precision': 'fp32',
+                                               'model_mb': round(model_size_mb(whisper_model), 1)}
+            self.whisper_models[model_size] = whisper_model
+        return self.whisper_models[model_size]
     
-    # 按重叠比例排序，优先选择重叠度高的
-    matching_texts.sort(key=lambda x: x['overlap_ratio'], reverse=True)
+    def load_asr_backend(self):
+        """加载配置的语音识别后端（已加载则直接复用）"""
+        model_size = self.config['model_size']
+        if model_size not in self.asr_backends:
+            name = self.config['asr_backend']
+            if name == OpenAIWhisperBackend.name:
+                # 与 diarized 模式共用同一份 openai-whisper 模型
+                backend = OpenAIWhisperBackend(model_size,
+                                               compute_type=self.config['asr_compute_type'])
+                backend.model = self.load_whisper_model()
+                backend.device = self.device
+            else:
+                print(f"正在加载语音识别模型（{name}）...")
+                inference_info = self.configure_cpu()
+                backend = create_backend(name, model_size,
+                                         cpu_threads=inference_info['intra_op_threads'],
+                                         compute_type=self.config['asr_compute_type'])
+                backend.load()
+                self.device = backend.device
+                self.model_info[model_size] = {
+                    'precision': backend.compute_type or ('int8_float16' if self.device == 'cuda' else 'int8')
+                }
+                print(f"使用设备: {self.device}")
+            self.asr_backends[model_size] = backend
+        return self.asr_backends[model_size]
     
-    # 返回匹配的文本
-    if matching_texts:
-        return ' '.join([item['text'] for item in matching_texts]), total_overlap
-    else:
-        return '', 0
-
-def deduplicate_segments(segments, similarity_threshold=0.8):
-    """去除重复的语音片段"""
-    if not segments:
-        return segments
+    def load_chunked_transcriber(self):
+        """启动分块并行转写的进程池（已启动则直接复用）"""
+        model_size = self.config['model_size']
+        if model_size not in self.chunked_transcribers:
+            self.chunked_transcribers[model_size] = ChunkedTranscriber(
+                model_size,
+                num_workers=self.config['transcribe_workers'],
+                chunk_seconds=self.config['chunk_seconds'],
+                backend=self.config['asr_backend'],
+                compute_type=self.config['asr_compute_type'],
+                cpu_affinity=parse_cpu_list(self.config['cpu_affinity'])
+            ).start()
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.configure_cpu()
+            self.model_info[model_size] = {'precision': self.config['asr_compute_type'] or 'fp32'}
+        return self.chunked_transcribers[model_size]
     
-    # 按开始时间排序
-    segments = sorted(segments, key=lambda x: x['start'])
+    def load_models(self):
+        """预热加载全部模型"""
+        if self.config['concurrent_diarization']:
+            self.load_diarization_process()
+        else:
+            self.load_diarization_model()
+        if self.config['transcribe_mode'] == 'chunked':
+            self.load_chunked_transcriber()
+        else:
+            self.load_asr_backend()
+        return self
     
-    # 计算文本相似度
-    def text_similarity(text1, text2):
-        """计算两个文本的相似度"""
-        if not text1 or not text2:
-            return 0.0
+    # =================== 结果缓存 ===================
+    def get_cache(self):
+        """获取结果缓存，未配置 cache_dir 时返回None"""
+        if not self.config['cache_dir']:
+            return None
+        return get_cache(self.config['cache_dir'], self.config['cache_max_size_mb'])
+    
+    def cache_keys(self, audio_digest: str) -> Dict[str, str]:
+        """
+        计算各阶段的缓存键，键中包含影响该阶段结果的模型版本、参数和上游阶段的键
         
-        # 简单的字符重叠相似度
-        set1 = set(text1)
-        set2 = set(text2)
-        intersection = set1.intersection(set2)
-        union = set1.union(set2)
+        Args:
+            audio_digest: 音频文件内容的 SHA-256
+            
+        Returns:
+            {'waveform', 'diarization', 'transcription', 'alignment'} 对应的键
+        """
+        import pyannote.audio
         
-        if not union:
-            return 0.0
+        waveform_params = {'sample_rate': SAMPLE_RATE, 'dtype': 'float32'}
+        diarization_params = {
+            'model': DIARIZATION_MODEL,
+            'version': getattr(pyannote.audio, '__version__', 'unknown'),
+            'min_speakers': self.config['min_speakers'],
+            'max_speakers': self.config['max_speakers']
+        }
+        transcription_params = {
+            'model': self.config['asr_backend'],
+            'version': BACKENDS[self.config['asr_backend']].version(),
+            'compute_type': self.config['asr_compute_type'],
+            'model_size': self.config['model_size'],
+            'language': self.config['language'],
+            'initial_prompt': self.config['initial_prompt'],
+            'transcribe_mode': self.config['transcribe_mode']
+        }
+        # 分块和按说话人窗口转写的结果依赖说话人分离结果
+        if self.config['transcribe_mode'] == 'chunked':
+            transcription_params.update(chunk_seconds=self.config['chunk_seconds'], diarization=diarization_params)
+        elif self.config['transcribe_mode'] == 'diarized':
+            transcription_params.update(min_segment_duration=self.config['min_segment_duration'],
+                                        diarization=diarization_params)
+        elif self.config['transcribe_mode'] == 'two_pass':
+            transcription_params.update({name: self.config[name] for name in (
+                'draft_model_size', 'refine_logprob_threshold', 'refine_no_speech_threshold',
+                'refine_compression_ratio_threshold')})
         
-        return len(intersection) / len(union)
+        keys = {
+            'waveform': ResultCache.make_key('waveform', audio_digest, waveform_params),
+            'diarization': ResultCache.make_key('diarization', audio_digest, diarization_params),
+            'transcription': ResultCache.make_key('transcription', audio_digest, transcription_params)
+        }
+        alignment_params = {
+            'diarization': keys['diarization'],
+            'transcription': keys['transcription'],
+            'min_segment_duration': self.config['min_segment_duration'],
+            'alignment_mode': self.config['alignment_mode']
+        }
+        # 重叠度匹配和去重只用于按片段对齐，词级对齐不受这两个阈值影响
+        if self.config['alignment_mode'] == 'segment':
+            alignment_params.update(overlap_threshold=self.config['overlap_threshold'],
+                                    similarity_threshold=self.config['similarity_threshold'])
+        keys['alignment'] = ResultCache.make_key('alignment', audio_digest, alignment_params)
+        return keys
     
-    # 去除重复
-    deduplicated = []
-    for i, current_seg in enumerate(segments):
-        is_duplicate = False
+    def needs_decode(self, audio_file: str, output_dir: Optional[str] = None) -> bool:
+        """
+        判断 run() 是否需要解码音频，供提前解码的调用方在结果可复用时跳过解码
         
-        # 检查与之前片段的相似度
-        for prev_seg in deduplicated:
-            similarity = text_similarity(current_seg['text'], prev_seg['text'])
+        Args:
+            audio_file: 音频文件路径
+            output_dir: 将要增量重新运行的输出目录
             
-            # 如果相似度很高且时间接近，认为是重复
-            if (similarity > similarity_threshold and 
-                abs(current_seg['start'] - prev_seg['start']) < 5.0):  # 5秒内的时间差
-                is_duplicate = True
-                break
+        Returns:
+            说话人分离和识别结果都可从输出目录或缓存复用、或缓存中已有波形时返回False
+        """
+        cache = self.get_cache()
+        manifest = load_manifest(output_dir) if output_dir else None
+        if cache is None and not (manifest and manifest['stages']):
+            return True
+        fingerprint = audio_fingerprint(audio_file, manifest.get('audio') if manifest else None)
+        keys = self.cache_keys(fingerprint['sha256'])
+        if cache and cache.contains(keys['waveform'], '.npy'):
+            return False
+        for stage in ('diarization', 'transcription'):
+            entry = manifest['stages'].get(stage, {}) if manifest else {}
+            saved = (entry.get('key') == keys[stage]
+                     and os.path.exists(os.path.join(output_dir, entry.get('file', ''))))
+            if not saved and not (cache and cache.contains(keys[stage])):
+                return True
+        return False
+    
+    # =================== 处理阶段 ===================
+    def convert(self, audio_file: str, memmap_path: Optional[str] = None) -> np.ndarray:
+        """
+        将音频一次性流式解码为 16kHz 单声道 float32 波形，支持多种输入格式
         
-        if not is_duplicate:
-            deduplicated.append(current_seg)
+        Args:
+            audio_file: 输入音频文件路径
+            memmap_path: 指定时波形写入该内存映射文件而非常驻内存
+            
+        Returns:
+            一维 float32 波形，可直接交给 diarize() 和 transcribe()
+        """
+        return load_audio(audio_file, memmap_path=memmap_path)
     
-    return deduplicated
-
-# 为每个说话人分配转写内容
-speaker_transcripts = {}
-
-for speaker, spk_segments in speaker_segments.items():
-    print(f"\n处理 {speaker} 的时间段...")
-    speaker_transcripts[speaker] = []
-    
-    for i, segment in enumerate(spk_segments):
-        start_time = segment['start']
-        end_time = segment['end']
-        print(f"  时间段 {i+1}/{len(speaker_segments[speaker])}: {start_time:.1f}s - {end_time:.1f}s")
-        
-        # 查找匹配的转写内容
-        matching_text, total_overlap = find_matching_transcript(start_time, end_time, asr_segments)
-        
-        speaker_transcripts[speaker].append({
-            'start': start_time,
-            'end': end_time,
-            'text': matching_text,
-            'duration': end_time - start_time,
-            'overlap_duration': total_overlap,
-            'overlap_ratio': total_overlap / (end_time - start_time) if (end_time - start_time) > 0 else 0
+    @staticmethod
+    def _diarization_input(audio):
+        """构造说话人分离模型的输入：文件路径或内存中的16kHz单声道波形"""
+        if isinstance(audio, np.ndarray):
+            waveform = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))
+            return {"waveform": waveform.unsqueeze(0), "sample_rate": SAMPLE_RATE}
+        return audio
+    
+    def diarize(self, audio, hook=None) -> Dict[str, Any]:
+        """
+        说话人分离
+        
+        Args:
+            audio: 16kHz单声道float32波形（convert() 的返回值），或wav文件路径
+            hook: pyannote Pipeline 的进度回调，见 PipelineEvents.diarization_hook
+            
+        Returns:
+            {'speaker_segments': {说话人: [{'start', 'end', 'duration'}]},
+             'speaker_stats': {说话人: {'total_duration', 'segment_count', 'avg_duration'}}}
+        """
+        diarization_pipeline = self.load_diarization_model()
+        
+        # 优化说话人分离参数
+        print("正在对整个音频文件进行说话人分离...")
+        diarization = diarization_pipeline(
+            self._diarization_input(audio),
+            min_speakers=self.config['min_speakers'],
+            max_speakers=self.config['max_speakers'],
+            **({'hook': hook} if hook else {})
+        )
+        
+        # 收集说话人时间段
+        speaker_segments = {}
+        speaker_stats = {}
+        
+        for turn, _, speaker in diarization.itertracks(yield_label=True):
+            if speaker not in speaker_segments:
+                speaker_segments[speaker] = []
+                speaker_stats[speaker] = {
+                    'total_duration': 0,
+                    'segment_count': 0,
+                    'avg_duration': 0
+                }
+            
+            segment_info = {
+                'start': turn.start,
+                'end': turn.end,
+                'duration': turn.end - turn.start
+            }
+            
+            speaker_segments[speaker].append(segment_info)
+            speaker_stats[speaker]['total_duration'] += segment_info['duration']
+            speaker_stats[speaker]['segment_count'] += 1
+        
+        # 计算每个说话人的平均时长
+        for speaker in speaker_stats:
+            if speaker_stats[speaker]['segment_count'] > 0:
+                speaker_stats[speaker]['avg_duration'] = speaker_stats[speaker]['total_duration'] / speaker_stats[speaker]['segment_count']
+        
+        print(f"识别到 {len(speaker_segments)} 个说话人")
+        
+        # 显示说话人统计信息
+        print("\n说话人分离统计:")
+        for speaker, stats in speaker_stats.items():
+            print(f"{speaker}:")
+            print(f"  - 总时长: {stats['total_duration']:.1f}秒")
+            print(f"  - 片段数: {stats['segment_count']}")
+            print(f"  - 平均时长: {stats['avg_duration']:.1f}秒")
+        
+        return {
+            'speaker_segments': speaker_segments,
+            'speaker_stats': speaker_stats
+        }
+    
+    def transcribe(self, audio, diarization: Optional[Dict[str, Any]] = None,
+                   events: Optional[PipelineEvents] = None) -> Dict[str, Any]:
+        """
+        对整个音频进行转写
+        
+        Args:
+            audio: 16kHz单声道float32波形（convert() 的返回值），或wav文件路径
+            diarization: diarize() 的返回结果，chunked 模式用于在静音处切分，
+                diarized 模式用于只转写语音区间
+            events: 结构化事件，用于报告识别进度并逐块发送已转写的片段
+            
+        Returns:
+            {'text': 完整转写文本, 'segments': Whisper转写片段列表}，
+            diarized 模式下每个片段带有 speaker 字段
+        """
+        options = self._transcribe_options()
+        
+        mode = self.config['transcribe_mode'] if isinstance(audio, np.ndarray) else 'full'
+        if mode in ('chunked', 'diarized') and diarization is None:
+            mode = 'full'
+        
+        if mode == 'two_pass':
+            return self.refine(audio, self.draft(audio, events), diarization, events)
+        
+        def on_progress(segments, completed, total):
+            """每完成一块，发送该块的片段和识别进度"""
+            if events is None:
+                return
+            if diarization is not None:
+                segments = label_segments(segments, diarization['speaker_segments'])
+            events.segments(segments)
+            events.audio_progress('recognition', completed / total)
+        
+        try:
+            if mode == 'chunked':
+                # 在静音处分块，由多个进程并行转写
+                speech_regions = speech_regions_from_diarization(diarization['speaker_segments'])
+                result = self.load_chunked_transcriber().transcribe(audio, options, speech_regions,
+                                                                    on_chunk=on_progress)
+            elif mode == 'diarized':
+                # 只转写语音区间，同一说话人的相邻片段合并为窗口后批量转写
+                windows = build_speaker_windows(
+                    diarization['speaker_segments'],
+                    min_duration=self.config['min_segment_duration']
+                )
+                print(f"按说话人窗口转写：{len(windows)} 个窗口")
+                backend = self.load_asr_backend()
+                if backend.name == OpenAIWhisperBackend.name:
+                    result = transcribe_windows(
+                        backend.model, audio, windows, options,
+                        batch_size=self.config['asr_batch_size'],
+                        on_batch=on_progress
+                    )
+                else:
+                    # 其他后端不支持批量解码接口，逐个窗口转写
+                    result = transcribe_windows_with_backend(
+                        backend, audio, windows, options,
+                        batch_size=self.config['asr_batch_size'],
+                        on_batch=on_progress
+                    )
+            else:
+                backend = self.load_asr_backend()
+                print("正在对整个音频进行转写...")
+                # 使用 Whisper 转写整个音频，添加更多参数提高准确率
+                progress = (lambda fraction: events.audio_progress('recognition', fraction)) if events else None
+                result = backend.transcribe(audio, progress=progress, **options)
+        except Exception as e:
+            print(f"转写失败: {e}")
+            raise RuntimeError(f"转写失败: {e}")
+        
+        # 获取转写结果
+        full_transcript = result["text"].strip()
+        asr_segments = result.get("segments", [])
+        
+        print(f"完整转写结果: {full_transcript}")
+        print(f"转写片段数: {len(asr_segments)}")
+        
+        return {
+            'text': full_transcript,
+            'segments': asr_segments
+        }
+    
+    def _transcribe_options(self) -> Dict[str, Any]:
+        """语音识别参数"""
+        return dict(
+            language=self.config['language'],
+            task="transcribe",
+            fp16=False,  # 如果GPU内存不足，设为True
+            verbose=False,
+            initial_prompt=self.config['initial_prompt'],
+            # 启用时间戳
+            word_timestamps=True
+        )
+    
+    def draft(self, audio: np.ndarray, events: Optional[PipelineEvents] = None) -> Dict[str, Any]:
+        """
+        two_pass 模式的第一遍：用小模型快速转写整段音频，草稿片段立即发送
+        
+        Returns:
+            {'text', 'segments'}，片段不带说话人标签
+        """
+        with self.job_settings({'model_size': self.config['draft_model_size']}):
+            backend = self.load_asr_backend()
+            print(f"正在用 {self.config['model_size']} 模型快速生成草稿...")
+            progress = (lambda fraction: events.audio_progress('draft', fraction)) if events else None
+            result = backend.transcribe(audio, progress=progress, **self._transcribe_options())
+        
+        segments = [seg for seg in result.get('segments', []) if seg['text'].strip()]
+        for i, seg in enumerate(segments):
+            seg['id'] = i
+        if events is not None:
+            events.segments(segments)
+        print(f"草稿片段数: {len(segments)}")
+        return {'text': result['text'].strip(), 'segments': segments}
+    
+    def refine(self, audio: np.ndarray, draft: Dict[str, Any], diarization: Optional[Dict[str, Any]] = None,
+               events: Optional[PipelineEvents] = None) -> Dict[str, Any]:
+        """
+        two_pass 模式的第二遍：用配置的大模型重新转写草稿中的低置信度片段并就地替换
+        
+        Args:
+            audio: 16kHz单声道float32波形
+            draft: draft() 的返回结果
+            diarization: diarize() 的返回结果，用于为精修后的片段标注说话人
+            events: 结构化事件，用于发送替换草稿的片段
+            
+        Returns:
+            {'text', 'segments', 'refined_segments', 'draft_segments', 'draft_model_size'}
+        """
+        def on_window(draft_ids, segments, completed, total):
+            if events is None:
+                return
+            if diarization is not None:
+                segments = label_segments(segments, diarization['speaker_segments'])
+            events.segment_update(draft_ids, segments)
+            events.audio_progress('recognition', completed / total)
+        
+        try:
+            result = refine_transcription(
+                self.load_asr_backend(), audio, draft, self._transcribe_options(),
+                on_window=on_window,
+                logprob_threshold=self.config['refine_logprob_threshold'],
+                no_speech_threshold=self.config['refine_no_speech_threshold'],
+                compression_ratio_threshold=self.config['refine_compression_ratio_threshold']
+            )
+        except Exception as e:
+            print(f"精修失败: {e}")
+            raise RuntimeError(f"精修失败: {e}")
+        result['text'] = result['text'].strip()
+        result['draft_model_size'] = self.config['draft_model_size']
+        return result
+    
+    def submit_diarization(self, audio: np.ndarray):
+        """把说话人分离提交给子进程，返回 Future"""
+        return self.load_diarization_process().submit(audio, {
+            'min_speakers': self.config['min_speakers'],
+            'max_speakers': self.config['max_speakers']
         })
+    
+    def diarize_and_transcribe(self, audio: np.ndarray, events: PipelineEvents):
+        """
+        说话人分离在子进程中与主进程的语音识别同时进行，两者都完成后返回
         
-        if matching_text:
-            overlap_ratio = total_overlap / (end_time - start_time) if (end_time - start_time) > 0 else 0
-            print(f"    转写结果: {matching_text[:50]}...")
-            print(f"    重叠度: {overlap_ratio:.2f} ({total_overlap:.1f}s/{end_time - start_time:.1f}s)")
+        Returns:
+            (diarize() 的结果, transcribe() 的结果)
+        """
+        events.stage_start('diarization', '正在进行说话人分离（与语音识别同时进行）...')
+        future = self.submit_diarization(audio)
+        events.stage_start('recognition', '正在进行语音识别...')
+        try:
+            transcription = self.transcribe(audio, events=events)
+        finally:
+            # 识别失败时也等待子进程完成，避免下一个任务排在未完成的分离之后
+            diarization = future.result() if future.exception() is None else None
+        events.stage_end('recognition', f"语音识别完成，共 {len(transcription['segments'])} 个片段")
+        if diarization is None:
+            raise RuntimeError(f"说话人分离失败: {future.exception()}")
+        events.stage_end('diarization', f"说话人分离完成，识别到 {len(diarization['speaker_segments'])} 个说话人")
+        return diarization, transcription
+    
+    def align(self, diarization: Dict[str, Any], transcription: Dict[str, Any]) -> Dict[str, list]:
+        """
+        为每个说话人分配转写内容
+        
+        Args:
+            diarization: diarize() 的返回结果
+            transcription: transcribe() 的返回结果
+            
+        Returns:
+            {说话人: [{'start', 'end', 'text', 'duration', 'overlap_duration', 'overlap_ratio'}]}
+        """
+        asr_segments = transcription['segments']
+        
+        # diarized 模式的转写片段已带有说话人标签，无需按时间重叠匹配
+        if asr_segments and all('speaker' in seg for seg in asr_segments):
+            print("\n转写片段已带有说话人标签，直接按说话人归集")
+            return speaker_transcripts_from_segments(asr_segments)
+        
+        # 过滤过短的片段，提高质量
+        print("\n正在过滤过短的语音片段...")
+        min_segment_duration = self.config['min_segment_duration']
+        speaker_segments = {}
+        
+        for speaker, segments in diarization['speaker_segments'].items():
+            filtered_segments = [seg for seg in segments if seg['duration'] >= min_segment_duration]
+            if filtered_segments:
+                speaker_segments[speaker] = filtered_segments
+                print(f"{speaker}: {len(segments)} -> {len(filtered_segments)} 片段 (过滤掉 {len(segments) - len(filtered_segments)} 个短片段)")
+        
+        # 词级对齐：每个词只归属一个说话人，无需再去重
+        if (self.config['alignment_mode'] == 'word' and asr_segments
+                and all('words' in seg for seg in asr_segments)):
+            print("\n正在按词级时间戳分配说话人...")
+            speaker_transcripts = word_level_transcripts(asr_segments, speaker_segments)
+            for speaker, utterances in speaker_transcripts.items():
+                print(f"{speaker}: {len(utterances)} 个语句")
+            return speaker_transcripts
+        
+        # 转写片段只建立一次索引，所有说话人时间段共用
+        index = TranscriptIndex(asr_segments)
+        speaker_transcripts = {}
+        
+        for speaker, spk_segments in speaker_segments.items():
+            turns = [(segment['start'], segment['end']) for segment in spk_segments]
+            matches = index.match(turns, overlap_threshold=self.config['overlap_threshold'])
+            
+            speaker_transcripts[speaker] = []
+            for (start_time, end_time), (matching_text, total_overlap) in zip(turns, matches):
+                speaker_transcripts[speaker].append({
+                    'start': start_time,
+                    'end': end_time,
+                    'text': matching_text,
+                    'duration': end_time - start_time,
+                    'overlap_duration': total_overlap,
+                    'overlap_ratio': total_overlap / (end_time - start_time) if (end_time - start_time) > 0 else 0
+                })
+            
+            matched = sum(1 for text, _ in matches if text)
+            print(f"{speaker}: {matched}/{len(turns)} 个时间段匹配到转写内容")
+        
+        # 对每个说话人的转写结果进行去重
+        print("\n正在去除重复的语音片段...")
+        for speaker in speaker_transcripts:
+            original_count = len(speaker_transcripts[speaker])
+            speaker_transcripts[speaker] = deduplicate_segments(
+                speaker_transcripts[speaker],
+                similarity_threshold=self.config['similarity_threshold']
+            )
+            deduplicated_count = len(speaker_transcripts[speaker])
+            print(f"{speaker}: {original_count} -> {deduplicated_count} 片段 (去除 {original_count - deduplicated_count} 个重复片段)")
+        
+        return speaker_transcripts
+    
+    def write(self, output_dir: str, audio_file: str, transcription: Dict[str, Any],
+              speaker_transcripts: Dict[str, list], run_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        保存转写结果
+        
+        Args:
+            output_dir: 输出目录
+            audio_file: 原始音频文件路径（写入结果头信息）
+            transcription: transcribe() 的返回结果
+            speaker_transcripts: align() 的返回结果
+            run_stats: 运行统计（耗时、内存、推理配置和置信度），写入汇总
+            
+        Returns:
+            {'output_dir', 'full_transcript_file', 'summary_file', 'speaker_files'}
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        asr_segments = transcription['segments']
+        model_size = self.config['model_size']
+        device = self.device
+        min_segment_duration = self.config['min_segment_duration']
+        speaker_files = {}
+        
+        # 保存每个说话人的转写结果
+        for speaker, transcripts in speaker_transcripts.items():
+            if not transcripts:
+                continue
+                
+            # 计算统计信息
+            total_duration = sum(seg['duration'] for seg in transcripts)
+            valid_segments = [seg for seg in transcripts if seg['text'].strip()]
+            avg_overlap_ratio = sum(seg['overlap_ratio'] for seg in valid_segments) / len(valid_segments) if valid_segments else 0
+            
+            # 保存详细JSON
+            detailed_file = os.path.join(output_dir, f"{speaker}_detailed.json")
+            with open(detailed_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'speaker': speaker,
+                    'total_duration': total_duration,
+                    'segment_count': len(valid_segments),
+                    'avg_overlap_ratio': avg_overlap_ratio,
+                    'quality_score': min(1.0, avg_overlap_ratio * 2),  # 质量评分
+                    'segments': transcripts
+                }, f, ensure_ascii=False, indent=2)
+            
+            # 保存纯文本
+            text_file = os.path.join(output_dir, f"{speaker}_transcript.txt")
+            with open(text_file, 'w', encoding='utf-8') as f:
+                f.write(f"# {speaker} 转写结果\n")
+                f.write(f"总发言时长: {total_duration:.1f}秒\n")
+                f.write(f"有效片段数: {len(valid_segments)}\n")
+                f.write(f"平均重叠度: {avg_overlap_ratio:.2f}\n")
+                f.write(f"质量评分: {min(1.0, avg_overlap_ratio * 2):.2f}\n\n")
+                
+                for seg in transcripts:
+                    if seg['text'].strip():
+                        overlap_info = f" (重叠度: {seg['overlap_ratio']:.2f})" if seg['overlap_ratio'] > 0 else ""
+                        f.write(f"[{seg['start']:.1f}s - {seg['end']:.1f}s]{overlap_info} {seg['text']}\n")
+            
+            speaker_files[speaker] = {'detailed': detailed_file, 'transcript': text_file}
+            print(f"\n{speaker} 的转写结果已保存到:")
+            print(f"  - {detailed_file}")
+            print(f"  - {text_file}")
+            print(f"  - 质量评分: {min(1.0, avg_overlap_ratio * 2):.2f}")
+        
+        # 保存完整转写结果
+        full_transcript_file = self.write_full_transcript(output_dir, audio_file, transcription)
+        
+        # 生成汇总文件
+        summary_file = os.path.join(output_dir, "summary.txt")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write(f"# 音频转写汇总\n")
+            f.write(f"音频文件: {audio_file}\n")
+            f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"使用模型: {model_size}\n")
+            f.write(f"处理设备: {device}\n")
+            f.write(f"说话人分离参数: min_speakers={self.config['min_speakers']}, "
+                    f"max_speakers={self.config['max_speakers']}\n")
+            f.write(f"最小片段时长: {min_segment_duration}秒\n")
+            if self.config['alignment_mode'] == 'segment':
+                f.write(f"对齐方式: 按片段匹配（重叠度阈值 {self.config['overlap_threshold']}，"
+                        f"去重相似度阈值 {self.config['similarity_threshold']}）\n")
+            else:
+                f.write("对齐方式: 词级时间戳\n")
+            if 'refined_segments' in transcription:
+                f.write(f"两遍转写: 草稿模型 {transcription['draft_model_size']}，"
+                        f"精修 {transcription['refined_segments']}/{transcription['draft_segments']} 个低置信度片段\n")
+            f.write("\n")
+            
+            if run_stats:
+                f.write("## 运行统计\n\n")
+                f.write(f"音频时长: {run_stats['audio_seconds']:.1f}秒\n")
+                f.write(f"总耗时: {run_stats['total_seconds']:.1f}秒（实时率 {run_stats['rtf']:.3f}）\n")
+                if run_stats.get('first_segment_seconds') is not None:
+                    f.write(f"首段文字用时: {run_stats['first_segment_seconds']:.1f}秒\n")
+                for stage, seconds in run_stats['stage_seconds'].items():
+                    f.write(f"  - {STAGE_LABELS.get(stage, stage)}: {seconds:.1f}秒\n")
+                f.write(f"进程峰值内存: {run_stats['peak_memory_mb']:.0f}MB\n")
+                inference = run_stats.get('inference') or {}
+                if inference:
+                    f.write(f"推理精度: {inference.get('precision', '-')}\n")
+                    if inference.get('fp32_model_mb'):
+                        f.write(f"模型内存: {inference['model_mb']:.0f}MB（fp32 {inference['fp32_model_mb']:.0f}MB）\n")
+                    elif inference.get('model_mb'):
+                        f.write(f"模型内存: {inference['model_mb']:.0f}MB\n")
+                    draft = inference.get('draft')
+                    if draft:
+                        f.write(f"草稿模型 {draft['model_size']}: 推理精度 {draft.get('precision', '-')}"
+                                + (f"，模型内存 {draft['model_mb']:.0f}MB" if draft.get('model_mb') else "") + "\n")
+                    f.write(f"CPU线程: intra-op {inference.get('intra_op_threads')}，"
+                            f"inter-op {inference.get('inter_op_threads')}\n")
+                    if inference.get('diarization_threads'):
+                        f.write(f"说话人分离子进程线程: {inference['diarization_threads']}（与语音识别同时进行）\n")
+                    if inference.get('cpu_affinity'):
+                        f.write(f"绑定CPU核: {inference['cpu_affinity']}\n")
+                if run_stats.get('confidence') is not None:
+                    f.write(f"平均识别置信度: {run_stats['confidence']:.3f}\n")
+                f.write("\n")
+            
+            # 完整转写
+            f.write("## 完整转写\n\n")
+            full_text = "".join(seg['text'] for seg in asr_segments)
+            f.write(full_text + "\n\n")
+            f.write("=" * 50 + "\n\n")
+            
+            # 按说话人分类
+            for speaker, transcripts in speaker_transcripts.items():
+                if not transcripts:
+                    continue
+                    
+                valid_segments = [seg for seg in transcripts if seg['text'].strip()]
+                total_duration = sum(seg['duration'] for seg in transcripts)
+                avg_overlap_ratio = sum(seg['overlap_ratio'] for seg in valid_segments) / len(valid_segments) if valid_segments else 0
+                quality_score = min(1.0, avg_overlap_ratio * 2)
+                
+                f.write(f"## {speaker}\n")
+                f.write(f"总发言时长: {total_duration:.1f}秒\n")
+                f.write(f"发言片段数: {len(valid_segments)}\n")
+                f.write(f"平均重叠度: {avg_overlap_ratio:.2f}\n")
+                f.write(f"质量评分: {quality_score:.2f}\n\n")
+                
+                for seg in valid_segments:
+                    overlap_info = f" (重叠度: {seg['overlap_ratio']:.2f})" if seg['overlap_ratio'] > 0 else ""
+                    f.write(f"[{seg['start']:.1f}s - {seg['end']:.1f}s]{overlap_info} {seg['text']}\n")
+                
+                f.write("\n" + "=" * 50 + "\n\n")
+        
+        print(f"\n完整转写结果已保存到: {full_transcript_file}")
+        print(f"汇总结果已保存到: {summary_file}")
+        
+        return {
+            'output_dir': output_dir,
+            'full_transcript_file': full_transcript_file,
+            'summary_file': summary_file,
+            'speaker_files': speaker_files
+        }
+    
+    def write_full_transcript(self, output_dir: str, audio_file: str, transcription: Dict[str, Any],
+                              draft: bool = False) -> str:
+        """
+        保存完整转写结果 full_transcript.txt
+        
+        Args:
+            draft: 为True时标注为草稿，精修完成后由 write() 覆盖
+            
+        Returns:
+            文件路径
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        full_transcript_file = os.path.join(output_dir, "full_transcript.txt")
+        with open(full_transcript_file, 'w', encoding='utf-8') as f:
+            f.write(f"# 完整音频转写结果\n")
+            f.write(f"音频文件: {audio_file}\n")
+            f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"使用模型: {self.config['draft_model_size'] if draft else self.config['model_size']}\n")
+            f.write(f"处理设备: {self.device}\n")
+            if draft:
+                f.write(f"状态: 草稿，正在用 {self.config['model_size']} 模型精修低置信度片段\n")
+            f.write("\n")
+            
+            for seg in transcription['segments']:
+                f.write(f"[{seg['start']:.1f}s - {seg['end']:.1f}s] {seg['text']}\n")
+        return full_transcript_file
+    
+    # =================== 增量执行 ===================
+    STAGE_NAMES = {'diarization': '说话人分离结果', 'transcription': '语音识别结果', 'alignment': '对齐结果'}
+    
+    def _reuse_stage(self, output_dir: str, manifest: Dict[str, Any], cache, keys: Dict[str, str], stage: str):
+        """依次从输出目录的阶段结果和结果缓存中查找可复用的结果，都未命中返回None"""
+        data = load_stage(output_dir, manifest, stage, keys[stage])
+        if data is not None:
+            print(f"♻️ 复用已保存的{self.STAGE_NAMES[stage]}")
+            return data
+        if cache:
+            data = cache.get_json(keys[stage])
+            if data is not None:
+                print(f"♻️ 命中缓存：{self.STAGE_NAMES[stage]}")
+        return data
+    
+    @staticmethod
+    def _save_stage(output_dir: str, manifest: Dict[str, Any], keys: Dict[str, str], stage: str, data):
+        """阶段结果有变化或结果文件缺失时保存到输出目录并更新清单"""
+        entry = manifest['stages'].get(stage, {})
+        if entry.get('key') != keys[stage] or not os.path.exists(os.path.join(output_dir, entry.get('file', ''))):
+            save_stage(output_dir, manifest, stage, keys[stage], data)
+    
+    def _run_stats(self, started: float, waveform, diarization: Dict[str, Any], transcription: Dict[str, Any],
+                   events: PipelineEvents) -> Dict[str, Any]:
+        """汇总本次运行的耗时、峰值内存、推理配置和识别置信度"""
+        total_seconds = time.time() - started
+        if waveform is not None:
+            audio_seconds = len(waveform) / SAMPLE_RATE
         else:
-            print(f"    无对应转写内容")
-
-# 对每个说话人的转写结果进行去重
-print("\n正在去除重复的语音片段...")
-for speaker in speaker_transcripts:
-    original_count = len(speaker_transcripts[speaker])
-    speaker_transcripts[speaker] = deduplicate_segments(speaker_transcripts[speaker])
-    deduplicated_count = len(speaker_transcripts[speaker])
-    print(f"{speaker}: {original_count} -> {deduplicated_count} 片段 (去除 {original_count - deduplicated_count} 个重复片段)")
-
-# 保存每个说话人的转写结果
-for speaker, transcripts in speaker_transcripts.items():
-    if not transcripts:
-        continue
-        
-    # 计算统计信息
-    total_duration = sum(seg['duration'] for seg in transcripts)
-    valid_segments = [seg for seg in transcripts if seg['text'].strip()]
-    avg_overlap_ratio = sum(seg['overlap_ratio'] for seg in valid_segments) / len(valid_segments) if valid_segments else 0
-    
-    # 保存详细JSON
-    detailed_file = os.path.join(output_dir, f"{speaker}_detailed.json")
-    with open(detailed_file, 'w', encoding='utf-8') as f:
-        json.dump({
-            'speaker': speaker,
-            'total_duration': total_duration,
-            'segment_count': len(valid_segments),
-            'avg_overlap_ratio': avg_overlap_ratio,
-            'quality_score': min(1.0, avg_overlap_ratio * 2),  # 质量评分
-            'segments': transcripts
-        }, f, ensure_ascii=False, indent=2)
-    
-    # 保存纯文本
-    text_file = os.path.join(output_dir, f"{speaker}_transcript.txt")
-    with open(text_file, 'w', encoding='utf-8') as f:
-        f.write(f"# {speaker} 转写结果\n")
-        f.write(f"总发言时长: {total_duration:.1f}秒\n")
-        f.write(f"有效片段数: {len(valid_segments)}\n")
-        f.write(f"平均重叠度: {avg_overlap_ratio:.2f}\n")
-        f.write(f"质量评分: {min(1.0, avg_overlap_ratio * 2):.2f}\n\n")
-        
-        for seg in transcripts:
-            if seg['text'].strip():
-                overlap_info = f" (重叠度: {seg['overlap_ratio']:.2f})" if seg['overlap_ratio'] > 0 else ""
-                f.write(f"[{seg['start']:.1f}s - {seg['end']:.1f}s]{overlap_info} {seg['text']}\n")
-    
-    print(f"\n{speaker} 的转写结果已保存到:")
-    print(f"  - {detailed_file}")
-    print(f"  - {text_file}")
-    print(f"  - 质量评分: {min(1.0, avg_overlap_ratio * 2):.2f}")
-
-# 保存完整转写结果
-full_transcript_file = os.path.join(output_dir, "full_transcript.txt")
-with open(full_transcript_file, 'w', encoding='utf-8') as f:
-    f.write(f"# 完整音频转写结果\n")
-    f.write(f"音频文件: {audio_file}\n")
-    f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    f.write(f"使用模型: {model_size}\n")
-    f.write(f"处理设备: {device}\n\n")
-    
-    for i, seg in enumerate(asr_segments):
-        f.write(f"[{seg['start']:.1f}s - {seg['end']:.1f}s] {seg['text']}\n")
-
-# 生成汇总文件
-summary_file = os.path.join(output_dir, "summary.txt")
-with open(summary_file, 'w', encoding='utf-8') as f:
-    f.write(f"# 音频转写汇总\n")
-    f.write(f"音频文件: {audio_file}\n")
-    f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    f.write(f"使用模型: {model_size}\n")
-    f.write(f"处理设备: {device}\n")
-    f.write(f"说话人分离参数: min_speakers=2, max_speakers=5\n")
-    f.write(f"最小片段时长: {min_segment_duration}秒\n\n")
-    
-    # 完整转写
-    f.write("## 完整转写\n\n")
-    full_text = "".join(seg['text'] for seg in asr_segments)
-    f.write(full_text + "\n\n")
-    f.write("=" * 50 + "\n\n")
-    
-    # 按说话人分类
-    for speaker, transcripts in speaker_transcripts.items():
-        if not transcripts:
-            continue
+            # 复用已有结果时未解码音频，按说话人分离和识别结果的最晚时间估计
+            audio_seconds = max([seg['end'] for segs in diarization['speaker_segments'].values() for seg in segs]
+                                + [seg['end'] for seg in transcription['segments']] + [0.0])
+        # 模型精度和内存按本任务使用的模型取，草稿模型单独列出
+        inference = dict(self.inference_info or {}, **self.model_info.get(self.config['model_size'], {}))
+        draft_info = self.model_info.get(self.config['draft_model_size'])
+        if self.config['transcribe_mode'] == 'two_pass' and draft_info:
+            inference['draft'] = dict(draft_info, model_size=self.config['draft_model_size'])
+        return {
+            'audio_seconds': audio_seconds,
+            'total_seconds': total_seconds,
+            'rtf': total_seconds / audio_seconds if audio_seconds else 0.0,
+            'stage_seconds': dict(events.stage_times),
+            'first_segment_seconds': events.first_segment_seconds,
+            'peak_memory_mb': peak_memory_mb(),
+            'inference': inference,
+            'confidence': mean_confidence(transcription['segments'])
+        }
+    
+    # =================== 完整流程 ===================
+    @contextmanager
+    def job_settings(self, settings: Optional[Dict[str, Any]] = None):
+        """在当前任务内使用单独指定的处理参数，任务结束后恢复流水线的默认参数"""
+        overrides = validate_settings(settings, self.config)
+        if not overrides:
+            yield self.config
+            return
+        default_config = self.config
+        self.config = dict(default_config, **overrides)
+        try:
+            yield self.config
+        finally:
+            self.config = default_config
+    
+    def run(self, audio_file: str, output_dir: Optional[str] = None, work_dir: Optional[str] = None,
+            progress_callback=None, settings: Optional[Dict[str, Any]] = None,
+            waveform: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        依次执行全部阶段处理单个音频文件
+        
+        音频只解码一次，得到的内存波形同时交给说话人分离和语音识别，不落地中间文件。
+        输出目录中的 manifest.json 记录各阶段的键，对已有输出目录重新运行时只执行失效的阶段
+        
+        Args:
+            audio_file: 音频文件路径
+            output_dir: 输出目录，为None时在工作目录（或当前目录）下按时间戳创建 transcripts_* 目录；
+                指定已有的 transcripts_* 目录时增量重新运行
+            work_dir: 任务独立的工作目录，启用 decode_memmap 时波形映射文件放在其中
+            progress_callback: 进度回调 callback(stage, message, progress, **extra)，
+                extra 中的 event 字段为结构化事件类型，见 pipeline_events
+            settings: 本任务单独指定的处理参数（见 JOB_SETTINGS），覆盖流水线的默认参数
+            waveform: 已解码的波形（如批处理中提前解码的下一个文件），提供时跳过解码
             
-        valid_segments = [seg for seg in transcripts if seg['text'].strip()]
-        total_duration = sum(seg['duration'] for seg in transcripts)
-        avg_overlap_ratio = sum(seg['overlap_ratio'] for seg in valid_segments) / len(valid_segments) if valid_segments else 0
-        quality_score = min(1.0, avg_overlap_ratio * 2)
-        
-        f.write(f"## {speaker}\n")
-        f.write(f"总发言时长: {total_duration:.1f}秒\n")
-        f.write(f"发言片段数: {len(valid_segments)}\n")
-        f.write(f"平均重叠度: {avg_overlap_ratio:.2f}\n")
-        f.write(f"质量评分: {quality_score:.2f}\n\n")
-        
-        for seg in valid_segments:
-            overlap_info = f" (重叠度: {seg['overlap_ratio']:.2f})" if seg['overlap_ratio'] > 0 else ""
-            f.write(f"[{seg['start']:.1f}s - {seg['end']:.1f}s]{overlap_info} {seg['text']}\n")
-        
-        f.write("\n" + "=" * 50 + "\n\n")
-
-print(f"\n完整转写结果已保存到: {full_transcript_file}")
-print(f"汇总结果已保存到: {summary_file}")
-
-# 清理临时文件
-if os.path.exists(wav_file):
-    os.remove(wav_file)
-    print(f"已删除临时文件：{wav_file}")
+        Returns:
+            write() 的返回结果，附带 speaker_transcripts 和 transcription
+        """
+        with self.job_settings(settings):
+            return self._run(audio_file, output_dir, work_dir, progress_callback, waveform)
+    
+    def _run(self, audio_file: str, output_dir: Optional[str], work_dir: Optional[str],
+             progress_callback, waveform: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """run() 的实现，self.config 为本任务的处理参数"""
+        # 创建输出目录
+        if output_dir is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_dir = os.path.join(work_dir or ".", f"transcripts_{timestamp}")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        print(f"正在处理音频文件：{audio_file}")
+        started = time.time()
+        
+        memmap_path = None
+        if self.config['decode_memmap'] and work_dir:
+            memmap_path = os.path.join(work_dir, "waveform.f32")
+        
+        # 对比输出目录中已有的阶段清单，未失效的阶段直接复用
+        manifest = load_manifest(output_dir)
+        manifest['audio'] = audio_fingerprint(audio_file, manifest.get('audio'))
+        keys = self.cache_keys(manifest['audio']['sha256'])
+        cache = self.get_cache()
+        events = PipelineEvents(progress_callback)
+        
+        try:
+            # 说话人分离和识别结果都可复用时无需解码，直接进入对齐和输出
+            diarization = self._reuse_stage(output_dir, manifest, cache, keys, 'diarization')
+            transcription = self._reuse_stage(output_dir, manifest, cache, keys, 'transcription')
+            
+            if waveform is None and (diarization is None or transcription is None):
+                if cache:
+                    waveform = cache.get_waveform(keys['waveform'], mmap=self.config['decode_memmap'])
+                    if waveform is not None:
+                        print("♻️ 命中缓存：解码后的波形")
+                if waveform is None:
+                    events.stage_start('decode', '正在解码音频...')
+                    waveform = self.convert(audio_file, memmap_path=memmap_path)
+                    events.stage_end('decode', f'音频解码完成（{len(waveform) / SAMPLE_RATE:.0f}秒）')
+                    if cache:
+                        cache.put_waveform(keys['waveform'], waveform)
+            
+            # two_pass 模式先用小模型出草稿，不等待说话人分离
+            draft = None
+            if transcription is None and self.config['transcribe_mode'] == 'two_pass':
+                events.stage_start('draft', f"正在用 {self.config['draft_model_size']} 模型快速生成草稿...")
+                draft = self.draft(waveform, events)
+                self.write_full_transcript(output_dir, audio_file, draft, draft=True)
+                events.stage_end('draft', f"草稿已生成（{len(draft['segments'])} 个片段），正在精修...")
+            
+            # full 模式的识别不依赖说话人分离结果，两者同时进行，在对齐前汇合
+            if (self.config['concurrent_diarization'] and self.config['transcribe_mode'] == 'full'
+                    and diarization is None and transcription is None):
+                diarization, transcription = self.diarize_and_transcribe(waveform, events)
+                if cache:
+                    cache.put_json(keys['diarization'], diarization)
+                    cache.put_json(keys['transcription'], transcription)
+                self._save_stage(output_dir, manifest, keys, 'diarization', diarization)
+                self._save_stage(output_dir, manifest, keys, 'transcription', transcription)
+            else:
+                events.stage_start('diarization', '正在进行说话人分离...')
+                if diarization is None:
+                    if self.config['concurrent_diarization']:
+                        # 其他模式的识别依赖分离结果，仍在子进程中分离但需要等待完成
+                        diarization = self.submit_diarization(waveform).result()
+                    else:
+                        diarization = self.diarize(waveform, hook=events.diarization_hook())
+                    if cache:
+                        cache.put_json(keys['diarization'], diarization)
+                self._save_stage(output_dir, manifest, keys, 'diarization', diarization)
+                events.stage_end('diarization', f"说话人分离完成，识别到 {len(diarization['speaker_segments'])} 个说话人")
+                
+                events.stage_start('recognition', '正在进行语音识别...')
+                if transcription is None:
+                    if draft is not None:
+                        transcription = self.refine(waveform, draft, diarization, events)
+                    else:
+                        transcription = self.transcribe(waveform, diarization=diarization, events=events)
+                    if cache:
+                        cache.put_json(keys['transcription'], transcription)
+                self._save_stage(output_dir, manifest, keys, 'transcription', transcription)
+                events.stage_end('recognition', f"语音识别完成，共 {len(transcription['segments'])} 个片段")
+            
+            events.stage_start('alignment', '正在为说话人分配转写内容...')
+            speaker_transcripts = self._reuse_stage(output_dir, manifest, None, keys, 'alignment')
+            if speaker_transcripts is None:
+                speaker_transcripts = self.align(diarization, transcription)
+                self._save_stage(output_dir, manifest, keys, 'alignment', speaker_transcripts)
+            if not events.segment_count:
+                # 整段转写或复用已有结果时没有逐块发送，对齐完成后按时间顺序一次性发送
+                events.segments(sorted(
+                    (dict(seg, speaker=speaker) for speaker, segs in speaker_transcripts.items()
+                     for seg in segs if seg['text'].strip()),
+                    key=lambda seg: seg['start']
+                ))
+            events.stage_end('alignment', '说话人分配完成')
+            
+            # 输出文件依赖对齐结果、音频路径和模型信息
+            output_key = ResultCache.make_key('output', manifest['audio']['sha256'], {
+                'alignment': keys['alignment'],
+                'audio_file': audio_file,
+                'model_size': self.config['model_size'],
+                'min_speakers': self.config['min_speakers'],
+                'max_speakers': self.config['max_speakers']
+            })
+            result = stage_outputs(manifest, output_key)
+            if result is None:
+                result = self.write(output_dir, audio_file, transcription, speaker_transcripts,
+                                    self._run_stats(started, waveform, diarization, transcription, events))
+                manifest['stages']['output'] = {'key': output_key, 'result': result}
+            else:
+                print("♻️ 输出文件未失效，跳过写入")
+            save_manifest(output_dir, manifest)
+            _notify(progress_callback, 'transcription_complete', '语音转写完成', 60)
+        finally:
+            # 清理内存映射的波形文件
+            if memmap_path and os.path.exists(memmap_path):
+                os.remove(memmap_path)
+        
+        print(f"\n所有结果已保存到目录: {output_dir}")
+        
+        result['speaker_transcripts'] = speaker_transcripts
+        result['transcription'] = transcription
+        return result
 
-print(f"\n所有结果已保存到目录: {output_dir}")
-print(f"优化说明:")
-print(f"- 使用 {model_size} 模型提高准确率")
-print(f"- 对整个音频进行转写，保持上下文完整性")
-print(f"- 优化说话人分离参数：min_speakers=2, max_speakers=5")
-print(f"- 使用重叠度阈值匹配，提高说话人分离准确性")
-print(f"- 过滤短片段（<{min_segment_duration}秒），提高质量")
-print(f"- 添加质量评分和重叠度统计")
-print(f"- 音频预处理：16kHz采样率，单声道")
-print(f"- 添加初始提示词提高中文识别准确率")
-print(f"- 显示置信度评分")
-print(f"- 保存完整转写结果和详细时间戳")
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+    
+    # 与Web应用共用 config.env 中的处理参数
+    try:
+        from dotenv import load_dotenv
+        load_dotenv('config.env')
+    except ImportError:
+        pass
+    
+    parser = argparse.ArgumentParser(description='音频转写（说话人分离 + 语音识别）')
+    parser.add_argument('audio', nargs='?', help='音频文件路径（默认自动查找当前目录下的音频文件）')
+    parser.add_argument('--output', '-o', help='输出目录（默认 transcripts_时间戳）')
+    parser.add_argument('--rerun', metavar='TRANSCRIPT_DIR',
+                        help='对已有的 transcripts_* 目录增量重新运行，只重新执行参数变化后失效的阶段')
+    parser.add_argument('--model-size', help='Whisper模型大小（默认读取 WHISPER_MODEL_SIZE）')
+    parser.add_argument('--language', help='识别语言')
+    parser.add_argument('--min-speakers', type=int, help='最少说话人数（默认读取 MIN_SPEAKERS）')
+    parser.add_argument('--max-speakers', type=int, help='最多说话人数（默认读取 MAX_SPEAKERS）')
+    parser.add_argument('--transcribe-mode', choices=TRANSCRIBE_MODES, help='转写模式')
+    parser.add_argument('--min-segment-duration', type=float, help='最小片段时长（秒）')
+    parser.add_argument('--overlap-threshold', type=float, help='重叠度匹配阈值')
+    parser.add_argument('--similarity-threshold', type=float, help='去重相似度阈值')
+    parser.add_argument('--compute-type', help='计算精度，CPU上为 int8 时对Whisper做动态int8量化')
+    parser.add_argument('--cpu-threads', type=int, help='intra-op 线程数（默认可用CPU核数）')
+    parser.add_argument('--cpu-interop-threads', type=int, help='inter-op 线程数')
+    parser.add_argument('--cpu-affinity', help='绑定的CPU核，如 0-7')
+    parser.add_argument('--concurrent-diarization', action='store_true',
+                        help='full 模式下说话人分离在独立进程中与语音识别同时进行')
+    parser.add_argument('--diarization-threads', type=int, help='说话人分离子进程的线程数（默认CPU核数的一半）')
+    args = parser.parse_args()
+    
+    if args.rerun:
+        args.output = args.rerun
+        # 未指定音频时使用清单中记录的音频文件
+        args.audio = args.audio or load_manifest(args.rerun).get('audio', {}).get('path')
+    
+    audio_file = args.audio or find_audio_file()
+    if not audio_file:
+        exit(1)
+    print(f"找到音频文件：{audio_file}")
+    
+    overrides = settings_from_env()
+    overrides.update({
+        name: value for name, value in (
+            ('model_size', args.model_size),
+            ('language', args.language),
+            ('min_speakers', args.min_speakers),
+            ('max_speakers', args.max_speakers),
+            ('transcribe_mode', args.transcribe_mode),
+            ('min_segment_duration', args.min_segment_duration),
+            ('overlap_threshold', args.overlap_threshold),
+            ('similarity_threshold', args.similarity_threshold),
+            ('asr_compute_type', args.compute_type),
+            ('cpu_threads', args.cpu_threads),
+            ('cpu_interop_threads', args.cpu_interop_threads),
+            ('cpu_affinity', args.cpu_affinity),
+            ('concurrent_diarization', args.concurrent_diarization or None),
+            ('diarization_threads', args.diarization_threads)
+        ) if value is not None
+    })
+    try:
+        validate_settings({name: overrides[name] for name in JOB_SETTINGS if name in overrides})
+    except ValueError as e:
+        print(f"参数错误: {e}")
+        exit(1)
+    pipeline = TranscriptionPipeline(**overrides)
+    try:
+        pipeline.run(audio_file, output_dir=args.output)
+    except Exception as e:
+        print(f"处理失败: {e}")
+        exit(1)
+    
+    model_size = pipeline.config['model_size']
+    min_segment_duration = pipeline.config['min_segment_duration']
+    print(f"优化说明:")
+    print(f"- 使用 {model_size} 模型提高准确率")
+    print(f"- 对整个音频进行转写，保持上下文完整性")
+    print(f"- 说话人分离参数：min_speakers={pipeline.config['min_speakers']}, "
+          f"max_speakers={pipeline.config['max_speakers']}")
+    if pipeline.config['alignment_mode'] == 'segment':
+        print(f"- 使用重叠度阈值匹配，提高说话人分离准确性")
+    else:
+        print("- 按词级时间戳分配说话人，每个词只归属一个说话人")
+    print(f"- 过滤短片段（<{min_segment_duration}秒），提高质量")
+    print(f"- 添加质量评分和重叠度统计")
+    print(f"- 音频预处理：16kHz采样率，单声道")
+    print(f"- 添加初始提示词提高中文识别准确率")
+    print(f"- 显示置信度评分")
+    print(f"- 保存完整转写结果和详细时间戳")
@@ -1,4 +1,4 @@
-import requests
+import asyncio
 import json
 import os
 import glob
@@ -8,6 +8,9 @@ from dotenv import load_dotenv
 # 加载配置文件
 load_dotenv('config.env')
 
+# 连接池和重试参数从 config.env 读取，需在加载配置之后导入
+from http_session import get_session, apost_json, AIOHTTP_AVAILABLE
+
 # 导入本地模型接口
 try:
     from local_model_interface import create_local_model_interface
@@ -46,24 +49,42 @@ USE_LOCAL_MODEL = os.getenv("USE_LOCAL_MODEL", "false").lower() == "true"
 LOCAL_MODEL_TYPE = os.getenv("LOCAL_MODEL_TYPE", "ollama")
 LOCAL_MODEL_NAME = os.getenv("LOCAL_MODEL_NAME", "qwen2.5:7b")
 
+def local_model_config(use_local_model=None, local_model_type=None, local_model_name=None):
+    """
+    本次调用使用的本地模型配置，未指定的项取 config.env 中的值
+    
+    Returns:
+        {'enabled', 'type', 'name'}，本地模型接口不可用时 enabled 为False
+    """
+    enabled = USE_LOCAL_MODEL if use_local_model is None else use_local_model
+    return {
+        'enabled': bool(enabled) and LOCAL_MODEL_AVAILABLE,
+        'type': local_model_type or LOCAL_MODEL_TYPE,
+        'name': local_model_name or LOCAL_MODEL_NAME
+    }
+
+# 异步总结时超过该长度的转写按行切分，各段同时总结后合并
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "12000"))
+
 OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # 检查API配置
-def check_api_config():
-    """检查API配置是否正确"""
+def check_api_config(local_model=None):
+    """检查API配置是否正确，local_model 为 local_model_config() 的结果，默认读取 config.env"""
     print("=== API配置检查 ===")
+    local_model = local_model or local_model_config()
     
-    if USE_LOCAL_MODEL and LOCAL_MODEL_AVAILABLE:
+    if local_model['enabled']:
         print("🏠 使用本地模型模式")
-        print(f"本地模型类型: {LOCAL_MODEL_TYPE}")
-        print(f"本地模型名称: {LOCAL_MODEL_NAME}")
+        print(f"本地模型类型: {local_model['type']}")
+        print(f"本地模型名称: {local_model['name']}")
         
         # 测试本地模型连接
         try:
             local_interface = create_local_model_interface(
-                LOCAL_MODEL_TYPE, 
-                model_name=LOCAL_MODEL_NAME
+                local_model['type'], 
+                model_name=local_model['name']
             )
             if local_interface.test_connection():
                 print("✅ 本地模型连接成功")
@@ -158,9 +179,9 @@ def find_latest_transcript(specific_dir=None):
     
     return None
 
-def summarize_conversation(transcript):
-    """调用API进行对话结构化分析"""
-    prompt = f"""请对以下多人对话进行深度分析，必须严格按照JSON格式输出：
+def _summary_prompt(transcript):
+    """构造对话结构化分析的提示词"""
+    return f"""请对以下多人对话进行深度分析，必须严格按照JSON格式输出：
 
 {{
     "main_topics": ["主题1", "主题2", "主题3"],
@@ -176,21 +197,27 @@ def summarize_conversation(transcript):
 对话内容：
 {transcript}
 """
+
+def summarize_conversation(transcript, local_model=None):
+    """调用API进行对话结构化分析"""
+    prompt = _summary_prompt(transcript)
+    local_model = local_model or local_model_config()
     
     # 根据配置选择使用本地模型还是云端API
-    if USE_LOCAL_MODEL and LOCAL_MODEL_AVAILABLE:
-        return summarize_conversation_local(transcript, prompt)
+    if local_model['enabled']:
+        return summarize_conversation_local(transcript, prompt, local_model)
     else:
         return summarize_conversation_cloud(transcript, prompt)
 
-def summarize_conversation_local(transcript, prompt):
+def summarize_conversation_local(transcript, prompt, local_model=None):
     """使用本地模型进行对话分析"""
+    local_model = local_model or local_model_config()
     try:
         print("🏠 使用本地模型进行分析...")
         
         local_interface = create_local_model_interface(
-            LOCAL_MODEL_TYPE, 
-            model_name=LOCAL_MODEL_NAME
+            local_model['type'], 
+            model_name=local_model['name']
         )
         
         messages = [{"role": "user", "content": prompt}]
@@ -212,8 +239,8 @@ def summarize_conversation_local(transcript, prompt):
         print("🔄 切换到云端API")
         return summarize_conversation_cloud(transcript, prompt)
 
-def summarize_conversation_cloud(transcript, prompt):
-    """使用云端API进行对话分析"""
+def _cloud_request(prompt):
+    """构造云端API的请求体和请求头"""
     payload = {
         "model": MODEL_NAME,
         "messages": [{"role": "user", "content": prompt}],
@@ -225,13 +252,19 @@ def summarize_conversation_cloud(transcript, prompt):
         "Authorization": f"Bearer {API_KEY}",
         "Content-Type": "application/json"
     }
+    return payload, headers
+
+def summarize_conversation_cloud(transcript, prompt):
+    """使用云端API进行对话分析"""
+    payload, headers = _cloud_request(prompt)
     
     try:
         print(f"☁️  正在调用云端API: {API_URL}")
         print(f"使用模型: {MODEL_NAME}")
         print(f"请求头: Authorization: Bearer {API_KEY[:8]}...")
         
-        response = requests.post(API_URL, json=payload, headers=headers, timeout=30)
+        # 共享会话复用与云端API的TLS连接，限流和服务端临时错误时按指数退避重试
+        response = get_session().post(API_URL, json=payload, headers=headers, timeout=30)
         
         if response.status_code != 200:
             print(f"API响应状态码: {response.status_code}")
@@ -247,38 +280,116 @@ def summarize_conversation_cloud(transcript, prompt):
             print(f"响应内容: {e.response.text}")
         return None
 
-def create_mindmap_data(summary_json):
-    """将总结结果转换为脑图结构"""
+# =================== 异步总结 ===================
+def split_transcript(transcript, max_chars=SUMMARY_CHUNK_CHARS):
+    """按行把过长的转写切分为不超过 max_chars 的分段，单行超长时单独成段"""
+    chunks = []
+    current = ""
+    for line in transcript.splitlines(keepends=True):
+        if current and len(current) + len(line) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current.strip():
+        chunks.append(current)
+    return chunks or [transcript]
+
+def merge_summaries(summaries):
+    """合并各分段的总结JSON：列表按顺序去重拼接，说话人观点按说话人合并"""
+    merged = {"main_topics": [], "speaker_points": {}, "action_items": [], "risks": [], "opportunities": []}
+    for summary in summaries:
+        for key in ("main_topics", "action_items", "risks", "opportunities"):
+            merged[key].extend(item for item in summary.get(key, []) if item not in merged[key])
+        for speaker, points in summary.get("speaker_points", {}).items():
+            speaker_points = merged["speaker_points"].setdefault(speaker, [])
+            speaker_points.extend(point for point in points if point not in speaker_points)
+    return merged
+
+async def asummarize_conversation_local(prompt, local_model=None):
+    """使用本地模型异步分析单段对话，失败时改用云端API"""
+    local_model = local_model or local_model_config()
+    local_interface = create_local_model_interface(local_model['type'], model_name=local_model['name'])
+    response = await local_interface.achat_completion(
+        [{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=2000
+    )
+    if response:
+        return response
+    print("❌ 本地模型分析失败，尝试云端API")
+    return await asummarize_conversation_cloud(prompt)
+
+async def asummarize_conversation_cloud(prompt):
+    """使用云端API异步分析单段对话"""
+    payload, headers = _cloud_request(prompt)
+    try:
+        status, text = await apost_json(API_URL, payload, backend="cloud", headers=headers, timeout=30)
+        if status != 200:
+            print(f"API响应状态码: {status}")
+            print(f"API响应内容: {text}")
+            return None
+        return json.loads(text)['choices'][0]['message']['content']
+    except Exception as e:
+        print(f"云端API调用失败: {str(e)}")
+        return None
+
+async def asummarize_conversation(transcript, local_model=None):
+    """
+    summarize_conversation() 的异步版本，需要安装 aiohttp
+    
+    转写超过 SUMMARY_CHUNK_CHARS 时按行切分，各段同时请求大模型（同一后端的并发数受
+    LLM_MAX_CONCURRENCY 限制），解析后合并为一份总结JSON
+    """
+    chunks = split_transcript(transcript)
+    local_model = local_model or local_model_config()
+    use_local = local_model['enabled']
+    print(f"{'🏠 使用本地模型' if use_local else '☁️  使用云端API'}异步分析对话（{len(chunks)} 段）...")
+    
+    responses = await asyncio.gather(*(
+        asummarize_conversation_local(_summary_prompt(chunk), local_model) if use_local
+        else asummarize_conversation_cloud(_summary_prompt(chunk))
+        for chunk in chunks
+    ))
+    if len(chunks) == 1:
+        return responses[0]
+    summaries = [parse_summary(response) for response in responses if response]
+    summaries = [summary for summary in summaries if isinstance(summary, dict)]
+    if not summaries:
+        return None
+    if len(summaries) < len(chunks):
+        print(f"⚠️ {len(chunks) - len(summaries)} 段总结失败，仅合并成功的 {len(summaries)} 段")
+    return json.dumps(merge_summaries(summaries), ensure_ascii=False)
+
+def parse_summary(summary_json):
+    """解析大模型返回的总结JSON，无法解析时返回None"""
     try:
         # 尝试直接解析JSON
-        summary_data = json.loads(summary_json)
+        return json.loads(summary_json)
     except json.JSONDecodeError:
         print("JSON解析失败，尝试提取JSON部分...")
         # 尝试从文本中提取JSON部分
         start_idx = summary_json.find('{')
         end_idx = summary_json.rfind('}') + 1
         if start_idx != -1 and end_idx != 0:
-            json_str = summary_json[start_idx:end_idx]
             try:
-                summary_data = json.loads(json_str)
-            except:
+                return json.loads(summary_json[start_idx:end_idx])
+            except json.JSONDecodeError:
                 print("无法解析JSON，使用默认结构")
-                summary_data = {
-                    "main_topics": ["对话分析"],
-                    "speaker_points": {"SPEAKER_00": ["主要观点"], "SPEAKER_01": ["次要观点"]},
-                    "action_items": ["待办事项"],
-                    "risks": ["风险点"],
-                    "opportunities": ["机会点"]
-                }
         else:
             print("未找到JSON结构，使用默认结构")
-            summary_data = {
-                "main_topics": ["对话分析"],
-                "speaker_points": {"SPEAKER_00": ["主要观点"], "SPEAKER_01": ["次要观点"]},
-                "action_items": ["待办事项"],
-                "risks": ["风险点"],
-                "opportunities": ["机会点"]
-            }
+    return None
+
+def create_mindmap_data(summary_json):
+    """将总结结果转换为脑图结构"""
+    summary_data = parse_summary(summary_json)
+    if summary_data is None:
+        summary_data = {
+            "main_topics": ["对话分析"],
+            "speaker_points": {"SPEAKER_00": ["主要观点"], "SPEAKER_01": ["次要观点"]},
+            "action_items": ["待办事项"],
+            "risks": ["风险点"],
+            "opportunities": ["机会点"]
+        }
     
     mindmap_structure = {
         "name": f"对话分析-{datetime.now().strftime('%Y%m%d')}",
@@ -312,8 +423,14 @@ def create_mindmap_data(summary_json):
     }
     return mindmap_structure
 
-def generate_html_mindmap(mindmap_data):
-    """生成包含ECharts思维导图的HTML文件"""
+def generate_html_mindmap(mindmap_data, output_path=None):
+    """
+    生成包含ECharts思维导图的HTML文件
+    
+    Args:
+        mindmap_data: 脑图结构
+        output_path: 输出HTML路径，默认 output/mindmap.html
+    """
     # 将mindmap_data转换为JSON字符串
     mindmap_json = json.dumps(mindmap_data, ensure_ascii=False, indent=2)
     
@@ -482,29 +599,68 @@ def generate_html_mindmap(mindmap_data):
     </html>
     """
     
-    output_path = os.path.join(OUTPUT_DIR, "mindmap.html")
+    if output_path is None:
+        output_path = os.path.join(OUTPUT_DIR, "mindmap.html")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(html_content)
     print(f"思维导图已生成：{output_path}")
     return output_path
 
 # =================== 主程序流程 ===================
-if __name__ == "__main__":
+def generate_mindmap(transcript_dir=None, output_path=None, use_local_model=None, local_model_type=None,
+                     local_model_name=None):
+    """
+    根据转写结果生成思维导图，可在进程内被直接调用
+    
+    Args:
+        transcript_dir: 转写结果目录，为None时自动查找当前目录下最新的 transcripts_* 目录
+        output_path: 输出HTML路径，默认 output/mindmap.html
+        use_local_model: 是否使用本地模型，为None时读取 config.env 中的 USE_LOCAL_MODEL
+        local_model_type: 本地模型类型，默认 LOCAL_MODEL_TYPE
+        local_model_name: 本地模型名称，默认 LOCAL_MODEL_NAME
+        
+    Returns:
+        生成的思维导图HTML路径
+    """
     print("开始处理对话总结...")
+    local_model = local_model_config(use_local_model, local_model_type, local_model_name)
     
     # 检查API配置
-    api_config_valid = check_api_config()
+    api_config_valid = check_api_config(local_model)
+    transcript = _load_transcript(transcript_dir)
     
-    # 使用指定的转写目录进行测试
-    # 自动查找最新的转写目录
-    transcript_dirs = glob.glob("transcripts_*")
-    if transcript_dirs:
-        specific_dir = max(transcript_dirs, key=os.path.getctime)
-    else:
-        specific_dir = None
+    raw_summary = None
+    if api_config_valid:
+        print("调用API进行对话分析...")
+        raw_summary = summarize_conversation(transcript, local_model)
+    return _write_mindmap(raw_summary, api_config_valid, output_path)
+
+async def agenerate_mindmap(transcript_dir=None, output_path=None, use_local_model=None, local_model_type=None,
+                            local_model_name=None):
+    """
+    generate_mindmap() 的异步版本，等待大模型响应时不占用线程，长转写分段并发总结，参数相同
+    
+    Returns:
+        生成的思维导图HTML路径
+    """
+    print("开始处理对话总结...")
+    local_model = local_model_config(use_local_model, local_model_type, local_model_name)
+    
+    loop = asyncio.get_running_loop()
+    # 配置检查在本地模式下会同步测试连接，读取转写是文件IO，都放到线程池中执行
+    api_config_valid = await loop.run_in_executor(None, check_api_config, local_model)
+    transcript = await loop.run_in_executor(None, _load_transcript, transcript_dir)
     
-    # 读取指定的转写结果
-    transcript = find_latest_transcript(specific_dir)
+    raw_summary = None
+    if api_config_valid:
+        print("异步调用API进行对话分析...")
+        raw_summary = await asummarize_conversation(transcript, local_model)
+    return await loop.run_in_executor(None, _write_mindmap, raw_summary, api_config_valid, output_path)
+
+def _load_transcript(transcript_dir=None):
+    """读取指定的转写结果，未指定时自动查找最新的转写目录，都没有时使用示例数据"""
+    transcript = find_latest_transcript(transcript_dir)
     if not transcript:
         print("未找到转写结果，使用示例数据...")
         transcript = """
@@ -513,17 +669,17 @@ if __name__ == "__main__":
         [SPEAKER_00]：那把UI优化延后到Q4，先保证核心功能。
         [SPEAKER_01]：这样可能影响用户体验，建议增加测试人员。
         """
-    
+    return transcript
+
+def _write_mindmap(raw_summary, api_config_valid, output_path=None):
+    """根据大模型的总结生成思维导图，总结失败或API配置无效时生成默认脑图"""
     if api_config_valid:
-        print("调用API进行对话分析...")
-        raw_summary = summarize_conversation(transcript)
-        
         if raw_summary:
             print("生成脑图结构...")
             mindmap_data = create_mindmap_data(raw_summary)
             
             print("生成可视化脑图...")
-            html_path = generate_html_mindmap(mindmap_data)
+            html_path = generate_html_mindmap(mindmap_data, output_path)
             
             print(f"处理完成！请打开 {html_path} 查看结果")
         else:
@@ -541,7 +697,7 @@ if __name__ == "__main__":
                     {"name": "风险与机会", "children": [{"name": "技术风险"}, {"name": "用户体验机会"}]}
                 ]
             }
-            html_path = generate_html_mindmap(default_data)
+            html_path = generate_html_mindmap(default_data, output_path)
             print(f"默认脑图已生成：{html_path}")
     else:
         print("API配置无效，直接生成默认脑图...")
@@ -605,7 +761,7 @@ if __name__ == "__main__":
                 }
             ]
         }
-        html_path = generate_html_mindmap(actual_data)
+        html_path = generate_html_mindmap(actual_data, output_path)
         print(f"基于实际对话的脑图已生成：{html_path}")
         
         print("\n=== 如何配置API ===")
@@ -614,4 +770,23 @@ if __name__ == "__main__":
         print("   export API_URL='https://your-api-endpoint.com/v1/chat/completions'")
         print("   export MODEL_NAME='your-model-name'")
         print("2. 或者在代码中直接修改配置")
-        print("3. 确保API Key有效且有足够的配额")
\ No newline at end of file
+        print("3. 确保API Key有效且有足够的配额")
+    
+    return html_path
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='根据转写结果生成对话思维导图')
+    parser.add_argument('--transcript', '-t', help='转写结果目录（默认自动查找最新的 transcripts_* 目录）')
+    parser.add_argument('--output', '-o', help='思维导图输出路径（默认 output/mindmap.html）')
+    parser.add_argument('--async-llm', action='store_true',
+                        help='异步调用大模型，长转写分段并发总结（需要安装 aiohttp）')
+    args = parser.parse_args()
+    
+    if args.async_llm and AIOHTTP_AVAILABLE:
+        asyncio.run(agenerate_mindmap(args.transcript, args.output))
+    else:
+        if args.async_llm:
+            print("⚠️  未安装 aiohttp，改为同步调用")
+        generate_mindmap(args.transcript, args.output)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转写结果目录的阶段清单
+每个 transcripts_* 目录下的 manifest.json 记录各阶段的输入哈希、参数键和结果文件。
+对同一目录重新运行时逐阶段比较键值，只重新执行失效的阶段：
+例如只修改 min_segment_duration 时，直接读取保存的说话人分离和识别结果，只重新对齐和输出
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from cache import file_digest
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+# 各阶段结果保存的文件名
+STAGE_FILES = {
+    'diarization': "diarization.json",
+    'transcription': "asr_segments.json",
+    'alignment': "speaker_transcripts.json"
+}
+
+
+def load_manifest(output_dir: str) -> Dict[str, Any]:
+    """读取清单，不存在或版本不符时返回空清单"""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'version': MANIFEST_VERSION, 'stages': {}}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'stages': {}}
+    manifest.setdefault('stages', {})
+    return manifest
+
+
+def save_manifest(output_dir: str, manifest: Dict[str, Any]):
+    """写入清单"""
+    manifest['version'] = MANIFEST_VERSION
+    manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def audio_fingerprint(audio_file: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    计算音频文件指纹
+
+    文件大小和修改时间与上次记录一致时沿用记录的哈希，避免重新读取整个大文件
+
+    Returns:
+        {'path', 'size', 'mtime', 'sha256'}
+    """
+    stat = os.stat(audio_file)
+    if (previous and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime
+            and os.path.abspath(previous.get('path', '')) == os.path.abspath(audio_file)):
+        digest = previous['sha256']
+    else:
+        digest = file_digest(audio_file)
+    return {'path': audio_file, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest}
+
+
+def load_stage(output_dir: str, manifest: Dict[str, Any], stage: str, key: str) -> Optional[Any]:
+    """读取阶段结果，清单中的键与当前键不一致或文件缺失时返回None"""
+    entry = manifest['stages'].get(stage)
+    if not entry or entry.get('key') != key:
+        return None
+    try:
+        with open(os.path.join(output_dir, entry['file']), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_stage(output_dir: str, manifest: Dict[str, Any], stage: str, key: str, data: Any):
+    """保存阶段结果并记录到清单（调用方负责最后写入清单）"""
+    file_name = STAGE_FILES[stage]
+    with open(os.path.join(output_dir, file_name), 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=float)
+    manifest['stages'][stage] = {'key': key, 'file': file_name}
+
+
+def stage_outputs(manifest: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+    """输出阶段未失效且文件都存在时返回记录的输出文件信息"""
+    entry = manifest['stages'].get('output')
+    if not entry or entry.get('key') != key:
+        return None
+    result = entry.get('result') or {}
+    files = [result.get('full_transcript_file'), result.get('summary_file')]
+    for speaker_files in result.get('speaker_files', {}).values():
+        files.extend(speaker_files.values())
+    if not all(path and os.path.exists(path) for path in files):
+        return None
+    return dict(result)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻模型服务
+在进程内一次性加载Whisper和pyannote模型并保持常驻，通过有界队列接收转写任务，
+由固定数量的工作线程处理，避免每次上传都重新加载模型，也避免并发任务耗尽内存。
+音频解码是独立的前置阶段，在解码线程中进行，模型工作线程识别当前任务时下一个任务已在解码。
+解码线程同样按排队策略取任务，priority 策略下高优先级任务先解码、先识别
+"""
+
+import itertools
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from audio_loader import load_audio, SAMPLE_RATE
+from cpu_inference import parse_cpu_list, split_cores, available_cores
+from main import TranscriptionPipeline, DEFAULT_MODEL_SIZE, validate_settings
+from pipeline_events import PipelineEvents
+from staged_executor import Stage
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"任务队列已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class TranscriptionJob:
+    """排队中的转写任务"""
+
+    def __init__(self, audio_file: str, priority: int, seq: int, work_dir: str = None,
+                 progress_callback=None, settings: dict = None):
+        self.audio_file = audio_file
+        self.work_dir = work_dir
+        self.settings = settings
+        self.priority = priority
+        self.seq = seq
+        self.progress_callback = progress_callback
+        self.queue_position = None
+        self.waveform = None  # 解码阶段得到的波形，识别完成后释放
+        self.ready = False  # 已完成解码阶段，等待模型工作线程
+        self.future = Future()
+
+    def __lt__(self, other):
+        # 优先级数值越大越先处理，同优先级按提交顺序
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+    def notify(self, stage: str, message: str, progress: int, **extra):
+        """向提交方报告任务状态"""
+        if self.progress_callback:
+            self.progress_callback(stage, message, progress, **extra)
+
+
+class ModelServer:
+    """常驻模型服务：每个工作线程持有一份已加载模型的流水线，从有界队列中取任务处理"""
+
+    def __init__(self, model_size: str = DEFAULT_MODEL_SIZE, num_workers: int = 1,
+                 max_queue_size: int = 10, policy: str = "fifo", decode_workers: int = 1,
+                 decode_ahead: int = 0, **pipeline_kwargs):
+        """
+        初始化模型服务
+
+        Args:
+            model_size: Whisper模型大小
+            num_workers: 工作线程数，每个工作线程各自加载一份模型；cpu_affinity 中的核和
+                cpu_threads 线程数平均分给各工作线程，每个工作线程只绑定自己的线程
+            max_queue_size: 最大排队任务数，超过时拒绝新任务
+            policy: 排队策略 ("fifo", "priority")
+            decode_workers: 解码线程数，0表示在模型工作线程中解码（不重叠）
+            decode_ahead: 已解码、等待识别的任务数上限，限制常驻内存的波形数量，0表示等于 num_workers
+            **pipeline_kwargs: 传给 TranscriptionPipeline 的其他处理参数
+        """
+        self.model_size = model_size
+        self.num_workers = max(1, num_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.policy = policy.lower()
+        self.pipeline_kwargs = pipeline_kwargs
+        self.models_loaded = threading.Event()
+
+        self._jobs = queue.PriorityQueue()  # 已解码、等待识别的任务
+        self._pending = queue.PriorityQueue()  # 等待解码的任务
+        self._waiting = []
+        self._running = 0
+        self._seq = itertools.count()
+        self._avg_job_seconds = 60.0
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # 解码阶段：解码线程主要在等待ffmpeg子进程，不与模型推理争抢GIL。
+        # Stage 只提供线程池，每提交一个任务放入一个占位项，解码线程再从 _pending 中按优先级取任务
+        self._decoder = None
+        if decode_workers > 0:
+            self._decoder = Stage("model-server-decode", self._decode, workers=decode_workers)
+            self._decode_slots = threading.Semaphore(max(1, decode_ahead or self.num_workers))
+
+    def start(self):
+        """启动工作线程（幂等），模型在各工作线程中预热加载"""
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.num_workers):
+                thread = threading.Thread(target=self._run, args=(i,), name=f"model-server-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def submit(self, audio_file: str, priority: int = 0, work_dir: str = None,
+               progress_callback=None, settings: dict = None) -> TranscriptionJob:
+        """
+        提交转写任务
+
+        Args:
+            audio_file: 音频文件路径
+            priority: 任务优先级，仅在 priority 策略下生效，数值越大越先处理
+            work_dir: 任务独立的工作目录，中间文件和转写结果都写在其中
+            progress_callback: 进度回调 callback(stage, message, progress, **extra)
+            settings: 本任务单独指定的处理参数，见 main.JOB_SETTINGS
+
+        Returns:
+            TranscriptionJob，job.future 的结果为 TranscriptionPipeline.run() 的返回值
+
+        Raises:
+            QueueFullError: 队列已满
+            ValueError: 处理参数无效
+        """
+        settings = validate_settings(settings, self.pipeline_kwargs)
+        self.start()
+        if self.policy != "priority":
+            priority = 0
+
+        with self._lock:
+            if len(self._waiting) >= self.max_queue_size:
+                raise QueueFullError(self._estimate_wait_seconds())
+            job = TranscriptionJob(audio_file, priority, next(self._seq), work_dir, progress_callback, settings)
+            self._waiting.append(job)
+            positions = self._queue_positions()
+
+        # 排队任务数已由 max_queue_size 限制，解码队列不会阻塞
+        if self._decoder:
+            self._pending.put(job)
+            self._decoder.put(None)
+        else:
+            job.ready = True
+            self._jobs.put(job)
+        self._report_positions(positions)
+        return job
+
+    def stats(self) -> dict:
+        """返回队列状态"""
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'policy': self.policy,
+                'max_queue_size': self.max_queue_size,
+                'pending': len(self._waiting),
+                'running': self._running,
+                'models_loaded': self.models_loaded.is_set(),
+                'decode': self._decoder.stats() if self._decoder else None
+            }
+
+    def _estimate_wait_seconds(self) -> int:
+        """根据平均任务耗时估算排队等待时间（需持有锁）"""
+        rounds = (len(self._waiting) + self._running) / self.num_workers
+        return max(5, math.ceil(self._avg_job_seconds * rounds))
+
+    def _queue_positions(self):
+        """计算每个排队任务的位置（需持有锁），已解码的任务排在等待解码的任务之前"""
+        ordered = sorted(self._waiting, key=lambda job: (not job.ready, job))
+        return [(job, position) for position, job in enumerate(ordered, start=1)]
+
+    def _report_positions(self, positions):
+        """通知排队位置发生变化的任务"""
+        for job, position in positions:
+            if job.queue_position == position:
+                continue
+            job.queue_position = position
+            job.notify('queued', f'排队中，前方还有 {position - 1} 个任务', 0, queue_position=position)
+
+    def _decode(self, _):
+        """解码阶段：按优先级取出下一个任务提前解码，完成后交给模型工作线程"""
+        # 等待空位，识别跟不上时不再继续解码，避免波形在内存中堆积；
+        # 拿到空位后再取任务，等待期间提交的高优先级任务也能排到前面
+        self._decode_slots.acquire()
+        job = self._pending.get()
+        try:
+            if not self._needs_decode(job):
+                print("♻️ 缓存中已有本任务的识别结果或波形，跳过提前解码")
+            else:
+                events = PipelineEvents(job.notify)
+                events.stage_start('decode', '正在解码音频...')
+                # 与 TranscriptionPipeline.run() 使用相同的内存映射文件，任务结束时由流水线清理
+                memmap_path = None
+                if self.pipeline_kwargs.get('decode_memmap') and job.work_dir:
+                    memmap_path = os.path.join(job.work_dir, "waveform.f32")
+                job.waveform = load_audio(job.audio_file, memmap_path=memmap_path)
+                events.stage_end('decode', f'音频解码完成（{len(job.waveform) / SAMPLE_RATE:.0f}秒）')
+        except Exception as e:
+            # 交给流水线重新解码，错误随任务结果一起返回
+            print(f"⚠️ 提前解码失败，将在识别时重试: {e}")
+            job.waveform = None
+        finally:
+            with self._lock:
+                job.ready = True
+                positions = self._queue_positions()
+            # 先通知排队位置再交给模型工作线程，避免排队通知晚于开始处理的通知
+            self._report_positions(positions)
+            self._jobs.put(job)
+
+    def _needs_decode(self, job: TranscriptionJob) -> bool:
+        """结果缓存中已有本任务的识别结果或波形时不必提前解码，由流水线直接复用"""
+        if not self.pipeline_kwargs.get('cache_dir'):
+            return True
+        # 只用于计算缓存键，不加载模型
+        pipeline = TranscriptionPipeline(self.model_size, **self.pipeline_kwargs)
+        with pipeline.job_settings(job.settings):
+            return pipeline.needs_decode(job.audio_file)
+
+    def _worker_kwargs(self, index: int) -> dict:
+        """第 index 个工作线程的流水线参数：各工作线程分到不重叠的CPU核和各自的线程数"""
+        # 只绑定工作线程本身，Web服务、解码和思维导图线程不受 cpu_affinity 影响
+        kwargs = dict(self.pipeline_kwargs, cpu_pin_thread=True)
+        cores = parse_cpu_list(kwargs.get('cpu_affinity'))
+        threads = kwargs.get('cpu_threads') or 0
+        if cores:
+            group = split_cores(cores, self.num_workers)[index]
+            kwargs['cpu_affinity'] = ",".join(str(core) for core in group)
+            kwargs['cpu_threads'] = max(1, threads // self.num_workers) if threads else len(group)
+        elif self.num_workers > 1:
+            kwargs['cpu_threads'] = max(1, (threads or len(available_cores())) // self.num_workers)
+        return kwargs
+
+    def _run(self, index: int):
+        """工作线程主循环"""
+        # 每个工作线程持有独立的模型实例：Whisper解码会在模型上挂载钩子，不能多线程共用
+        pipeline = TranscriptionPipeline(self.model_size, **self._worker_kwargs(index))
+        load_error = None
+        try:
+            print(f"🔥 [{threading.current_thread().name}] 正在预热常驻模型...")
+            pipeline.load_models()
+            self.models_loaded.set()
+            print(f"✅ [{threading.current_thread().name}] 常驻模型已就绪")
+        except Exception as e:
+            load_error = e
+            print(f"❌ 常驻模型加载失败: {e}")
+
+        while True:
+            job = self._jobs.get()
+            if self._decoder:
+                self._decode_slots.release()
+            with self._lock:
+                self._waiting.remove(job)
+                self._running += 1
+                positions = self._queue_positions()
+            self._report_positions(positions)
+
+            started = time.time()
+            try:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                if load_error is not None:
+                    job.future.set_exception(RuntimeError(f"模型加载失败: {load_error}"))
+                    continue
+
+                if job.waveform is None:
+                    job.notify('start', '开始处理音频文件...', 5)
+                job.future.set_result(pipeline.run(
+                    job.audio_file,
+                    work_dir=job.work_dir,
+                    progress_callback=job.notify,
+                    settings=job.settings,
+                    waveform=job.waveform
+                ))
+            except Exception as e:
+                job.future.set_exception(e)
+            finally:
+                job.waveform = None
+                with self._lock:
+                    self._running -= 1
+                    # 指数滑动平均，用于估算重试等待时间
+                    self._avg_job_seconds = 0.7 * self._avg_job_seconds + 0.3 * (time.time() - started)
+                self._jobs.task_done()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块并行转写
+在静音处（优先使用说话人分离得到的语音区间）将长音频切分为若干块，
+由进程池中的多个Whisper进程并发转写，再把各块的时间戳拼接回整段音频的时间轴
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# 进程池工作进程中常驻的Whisper模型
+_worker_model = None
+
+
+def speech_regions_from_diarization(speaker_segments: Dict[str, list]) -> List[Tuple[float, float]]:
+    """
+    将各说话人的时间段合并为按时间排序、互不重叠的语音区间
+
+    Args:
+        speaker_segments: {说话人: [{'start', 'end', ...}]}
+
+    Returns:
+        [(start, end)] 语音区间列表
+    """
+    turns = sorted(
+        (seg['start'], seg['end'])
+        for segments in speaker_segments.values()
+        for seg in segments
+    )
+    regions = []
+    for start, end in turns:
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def _quietest_point(waveform: np.ndarray, center: float, search_seconds: float = 5.0,
+                    frame_seconds: float = 0.5) -> float:
+    """在 center 附近寻找能量最低的帧，作为没有语音区间时的切分点"""
+    frame = int(frame_seconds * SAMPLE_RATE)
+    lo = max(0, int((center - search_seconds) * SAMPLE_RATE))
+    hi = min(len(waveform), int((center + search_seconds) * SAMPLE_RATE))
+    n_frames = (hi - lo) // frame
+    if n_frames < 2:
+        return center
+    frames = np.asarray(waveform[lo:lo + n_frames * frame]).reshape(n_frames, frame)
+    energy = np.square(frames, dtype=np.float32).mean(axis=1)
+    best = int(np.argmin(energy))
+    return (lo + best * frame + frame / 2) / SAMPLE_RATE
+
+
+def plan_chunks(duration: float, chunk_seconds: float,
+                speech_regions: Optional[List[Tuple[float, float]]] = None,
+                waveform: Optional[np.ndarray] = None) -> List[Tuple[float, float]]:
+    """
+    规划切分边界，保证切分点落在静音处
+
+    有语音区间时，切分点取相邻语音区间之间静音的中点；
+    否则在目标边界附近按能量寻找最安静的位置。
+
+    Args:
+        duration: 音频总时长（秒）
+        chunk_seconds: 每块的目标时长
+        speech_regions: 按时间排序的语音区间
+        waveform: 音频波形，没有语音区间时用于能量检测
+
+    Returns:
+        [(start, end)] 覆盖整段音频的分块列表
+    """
+    if duration <= chunk_seconds:
+        return [(0.0, duration)]
+
+    # 候选切分点：语音区间之间的静音中点
+    gaps = [
+        (prev_end + next_start) / 2
+        for (_, prev_end), (next_start, _) in zip(speech_regions or [], (speech_regions or [])[1:])
+        if next_start > prev_end
+    ]
+
+    boundaries = [0.0]
+    while duration - boundaries[-1] > chunk_seconds:
+        target = boundaries[-1] + chunk_seconds
+        cut = None
+        if gaps:
+            # 取目标位置之前最近的静音；块过短时改取之后最近的静音
+            before = [g for g in gaps if boundaries[-1] + chunk_seconds / 2 <= g <= target]
+            after = [g for g in gaps if target < g < boundaries[-1] + chunk_seconds * 1.5]
+            if before:
+                cut = before[-1]
+            elif after:
+                cut = after[0]
+        if cut is None and waveform is not None:
+            cut = _quietest_point(waveform, target)
+        if cut is None or cut <= boundaries[-1]:
+            cut = target
+        boundaries.append(cut)
+    boundaries.append(duration)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _init_worker(model_size: str, num_threads: int, backend: str, compute_type: Optional[str], core_groups=None):
+    """工作进程初始化：绑定CPU核、限制线程数并加载一次语音识别模型"""
+    global _worker_model
+    from asr_backends import create_backend, OpenAIWhisperBackend
+
+    if core_groups is not None:
+        # 每个进程领取一组CPU核，线程数与核数一致
+        from cpu_inference import pin_process
+        cores = core_groups.get()
+        pin_process(cores)
+        num_threads = len(cores)
+    if num_threads and backend == OpenAIWhisperBackend.name:
+        # 每个工作进程独立设置torch线程数，不影响主进程和其他工作进程
+        from cpu_inference import configure_threads
+        configure_threads(num_threads)
+
+    _worker_model = create_backend(backend, model_size, cpu_threads=num_threads, compute_type=compute_type)
+    _worker_model.load()
+
+
+def _transcribe_chunk(offset: float, audio: np.ndarray, options: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作进程中转写单个分块，并把时间戳平移到整段音频的时间轴"""
+    result = _worker_model.transcribe(audio, **options)
+    segments = result.get("segments", [])
+    for seg in segments:
+        seg['start'] += offset
+        seg['end'] += offset
+        for word in seg.get('words', []) or []:
+            word['start'] += offset
+            word['end'] += offset
+    return {'text': result["text"], 'segments': segments}
+
+
+class ChunkedTranscriber:
+    """分块并行转写器：进程池常驻，每个进程只加载一次模型"""
+
+    def __init__(self, model_size: str, num_workers: Optional[int] = None, chunk_seconds: float = 120.0,
+                 backend: str = "openai-whisper", compute_type: Optional[str] = None,
+                 cpu_affinity: Optional[List[int]] = None):
+        """
+        初始化分块转写器
+
+        Args:
+            model_size: Whisper模型大小
+            num_workers: 并发进程数，默认为CPU核数的一半
+            chunk_seconds: 每块的目标时长（秒）
+            backend: 语音识别后端名称，见 asr_backends.BACKENDS
+            compute_type: 计算精度，见 asr_backends
+            cpu_affinity: 可使用的CPU核，指定时平均分给各进程并分别绑定
+        """
+        cpu_count = len(cpu_affinity) if cpu_affinity else (os.cpu_count() or 1)
+        self.model_size = model_size
+        self.num_workers = max(1, num_workers or cpu_count // 2)
+        self.chunk_seconds = chunk_seconds
+        self.backend = backend
+        self.compute_type = compute_type
+        self.cpu_affinity = cpu_affinity
+        # 按进程数平分CPU线程，避免相互争抢
+        self.threads_per_worker = max(1, cpu_count // self.num_workers)
+        self._executor = None
+
+    def start(self):
+        """启动进程池（幂等）"""
+        if self._executor is None:
+            # 使用spawn避免fork后torch/CUDA状态不一致
+            context = multiprocessing.get_context("spawn")
+            core_groups = None
+            if self.cpu_affinity:
+                from cpu_inference import split_cores
+                core_groups = context.Queue()
+                for cores in split_cores(self.cpu_affinity, self.num_workers):
+                    core_groups.put(cores)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.model_size, self.threads_per_worker, self.backend, self.compute_type, core_groups)
+            )
+        return self
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def transcribe(self, waveform: np.ndarray, options: Dict[str, Any],
+                   speech_regions: Optional[List[Tuple[float, float]]] = None,
+                   on_chunk: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        分块并行转写整段音频
+
+        Args:
+            waveform: 16kHz单声道float32波形
+            options: 传给 whisper transcribe 的参数
+            speech_regions: 语音区间，用于选择静音切分点
+            on_chunk: 按时间顺序每完成一块时调用 on_chunk(segments, completed, total)
+
+        Returns:
+            {'text': 完整转写文本, 'segments': 拼接后的转写片段列表}
+        """
+        self.start()
+        duration = len(waveform) / SAMPLE_RATE
+        chunks = plan_chunks(duration, self.chunk_seconds, speech_regions, waveform)
+        print(f"分块并行转写：{len(chunks)} 块，{self.num_workers} 个进程")
+
+        futures = []
+        for start, end in chunks:
+            first, last = int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)
+            audio = np.array(waveform[first:last], dtype=np.float32)
+            futures.append(self._executor.submit(_transcribe_chunk, first / SAMPLE_RATE, audio, options))
+
+        # 按时间顺序拼接各块结果并重新编号
+        texts = []
+        segments = []
+        for completed, future in enumerate(futures, start=1):
+            result = future.result()
+            texts.append(result['text'])
+            segments.extend(result['segments'])
+            if on_chunk:
+                on_chunk(result['segments'], completed, len(futures))
+        for i, seg in enumerate(segments):
+            seg['id'] = i
+
+        return {'text': "".join(texts), 'segments': segments}
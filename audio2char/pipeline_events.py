@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线结构化事件
+把阶段开始/结束、音频处理百分比和每个已确认的说话人片段，统一通过进度回调
+callback(stage, message, progress, **extra) 发出，extra 中的 event 字段区分事件类型：
+
+    stage_start  阶段开始
+    stage_end    阶段结束，附带 elapsed（秒）
+    progress     阶段内进度，附带 audio_percent（已处理音频的百分比）
+    segment      已转写的片段，附带 segment {'id', 'speaker', 'start', 'end', 'text'}
+    segment_update  两遍转写中精修后的片段，附带 replaces（被替换的草稿片段ID）和 segments
+"""
+
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+# 各阶段在总进度条中占据的区间
+STAGE_PROGRESS = {
+    'decode': (5, 8),
+    'draft': (8, 15),
+    'diarization': (15, 35),
+    'recognition': (35, 58),
+    'alignment': (58, 60)
+}
+
+# 各阶段的中文名称，用于汇总中的耗时统计
+STAGE_LABELS = {
+    'decode': '音频解码',
+    'draft': '草稿转写',
+    'diarization': '说话人分离',
+    'recognition': '语音识别',
+    'alignment': '说话人对齐'
+}
+
+_local = threading.local()
+
+
+class PipelineEvents:
+    """向进度回调发送结构化事件"""
+
+    def __init__(self, progress_callback=None, min_interval: float = 0.5):
+        """
+        Args:
+            progress_callback: 进度回调 callback(stage, message, progress, **extra)
+            min_interval: progress 事件的最小发送间隔（秒），避免过于频繁地推送
+        """
+        self.progress_callback = progress_callback
+        self.min_interval = min_interval
+        self._stage_started = {}
+        self.stage_times = {}  # 各阶段耗时（秒）
+        self._last_progress = 0.0
+        self._last_percent = {}
+        self.segment_count = 0  # 已发送的片段数
+        self.created_at = time.time()
+        self.first_segment_seconds = None  # 从开始处理到发送第一个片段的耗时
+
+    def _emit(self, stage: str, message: str, progress: int, **extra):
+        if self.progress_callback:
+            self.progress_callback(stage, message, progress, **extra)
+
+    def stage_start(self, stage: str, message: str):
+        """阶段开始"""
+        self._stage_started[stage] = time.time()
+        self._emit(stage, message, STAGE_PROGRESS[stage][0], event='stage_start')
+
+    def stage_end(self, stage: str, message: str):
+        """阶段结束"""
+        elapsed = time.time() - self._stage_started.get(stage, time.time())
+        self.stage_times[stage] = elapsed
+        self._emit(stage, message, STAGE_PROGRESS[stage][1], event='stage_end', elapsed=round(elapsed, 2))
+
+    def audio_progress(self, stage: str, fraction: float, message: Optional[str] = None):
+        """阶段内已处理音频的比例，按最小间隔节流"""
+        percent = int(max(0.0, min(1.0, fraction)) * 100)
+        now = time.time()
+        if percent < 100 and (now - self._last_progress < self.min_interval
+                              or percent <= self._last_percent.get(stage, -1)):
+            return
+        self._last_progress = now
+        self._last_percent[stage] = percent
+
+        start, end = STAGE_PROGRESS[stage]
+        self._emit(stage, message or f"已处理 {percent}% 音频", int(start + (end - start) * percent / 100),
+                   event='progress', audio_percent=percent)
+
+    @staticmethod
+    def _segment_payload(seg: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': seg.get('id'),
+            'speaker': seg.get('speaker'),
+            'start': round(seg['start'], 2),
+            'end': round(seg['end'], 2),
+            'text': seg['text'].strip()
+        }
+    
+    def segments(self, segments: List[Dict[str, Any]]):
+        """发送已转写的片段"""
+        progress = STAGE_PROGRESS['recognition'][0]
+        if segments and self.first_segment_seconds is None:
+            self.first_segment_seconds = time.time() - self.created_at
+        self.segment_count += len(segments)
+        for seg in segments:
+            self._emit('segment', seg['text'], progress, event='segment', segment=self._segment_payload(seg))
+    
+    def segment_update(self, replaces: List[int], segments: List[Dict[str, Any]]):
+        """发送精修后的片段，替换已发送的草稿片段"""
+        self._emit('segment', "".join(seg['text'] for seg in segments), STAGE_PROGRESS['recognition'][0],
+                   event='segment_update', replaces=list(replaces),
+                   segments=[self._segment_payload(seg) for seg in segments])
+
+    def diarization_hook(self):
+        """返回 pyannote Pipeline 的 hook，按各步骤完成的数量报告说话人分离进度"""
+        # 分割和声纹提取两步占据绝大部分耗时，各按一半计算
+        steps = {'segmentation': 0, 'embeddings': 1}
+
+        def hook(step_name, step_artefact, file=None, total=None, completed=None):
+            if step_name in steps and total:
+                self.audio_progress('diarization', (steps[step_name] + completed / total) / len(steps))
+        return hook
+
+
+class _TqdmShim:
+    """替换 whisper.transcribe 中的 tqdm：当前线程注册了回调时按帧数报告进度，否则使用原 tqdm"""
+
+    def __init__(self, tqdm_module):
+        self._tqdm_module = tqdm_module
+
+    def __getattr__(self, name):
+        return getattr(self._tqdm_module, name)
+
+    def tqdm(self, *args, **kwargs):
+        callback = getattr(_local, 'whisper_progress', None)
+        if callback is None:
+            return self._tqdm_module.tqdm(*args, **kwargs)
+        return _ProgressBar(kwargs.get('total'), callback)
+
+
+class _ProgressBar:
+    """只统计进度、不输出到终端的进度条"""
+
+    def __init__(self, total, callback):
+        self.total = total or 0
+        self.n = 0
+        self.callback = callback
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n=1):
+        self.n += n
+        if self.total:
+            self.callback(self.n / self.total)
+
+
+@contextmanager
+def whisper_progress(callback):
+    """
+    在当前线程内捕获 whisper transcribe 的解码进度
+
+    Args:
+        callback: callback(fraction)，fraction 为已解码音频的比例
+    """
+    # whisper 包把同名的 transcribe 函数导出到了包上，需从 sys.modules 取模块本身
+    whisper_transcribe = importlib.import_module('whisper.transcribe')
+
+    if not isinstance(whisper_transcribe.tqdm, _TqdmShim):
+        whisper_transcribe.tqdm = _TqdmShim(whisper_transcribe.tqdm)
+    _local.whisper_progress = callback
+    try:
+        yield
+    finally:
+        _local.whisper_progress = None
+
+
+def label_segments(segments: List[Dict[str, Any]], speaker_segments: Dict[str, list]) -> List[Dict[str, Any]]:
+    """为实时展示的转写片段标注重叠最多的说话人（已带 speaker 字段的片段保持不变）"""
+    from alignment import assign_words_to_speakers
+
+    unlabeled = [seg for seg in segments if 'speaker' not in seg]
+    if not unlabeled:
+        return segments
+    assignment = assign_words_to_speakers(unlabeled, speaker_segments)
+    labels = {id(seg): speaker for seg, (speaker, _) in zip(unlabeled, assignment)}
+    return [dict(seg, speaker=labels[id(seg)]) if id(seg) in labels else seg for seg in segments]
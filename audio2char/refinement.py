@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+两遍转写的精修阶段
+先用 tiny/base 小模型快速转写出完整草稿，再用配置的大模型只重新转写草稿中置信度低的片段
+（avg_logprob 低、no_speech_prob 高或压缩比异常），就地替换，其余片段保留草稿结果
+"""
+
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+MAX_WINDOW_SECONDS = 30.0  # 与Whisper的输入窗口一致
+PROMPT_CHARS = 200  # 作为提示词的前文长度
+
+
+def needs_refinement(segment: Dict[str, Any], logprob_threshold: float = -0.5,
+                     no_speech_threshold: float = 0.5, compression_ratio_threshold: float = 2.4) -> bool:
+    """判断草稿片段是否需要用大模型重新转写"""
+    if segment.get('avg_logprob', 0.0) < logprob_threshold:
+        return True
+    if segment.get('no_speech_prob', 0.0) > no_speech_threshold:
+        return True
+    # 压缩比过高通常是重复输出的幻觉
+    return segment.get('compression_ratio', 0.0) > compression_ratio_threshold
+
+
+def refinement_windows(segments: List[Dict[str, Any]], max_gap: float = 1.0,
+                       max_window: float = MAX_WINDOW_SECONDS, **thresholds) -> List[Dict[str, Any]]:
+    """
+    把相邻的低置信度草稿片段合并为重新转写的窗口，窗口越长大模型可用的上下文越多
+
+    Args:
+        segments: 按时间排序的草稿片段
+        max_gap: 相邻片段间隔不超过该值（秒）时合并
+        max_window: 单个窗口的最大时长（秒）
+        **thresholds: 传给 needs_refinement() 的阈值
+
+    Returns:
+        [{'start', 'end', 'indices': 窗口覆盖的草稿片段下标}]
+    """
+    windows = []
+    current = None
+    for i, seg in enumerate(segments):
+        if not needs_refinement(seg, **thresholds):
+            current = None
+            continue
+        if (current is not None and current['indices'][-1] == i - 1
+                and seg['start'] - current['end'] <= max_gap and seg['end'] - current['start'] <= max_window):
+            current['end'] = seg['end']
+            current['indices'].append(i)
+        else:
+            current = {'start': seg['start'], 'end': seg['end'], 'indices': [i]}
+            windows.append(current)
+    return windows
+
+
+def refine_transcription(backend, waveform: np.ndarray, draft: Dict[str, Any], options: Dict[str, Any],
+                         on_window: Optional[Callable] = None, **thresholds) -> Dict[str, Any]:
+    """
+    用大模型重新转写草稿中的低置信度片段
+
+    Args:
+        backend: 已加载的语音识别后端（asr_backends）
+        waveform: 16kHz单声道float32波形
+        draft: 草稿转写结果 {'text', 'segments'}
+        options: 转写参数，与 whisper transcribe 的参数同名
+        on_window: 每完成一个窗口时调用 on_window(draft_ids, segments, completed, total)，
+            draft_ids 为被替换的草稿片段ID，segments 为替换后的片段
+        **thresholds: 传给 needs_refinement() 的阈值
+
+    Returns:
+        {'text', 'segments', 'refined_segments': 被替换的草稿片段数, 'draft_segments': 草稿片段数}
+    """
+    draft_segments = draft['segments']
+    windows = refinement_windows(draft_segments, **thresholds)
+    print(f"精修：{sum(len(w['indices']) for w in windows)}/{len(draft_segments)} 个低置信度片段，"
+          f"{len(windows)} 个窗口")
+
+    replacements = {}
+    for completed, window in enumerate(windows, start=1):
+        first = window['indices'][0]
+        # 以前文作为提示词衔接上下文，窗口之间互不依赖
+        previous_text = "".join(seg['text'] for seg in draft_segments[max(0, first - 10):first]).strip()
+        prompt = ((options.get('initial_prompt') or "") + previous_text)[-PROMPT_CHARS:] or None
+        audio = np.array(waveform[int(window['start'] * SAMPLE_RATE):int(window['end'] * SAMPLE_RATE)],
+                         dtype=np.float32)
+        result = backend.transcribe(audio, **dict(options, initial_prompt=prompt, condition_on_previous_text=False))
+
+        segments = []
+        for seg in result.get('segments', []):
+            if not seg['text'].strip():
+                continue
+            seg = dict(seg)
+            seg['start'] = window['start'] + seg['start']
+            seg['end'] = min(window['start'] + seg['end'], window['end'])
+            if seg.get('words'):
+                seg['words'] = [dict(word, start=window['start'] + word['start'], end=window['start'] + word['end'])
+                                for word in seg['words']]
+            segments.append(seg)
+        # 大模型在窗口内没有识别出文字时，视为草稿的幻觉输出一并删除
+        replacements[first] = segments
+        if on_window:
+            on_window([draft_segments[i].get('id', i) for i in window['indices']], segments, completed, len(windows))
+
+    replaced = {i for window in windows for i in window['indices']}
+    segments = []
+    for i, seg in enumerate(draft_segments):
+        if i in replacements:
+            segments.extend(replacements[i])
+        elif i not in replaced:
+            segments.append(seg)
+    for i, seg in enumerate(segments):
+        seg['id'] = i
+
+    return {
+        'text': "".join(seg['text'] for seg in segments),
+        'segments': segments,
+        'refined_segments': len(replaced),
+        'draft_segments': len(draft_segments)
+    }
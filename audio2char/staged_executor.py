@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段执行
+把任务处理拆成若干阶段，每个阶段有自己的有界队列和工作线程数，阶段处理完后把任务交给下一阶段。
+不同任务可以同时处于不同阶段（任务A在识别时任务B在解码、任务C在生成思维导图），
+总吞吐量接近最慢阶段的处理能力。下游队列已满时上游阶段的 put() 阻塞，形成背压，
+避免解码好的波形或待处理的结果无限堆积
+
+内置演示用 sleep 模拟各阶段耗时，比较顺序执行和分阶段执行的吞吐量：
+
+    python staged_executor.py --jobs 8 --stage-seconds 0.2,1.0,0.5
+"""
+
+import argparse
+import queue
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
+
+
+class Stage:
+    """流水线中的一个阶段：有界队列 + 固定数量的工作线程"""
+
+    def __init__(self, name: str, handler: Callable[[Any], None], workers: int = 1, queue_size: int = 0,
+                 on_error: Optional[Callable[[Any, Exception], None]] = None):
+        """
+        Args:
+            name: 阶段名称，用于线程名和统计
+            handler: 处理单个任务 handler(item)，由它负责把任务交给下一阶段
+            workers: 工作线程数
+            queue_size: 队列上限，0表示不限
+            on_error: handler 抛出异常时调用 on_error(item, error)，未指定时只打印错误
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.on_error = on_error
+        self._queue = queue.Queue(maxsize=max(0, queue_size))
+        self._threads = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._processed = 0
+        self._failed = 0
+        self._busy_seconds = 0.0
+        self._started_at = None
+
+    def start(self):
+        """启动工作线程（幂等）"""
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.time()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def put(self, item, block: bool = True, timeout: Optional[float] = None):
+        """
+        提交任务，队列已满时阻塞等待（背压）
+
+        Raises:
+            queue.Full: block=False 或等待超时时队列仍然已满
+        """
+        self.start()
+        self._queue.put(item, block=block, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回阶段状态，utilization 为工作线程处于忙碌状态的时间比例"""
+        with self._lock:
+            elapsed = time.time() - self._started_at if self._started_at else 0.0
+            return {
+                'name': self.name,
+                'workers': self.workers,
+                'queued': self._queue.qsize(),
+                'max_queue_size': self._queue.maxsize,
+                'busy': self._busy,
+                'processed': self._processed,
+                'failed': self._failed,
+                'utilization': round(self._busy_seconds / (elapsed * self.workers), 3) if elapsed else 0.0
+            }
+
+    def _run(self):
+        """工作线程主循环"""
+        while True:
+            item = self._queue.get()
+            with self._lock:
+                self._busy += 1
+            started = time.time()
+            failed = False
+            try:
+                self.handler(item)
+            except Exception as e:
+                failed = True
+                if self.on_error:
+                    try:
+                        self.on_error(item, e)
+                    except Exception as callback_error:
+                        print(f"❌ [{self.name}] 错误处理失败: {callback_error}")
+                else:
+                    print(f"❌ [{self.name}] 任务处理失败: {e}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._busy_seconds += time.time() - started
+                    self._processed += 1
+                    self._failed += failed
+                self._queue.task_done()
+
+
+# =================== 吞吐量演示 ===================
+def demo(jobs: int, stage_seconds, workers=None) -> Dict[str, float]:
+    """
+    用 sleep 模拟各阶段耗时，比较顺序执行和分阶段执行处理 jobs 个任务的总耗时
+
+    Args:
+        jobs: 任务数
+        stage_seconds: 各阶段处理单个任务的耗时（秒）
+        workers: 各阶段的工作线程数，默认均为1
+
+    Returns:
+        {'sequential', 'staged', 'bound'}，bound 为最慢阶段决定的理论耗时
+    """
+    workers = workers or [1] * len(stage_seconds)
+
+    started = time.perf_counter()
+    for _ in range(jobs):
+        for seconds in stage_seconds:
+            time.sleep(seconds)
+    sequential = time.perf_counter() - started
+
+    finished = threading.Semaphore(0)
+    stages = []
+
+    def make_handler(index, seconds):
+        def handler(item):
+            time.sleep(seconds)
+            if index + 1 < len(stages):
+                stages[index + 1].put(item)
+            else:
+                finished.release()
+        return handler
+
+    for index, seconds in enumerate(stage_seconds):
+        stages.append(Stage(f"stage{index}", make_handler(index, seconds), workers[index], queue_size=2))
+
+    started = time.perf_counter()
+    for job in range(jobs):
+        stages[0].put(job)
+    for _ in range(jobs):
+        finished.acquire()
+    staged = time.perf_counter() - started
+
+    slowest = max(seconds / count for seconds, count in zip(stage_seconds, workers))
+    bound = sum(stage_seconds) + slowest * (jobs - 1)
+    return {'sequential': sequential, 'staged': staged, 'bound': bound}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分阶段执行吞吐量演示")
+    parser.add_argument("--jobs", type=int, default=8, help="任务数 (默认: 8)")
+    parser.add_argument("--stage-seconds", default="0.2,1.0,0.5",
+                        help="各阶段单个任务的耗时，逗号分隔 (默认: 0.2,1.0,0.5，对应解码/识别/思维导图)")
+    parser.add_argument("--workers", help="各阶段的工作线程数，逗号分隔 (默认: 均为1)")
+    args = parser.parse_args()
+
+    durations = [float(value) for value in args.stage_seconds.split(',')]
+    counts = [int(value) for value in args.workers.split(',')] if args.workers else None
+    result = demo(args.jobs, durations, counts)
+    print(f"📊 {args.jobs} 个任务，各阶段耗时 {durations}")
+    print(f"  顺序执行: {result['sequential']:.1f} 秒")
+    print(f"  分阶段执行: {result['staged']:.1f} 秒（最慢阶段决定的理论值 {result['bound']:.1f} 秒）")
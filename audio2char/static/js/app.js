@@ -4,11 +4,13 @@ class AudioProcessor {
     constructor() {
         this.socket = io();
         this.currentTaskId = null;
+        this.pendingEvents = null;  // 上传请求返回前收到的任务事件
         this.selectedFile = null;
         
         this.initializeElements();
         this.bindEvents();
         this.initializeSocket();
+        this.loadSettings();
     }
     
     initializeElements() {
@@ -20,9 +22,13 @@ class AudioProcessor {
         this.fileInfo = document.getElementById('fileInfo');
         this.fileName = document.getElementById('fileName');
         this.fileSize = document.getElementById('fileSize');
+        this.modelSize = document.getElementById('modelSize');
+        this.minSpeakers = document.getElementById('minSpeakers');
+        this.maxSpeakers = document.getElementById('maxSpeakers');
         this.progressArea = document.getElementById('progressArea');
         this.progressBar = document.getElementById('progressBar');
         this.progressMessage = document.getElementById('progressMessage');
+        this.liveTranscript = document.getElementById('liveTranscript');
         this.resultArea = document.getElementById('resultArea');
         this.emptyState = document.getElementById('emptyState');
         this.viewMindmapBtn = document.getElementById('viewMindmapBtn');
@@ -32,6 +38,24 @@ class AudioProcessor {
         this.mindmapFrame = document.getElementById('mindmapFrame');
     }
     
+    loadSettings() {
+        // 读取服务器默认的处理参数，填充处理选项
+        fetch('/api/status')
+            .then(response => response.json())
+            .then(status => {
+                (status.allowed_model_sizes || []).forEach(size => {
+                    const option = document.createElement('option');
+                    option.value = size;
+                    option.textContent = size;
+                    this.modelSize.appendChild(option);
+                });
+                this.modelSize.options[0].textContent = `默认 (${status.whisper_model_size})`;
+                this.minSpeakers.placeholder = status.min_speakers;
+                this.maxSpeakers.placeholder = status.max_speakers;
+            })
+            .catch(() => {});
+    }
+    
     bindEvents() {
         // 文件选择事件
         this.selectFileLink.addEventListener('click', (e) => {
@@ -86,6 +110,10 @@ class AudioProcessor {
         // Socket.IO事件监听
         this.socket.on('connect', () => {
             console.log('已连接到服务器');
+            // 重新连接后连接ID改变，需要重新加入任务的房间
+            if (this.currentTaskId) {
+                this.socket.emit('join_task', {task_id: this.currentTaskId});
+            }
         });
         
         this.socket.on('disconnect', () => {
@@ -93,10 +121,27 @@ class AudioProcessor {
         });
         
         this.socket.on('progress', (data) => {
-            this.handleProgress(data);
+            this.dispatchTaskEvent(this.handleProgress, data);
+        });
+        
+        this.socket.on('transcript_segment', (data) => {
+            this.dispatchTaskEvent(this.handleSegment, data);
+        });
+        
+        this.socket.on('transcript_segment_update', (data) => {
+            this.dispatchTaskEvent(this.handleSegmentUpdate, data);
         });
     }
     
+    dispatchTaskEvent(handler, data) {
+        // 服务端只向上传方推送任务事件，上传请求返回、得到任务ID之前先缓存
+        if (this.currentTaskId === null && this.pendingEvents) {
+            this.pendingEvents.push([handler, data]);
+            return;
+        }
+        handler.call(this, data);
+    }
+    
     handleFileSelect(file) {
         if (!file) return;
         
@@ -140,6 +185,12 @@ class AudioProcessor {
         
         const formData = new FormData();
         formData.append('audio', this.selectedFile);
+        formData.append('model_size', this.modelSize.value);
+        formData.append('min_speakers', this.minSpeakers.value);
+        formData.append('max_speakers', this.maxSpeakers.value);
+        // 服务端把本连接加入任务的房间，只向本页面推送该任务的进度和转写内容
+        formData.append('socket_id', this.socket.id);
+        this.pendingEvents = [];
         
         // 禁用上传按钮
         this.uploadBtn.disabled = true;
@@ -156,13 +207,23 @@ class AudioProcessor {
         .then(data => {
             if (data.success) {
                 this.currentTaskId = data.task_id;
-                this.updateProgress(10, '文件上传成功，开始处理...');
+                if (data.queue_position > 1) {
+                    this.updateProgress(0, `文件上传成功，排队中，前方还有 ${data.queue_position - 1} 个任务`);
+                } else {
+                    this.updateProgress(10, '文件上传成功，开始处理...');
+                }
                 this.updateStage('upload', 'completed');
+                
+                // 补上处理上传请求期间已经推送的事件
+                const pending = this.pendingEvents || [];
+                this.pendingEvents = null;
+                pending.forEach(([handler, event]) => handler.call(this, event));
             } else {
                 throw new Error(data.error || '上传失败');
             }
         })
         .catch(error => {
+            this.pendingEvents = null;
             this.showAlert(`上传失败: ${error.message}`, 'danger');
             this.resetUploadState();
         });
@@ -184,12 +245,18 @@ class AudioProcessor {
         
         // 更新阶段指示器
         switch (data.stage) {
+            case 'queued':
+                this.updateStage('upload', 'completed');
+                break;
             case 'start':
                 this.updateStage('upload', 'active');
                 break;
             case 'transcription':
+            case 'decode':
+            case 'draft':
             case 'diarization':
             case 'recognition':
+            case 'alignment':
                 this.updateStage('upload', 'completed');
                 this.updateStage('transcription', 'active');
                 break;
@@ -207,6 +274,59 @@ class AudioProcessor {
         }
     }
     
+    handleSegment(data) {
+        if (data.task_id !== this.currentTaskId) return;
+        
+        // 逐段追加已转写的内容
+        this.appendLines([this.createSegmentLine(data)]);
+    }
+    
+    handleSegmentUpdate(data) {
+        if (data.task_id !== this.currentTaskId) return;
+        
+        // 精修后的片段就地替换草稿片段
+        const lines = data.segments.map(segment => this.createSegmentLine(segment));
+        const drafts = data.replaces
+            .map(id => this.liveTranscript.querySelector(`[data-segment-id="${id}"]`))
+            .filter(line => line);
+        if (!drafts.length) {
+            this.appendLines(lines);
+            return;
+        }
+        lines.forEach(line => drafts[0].before(line));
+        drafts.forEach(line => line.remove());
+    }
+    
+    createSegmentLine(data) {
+        const line = document.createElement('div');
+        if (data.id !== null && data.id !== undefined) {
+            line.dataset.segmentId = data.id;
+        }
+        const time = document.createElement('span');
+        time.className = 'segment-time';
+        time.textContent = `[${this.formatTime(data.start)}]`;
+        line.appendChild(time);
+        
+        if (data.speaker) {
+            const speaker = document.createElement('span');
+            speaker.className = 'segment-speaker';
+            speaker.textContent = data.speaker;
+            line.appendChild(speaker);
+        }
+        line.appendChild(document.createTextNode(data.text));
+        return line;
+    }
+    
+    appendLines(lines) {
+        // 用户未向上翻看时自动滚动到底部
+        const atBottom = this.liveTranscript.scrollHeight - this.liveTranscript.scrollTop - this.liveTranscript.clientHeight < 20;
+        lines.forEach(line => this.liveTranscript.appendChild(line));
+        this.liveTranscript.style.display = 'block';
+        if (atBottom) {
+            this.liveTranscript.scrollTop = this.liveTranscript.scrollHeight;
+        }
+    }
+    
     updateProgress(percentage, message) {
         this.progressBar.style.width = `${percentage}%`;
         this.progressBar.setAttribute('aria-valuenow', percentage);
@@ -235,6 +355,10 @@ class AudioProcessor {
         // 重置进度
         this.updateProgress(0, '准备处理...');
         
+        // 清空实时转写内容
+        this.liveTranscript.innerHTML = '';
+        this.liveTranscript.style.display = 'none';
+        
         // 重置阶段指示器
         const stages = ['upload', 'transcription', 'mindmap', 'complete'];
         stages.forEach(stage => {
@@ -283,6 +407,12 @@ class AudioProcessor {
         }
     }
     
+    formatTime(seconds) {
+        const minutes = Math.floor(seconds / 60);
+        const secs = Math.floor(seconds % 60);
+        return `${String(minutes).padStart(2, '0')}:${String(secs).padStart(2, '0')}`;
+    }
+    
     formatFileSize(bytes) {
         if (bytes === 0) return '0 Bytes';
         
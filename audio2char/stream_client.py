@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时流式转写测试客户端
+把本地音频文件解码为 16kHz 单声道 16bit PCM，按实际播放速度分块推送给Web服务，
+打印服务端返回的临时结果和最终结果，以及首段文字的延迟
+
+用法:
+    python stream_client.py recording.wav
+    python stream_client.py recording.mp3 --url http://localhost:5000 --speed 2
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+import socketio
+
+from audio_loader import load_audio, SAMPLE_RATE
+
+
+def replay(audio_file: str, url: str = "http://localhost:5000", chunk_ms: int = 200, speed: float = 1.0):
+    """
+    按实际速度回放音频文件到流式转写服务
+
+    Args:
+        audio_file: 本地音频文件
+        url: Web服务地址
+        chunk_ms: 每个音频块的时长（毫秒）
+        speed: 回放速度倍数，1.0 为实时
+    """
+    waveform = load_audio(audio_file)
+    pcm = (np.clip(waveform, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+    chunk_bytes = int(SAMPLE_RATE * chunk_ms / 1000) * 2
+
+    sio = socketio.Client()
+    started = threading.Event()
+    stopped = threading.Event()
+    timing = {'start': None, 'first_text': None}
+
+    def first_text():
+        if timing['first_text'] is None:
+            timing['first_text'] = time.time() - timing['start']
+            print(f"⏱️ 首段文字延迟: {timing['first_text']:.1f}秒")
+
+    @sio.on('stream_started')
+    def on_started(data):
+        started.set()
+
+    @sio.on('stream_partial')
+    def on_partial(data):
+        first_text()
+        print(f"  … [{data['start']:.1f}s] {data['text']}")
+
+    @sio.on('stream_final')
+    def on_final(data):
+        first_text()
+        print(f"✅ [{data['start']:.1f}s - {data['end']:.1f}s] {data['speaker']}: {data['text']}")
+
+    @sio.on('stream_error')
+    def on_error(data):
+        print(f"❌ {data['error']}")
+        started.set()
+        stopped.set()
+
+    @sio.on('stream_stopped')
+    def on_stopped(data):
+        print(f"🎙️ 推流结束，共 {data['duration']:.1f} 秒音频")
+        stopped.set()
+
+    sio.connect(url)
+    sio.emit('stream_start', {})
+    started.wait(timeout=600)
+    if stopped.is_set():
+        sio.disconnect()
+        return
+
+    print(f"▶️ 开始推流: {audio_file}（{len(waveform) / SAMPLE_RATE:.1f}秒）")
+    timing['start'] = time.time()
+    chunks = 0
+    for offset in range(0, len(pcm), chunk_bytes):
+        sio.emit('stream_chunk', {'seq': chunks, 'audio': pcm[offset:offset + chunk_bytes]})
+        chunks += 1
+        # 按播放进度发送，模拟实时录音
+        target = timing['start'] + (offset + chunk_bytes) / 2 / SAMPLE_RATE / speed
+        time.sleep(max(0.0, target - time.time()))
+
+    sio.emit('stream_stop', {'chunks': chunks})
+    stopped.wait(timeout=600)
+    sio.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="实时流式转写测试客户端")
+    parser.add_argument("audio", help="要回放的音频文件")
+    parser.add_argument("--url", default="http://localhost:5000", help="Web服务地址")
+    parser.add_argument("--chunk-ms", type=int, default=200, help="每个音频块的时长（毫秒）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    args = parser.parse_args()
+
+    replay(args.audio, args.url, args.chunk_ms, args.speed)
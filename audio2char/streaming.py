@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时流式转写
+客户端持续推送 16kHz 单声道 16bit PCM 音频块，服务端每积累一小段新音频就用滑动窗口重新解码
+尚未确认的部分，返回临时结果；窗口中已经稳定的片段确认为最终结果，提取说话人声纹后
+在线聚类得到滚动的说话人标签。首段文字的延迟只取决于解码步长，与录音总长度无关
+"""
+
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from asr_backends import DEFAULT_BACKEND, create_backend
+from audio_loader import SAMPLE_RATE, pcm16_to_float32
+
+EMBEDDING_MODEL = "pyannote/wespeaker-voxceleb-resnet34-LM"
+MIN_EMBEDDING_SECONDS = 0.5  # 短于该时长的片段不提取声纹，沿用上一个说话人
+
+
+class OnlineSpeakerClustering:
+    """在线说话人聚类：与已有说话人的声纹中心比较余弦相似度，相似度不足时新建说话人"""
+
+    def __init__(self, threshold: float = 0.5, max_speakers: int = 8):
+        """
+        Args:
+            threshold: 归入已有说话人所需的最小余弦相似度
+            max_speakers: 最多说话人数，达到上限后归入最相似的说话人
+        """
+        self.threshold = threshold
+        self.max_speakers = max_speakers
+        self.centroids = []
+        self.counts = []
+
+    def assign(self, embedding: np.ndarray) -> str:
+        """为一段声纹分配说话人标签，并更新该说话人的声纹中心"""
+        embedding = np.asarray(embedding, dtype=np.float64).reshape(-1)
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+
+        if self.centroids:
+            centroids = np.stack(self.centroids)
+            similarity = centroids @ embedding / np.maximum(np.linalg.norm(centroids, axis=1), 1e-8)
+            best = int(np.argmax(similarity))
+            if similarity[best] >= self.threshold or len(self.centroids) >= self.max_speakers:
+                # 滑动平均更新声纹中心
+                self.counts[best] += 1
+                self.centroids[best] += (embedding - self.centroids[best]) / self.counts[best]
+                return f"SPEAKER_{best:02d}"
+
+        self.centroids.append(embedding)
+        self.counts.append(1)
+        return f"SPEAKER_{len(self.centroids) - 1:02d}"
+
+
+class StreamingTranscriber:
+    """流式转写共用的模型：所有会话共用一份Whisper和声纹模型，推理时加锁串行执行"""
+
+    def __init__(self, model_size: str = "small", language: str = "zh",
+                 initial_prompt: Optional[str] = None, speaker_threshold: float = 0.5,
+                 backend: str = DEFAULT_BACKEND, compute_type: Optional[str] = None):
+        """
+        Args:
+            model_size: Whisper模型大小，流式场景建议使用较小的模型以降低延迟
+            language: 识别语言
+            initial_prompt: 初始提示词
+            speaker_threshold: 在线聚类的余弦相似度阈值
+            backend: 语音识别后端名称，见 asr_backends.BACKENDS
+            compute_type: faster-whisper 计算精度
+        """
+        self.model_size = model_size
+        self.language = language
+        self.initial_prompt = initial_prompt
+        self.speaker_threshold = speaker_threshold
+        self.asr_backend = create_backend(backend, model_size, compute_type=compute_type)
+        self.embedding_inference = None
+        self.embedding_available = True
+        self._lock = threading.Lock()
+
+    def load(self):
+        """加载模型（幂等），声纹模型加载失败时不区分说话人"""
+        with self._lock:
+            if self.asr_backend.model is None:
+                print(f"正在加载流式语音识别模型 ({self.asr_backend.name}, {self.model_size})...")
+                self.asr_backend.load()
+
+            if self.embedding_inference is None and self.embedding_available:
+                try:
+                    from pyannote.audio import Model, Inference
+                    print("正在加载声纹模型...")
+                    self.embedding_inference = Inference(Model.from_pretrained(EMBEDDING_MODEL), window="whole")
+                except Exception as e:
+                    print(f"⚠️ 声纹模型加载失败，流式转写不区分说话人: {e}")
+                    self.embedding_available = False
+        return self
+
+    def transcribe(self, audio: np.ndarray, prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+        """转写一个窗口，返回窗口内相对时间的片段"""
+        self.load()
+        with self._lock:
+            result = self.asr_backend.transcribe(
+                audio,
+                language=self.language,
+                task="transcribe",
+                fp16=False,
+                verbose=None,
+                initial_prompt=prompt or self.initial_prompt,
+                # 窗口之间依靠提示词衔接上下文，窗口内不再依赖上一段的解码结果
+                condition_on_previous_text=False
+            )
+        return result.get("segments", [])
+
+    def embed(self, audio: np.ndarray) -> Optional[np.ndarray]:
+        """提取一段音频的声纹向量，声纹模型不可用时返回None"""
+        if self.embedding_inference is None:
+            return None
+        import torch
+
+        waveform = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)).unsqueeze(0)
+        with self._lock:
+            return self.embedding_inference({"waveform": waveform, "sample_rate": SAMPLE_RATE})
+
+    def create_session(self, **kwargs) -> "StreamingSession":
+        """新建一个流式会话"""
+        return StreamingSession(self, **kwargs)
+
+
+class StreamingSession:
+    """单个客户端的流式转写会话"""
+
+    def __init__(self, transcriber: StreamingTranscriber, step_seconds: float = 2.0,
+                 max_window_seconds: float = 20.0):
+        """
+        Args:
+            transcriber: 共用的流式转写模型
+            step_seconds: 每积累多少秒新音频解码一次
+            max_window_seconds: 未确认音频的最大时长，超过时强制确认窗口内的片段
+        """
+        self.transcriber = transcriber
+        self.step_samples = int(step_seconds * SAMPLE_RATE)
+        self.max_window_samples = int(max_window_seconds * SAMPLE_RATE)
+        self.clustering = OnlineSpeakerClustering(transcriber.speaker_threshold)
+
+        self._buffer = np.zeros(0, dtype=np.float32)  # 尚未确认的音频
+        self._buffer_offset = 0  # 缓冲区开头在整段音频中的采样点位置
+        self._pending = 0  # 上次解码后新到达的采样点数
+        self._pcm_leftover = b''
+        self._committed_text = []
+        self._last_speaker = "SPEAKER_00"
+        # SocketIO在线程中并发处理事件，按序号重排音频块并串行解码
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._early_chunks = {}
+        self.stopping = False  # 已收到停止请求，仍在接收剩余的音频块
+
+    @property
+    def duration(self) -> float:
+        """已接收音频的总时长（秒）"""
+        return (self._buffer_offset + len(self._buffer)) / SAMPLE_RATE
+
+    def feed(self, pcm: bytes, seq: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        接收一块 16bit PCM 音频
+
+        Args:
+            pcm: 16kHz 单声道 16bit 小端PCM
+            seq: 音频块序号（从0开始），提供时按序号重排后再处理
+
+        Returns:
+            需要发送给客户端的事件列表 [(事件名, 数据)]
+        """
+        with self._lock:
+            if seq is None:
+                return self._append(pcm)
+            self._early_chunks[seq] = pcm
+            events = []
+            while self._next_seq in self._early_chunks:
+                events.extend(self._append(self._early_chunks.pop(self._next_seq)))
+                self._next_seq += 1
+            return events
+
+    def _append(self, pcm: bytes) -> List[Tuple[str, Dict[str, Any]]]:
+        """追加音频，积累满一个步长时解码"""
+        data = self._pcm_leftover + pcm
+        usable = len(data) - len(data) % 2
+        self._pcm_leftover = data[usable:]
+        samples = pcm16_to_float32(data[:usable])
+        self._buffer = np.concatenate([self._buffer, samples])
+        self._pending += len(samples)
+
+        if self._pending < self.step_samples:
+            return []
+        self._pending = 0
+        return self._decode(final=len(self._buffer) >= self.max_window_samples)
+
+    def finish(self, total_chunks: Optional[int] = None, timeout: float = 30.0) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        客户端停止推流：确认缓冲区中剩余的全部片段
+
+        Args:
+            total_chunks: 客户端发送的音频块总数，提供时先等待所有音频块处理完毕
+            timeout: 等待音频块的最长时间（秒）
+        """
+        deadline = time.time() + timeout
+        while total_chunks is not None and self._next_seq < total_chunks and time.time() < deadline:
+            time.sleep(0.05)
+
+        with self._lock:
+            if len(self._buffer) < SAMPLE_RATE * 0.2:
+                return []
+            return self._decode(final=True, flush=True)
+
+    def _decode(self, final: bool = False, flush: bool = False) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        解码未确认的缓冲区
+
+        除最后一个片段外的其余片段已经稳定，确认为最终结果；最后一个片段可能还在说，
+        作为临时结果返回。缓冲区超过最大时长（final）或停止推流（flush）时全部确认
+        """
+        offset = self._buffer_offset / SAMPLE_RATE
+        prompt = "".join(self._committed_text)[-200:] or None
+        segments = self.transcriber.transcribe(self._buffer, prompt)
+        segments = [seg for seg in segments if seg['text'].strip()]
+
+        buffer_seconds = len(self._buffer) / SAMPLE_RATE
+        if flush or (final and len(segments) <= 1):
+            stable, tentative = segments, []
+        else:
+            stable, tentative = segments[:-1], segments[-1:]
+
+        events = []
+        commit_seconds = 0.0
+        for seg in stable:
+            start = min(seg['start'], buffer_seconds)
+            end = min(seg['end'], buffer_seconds)
+            speaker = self._speaker_for(start, end)
+            text = seg['text'].strip()
+            self._committed_text.append(text)
+            events.append(('stream_final', {
+                'speaker': speaker,
+                'start': offset + start,
+                'end': offset + end,
+                'text': text
+            }))
+            commit_seconds = end
+
+        if flush or (final and not segments):
+            commit_seconds = buffer_seconds
+        if commit_seconds > 0:
+            commit = int(commit_seconds * SAMPLE_RATE)
+            self._buffer = self._buffer[commit:]
+            self._buffer_offset += commit
+
+        if tentative:
+            seg = tentative[0]
+            events.append(('stream_partial', {
+                'speaker': self._last_speaker,
+                'start': offset + seg['start'],
+                'end': offset + min(seg['end'], buffer_seconds),
+                'text': seg['text'].strip()
+            }))
+        return events
+
+    def _speaker_for(self, start: float, end: float) -> str:
+        """对已确认的片段提取声纹并在线聚类"""
+        if end - start >= MIN_EMBEDDING_SECONDS:
+            audio = self._buffer[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+            embedding = self.transcriber.embed(audio)
+            if embedding is not None:
+                self._last_speaker = self.clustering.assign(embedding)
+        return self._last_speaker
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""模块都在 audio2char 目录下平铺，测试直接按模块名导入"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
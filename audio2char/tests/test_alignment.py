@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""区间索引匹配与逐个扫描的参考实现结果一致"""
+
+import random
+
+import pytest
+
+import alignment
+from alignment import TranscriptIndex, find_matching_transcript, assign_words_to_speakers
+
+
+def random_segments(rng, count, duration=120.0, max_length=8.0):
+    """随机生成相互重叠的片段，包括零时长和完全相同的片段"""
+    segments = []
+    for i in range(count):
+        start = round(rng.uniform(0, duration), 2)
+        length = rng.choice([0.0, round(rng.uniform(0.05, max_length), 2)]) if rng.random() < 0.05 \
+            else round(rng.uniform(0.05, max_length), 2)
+        segments.append({'start': start, 'end': start + length, 'text': f"片段{i}"})
+    # 完全相同的时间段，检验重叠比例相同时的排序
+    segments.extend(dict(seg, text=seg['text'] + "副本") for seg in segments[:count // 10])
+    rng.shuffle(segments)
+    return segments
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 0.8])
+def test_match_equals_linear_scan(seed, threshold):
+    rng = random.Random(seed)
+    transcript = random_segments(rng, rng.randint(0, 80))
+    turns = [(seg['start'], seg['end']) for seg in random_segments(rng, rng.randint(1, 60), max_length=15.0)]
+
+    expected = [find_matching_transcript(start, end, transcript, overlap_threshold=threshold)
+                for start, end in turns]
+    assert TranscriptIndex(transcript).match(turns, overlap_threshold=threshold) == expected
+
+
+def test_match_in_small_batches(monkeypatch):
+    """候选对超过单批上限时分批计算，结果不变"""
+    monkeypatch.setattr(alignment, 'MAX_PAIRS_PER_BATCH', 3)
+    rng = random.Random(7)
+    transcript = random_segments(rng, 50)
+    turns = [(seg['start'], seg['end']) for seg in random_segments(rng, 40, max_length=20.0)]
+
+    expected = [find_matching_transcript(start, end, transcript) for start, end in turns]
+    assert TranscriptIndex(transcript).match(turns) == expected
+
+
+def reference_assign(words, speaker_segments):
+    """逐词扫描全部时间段的参考实现"""
+    turns = sorted(((seg['start'], seg['end'], speaker, i)
+                    for i, (speaker, seg) in enumerate((speaker, seg) for speaker, segments in speaker_segments.items()
+                                                       for seg in segments)),
+                   key=lambda turn: (turn[0], turn[3]))
+    if not turns:
+        return [(None, 0.0)] * len(words)
+
+    result = []
+    for word in words:
+        best = None
+        for start, end, speaker, _ in turns:
+            overlap = min(word['end'], end) - max(word['start'], start)
+            # 重叠相同时保留开始较早的时间段
+            if overlap > 0 and (best is None or overlap > best[1]):
+                best = (speaker, overlap)
+        if best is not None:
+            result.append(best)
+            continue
+
+        # 没有重叠：之前结束最晚的时间段与之后最近开始的时间段，取距离词中点较近的一个（相等时取之前的）
+        middle = (word['start'] + word['end']) / 2
+        preceding = [turn for turn in turns if turn[0] < middle]
+        following = [turn for turn in turns if turn[0] >= middle]
+        before = max(preceding, key=lambda turn: turn[1]) if preceding else None
+        after = following[0] if following else None
+        if after is None or (before is not None and middle - before[1] <= after[0] - middle):
+            result.append((before[2], 0.0))
+        else:
+            result.append((after[2], 0.0))
+    return result
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_assign_words_equals_reference(seed):
+    rng = random.Random(seed)
+    speaker_segments = {}
+    for seg in random_segments(rng, rng.randint(1, 25), duration=60.0, max_length=5.0):
+        speaker_segments.setdefault(f"SPEAKER_0{rng.randint(0, 3)}", []).append(seg)
+    # 词分布在整段音频及其前后，包括落在时间段间隙中、需要按最近时间段分配的词
+    words = []
+    for i in range(rng.randint(0, 150)):
+        start = round(rng.uniform(-5, 70), 2)
+        words.append({'word': f"词{i}", 'start': start, 'end': start + round(rng.uniform(0, 0.6), 2)})
+
+    assert assign_words_to_speakers(words, speaker_segments) == reference_assign(words, speaker_segments)
+
+
+def test_assign_words_in_gap_goes_to_nearest_turn():
+    speaker_segments = {
+        'A': [{'start': 0.0, 'end': 1.0}],
+        'B': [{'start': 3.0, 'end': 4.0}]
+    }
+    words = [
+        {'word': '近A', 'start': 1.2, 'end': 1.4},
+        {'word': '近B', 'start': 2.6, 'end': 2.8},
+        {'word': '正中', 'start': 1.9, 'end': 2.1},
+        {'word': '之后', 'start': 5.0, 'end': 5.5}
+    ]
+    assert [speaker for speaker, _ in assign_words_to_speakers(words, speaker_segments)] == ['A', 'B', 'A', 'B']
+    assert assign_words_to_speakers(words, {}) == [(None, 0.0)] * len(words)
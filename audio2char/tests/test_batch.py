@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""批量转写：按 batch_state.jsonl 断点续跑，已有可复用结果的文件不提前解码"""
+
+import json
+import os
+from contextlib import contextmanager
+
+import pytest
+
+# batch 经由 main 在导入时加载 whisper、pyannote 和 torch
+for module in ('torch', 'whisper', 'pyannote.audio'):
+    pytest.importorskip(module)
+
+import batch
+from batch import BatchRunner, collect_items, STATE_FILE
+
+
+class FakePipeline:
+    """记录解码和处理调用的流水线，输出目录中已有汇总文件时视为结果可复用"""
+
+    decoded = []
+    runs = []
+    failing = set()
+
+    def __init__(self, model_size='base', **kwargs):
+        self.config = dict(kwargs, model_size=model_size)
+
+    @contextmanager
+    def job_settings(self, settings=None):
+        yield self.config
+
+    def needs_decode(self, audio_file, output_dir=None):
+        return not os.path.exists(os.path.join(output_dir, "summary.txt"))
+
+    def convert(self, audio_file):
+        FakePipeline.decoded.append(os.path.basename(audio_file))
+        return "waveform:" + os.path.basename(audio_file)
+
+    def run(self, audio_file, output_dir=None, settings=None, waveform=None):
+        FakePipeline.runs.append((os.path.basename(audio_file), waveform))
+        if os.path.basename(audio_file) in FakePipeline.failing:
+            raise RuntimeError("解码失败")
+        os.makedirs(output_dir, exist_ok=True)
+        summary_file = os.path.join(output_dir, "summary.txt")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write("汇总")
+        return {'summary_file': summary_file}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(batch, 'TranscriptionPipeline', FakePipeline)
+    FakePipeline.decoded, FakePipeline.runs, FakePipeline.failing = [], [], set()
+    return FakePipeline()
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    audio_dir = tmp_path / "recordings"
+    audio_dir.mkdir()
+    for name in ("a.wav", "b.wav", "c.wav"):
+        (audio_dir / name).write_bytes(b'RIFF' + name.encode() * 100)
+    output_root = str(tmp_path / "batch_outputs")
+    return collect_items([str(audio_dir)], output_root), output_root
+
+
+def processed(runs):
+    return sorted(name for name, _ in runs)
+
+
+def test_resume_skips_finished_files(pipeline, recordings):
+    items, output_root = recordings
+    summary = BatchRunner(pipeline, output_root).run(items)
+    assert (summary['done'], summary['skipped']) == (3, 0)
+    # 提前解码的波形交给流水线
+    assert FakePipeline.runs == [(name, "waveform:" + name) for name in ("a.wav", "b.wav", "c.wav")]
+
+    FakePipeline.runs.clear()
+    summary = BatchRunner(pipeline, output_root).run(items)
+    assert (summary['done'], summary['skipped']) == (0, 3)
+    assert FakePipeline.runs == []
+
+    with open(os.path.join(output_root, STATE_FILE), 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['status'] for record in records] == ['done'] * 3
+    assert all({'size', 'mtime', 'summary_file'} <= set(record) for record in records)
+
+
+@pytest.mark.parametrize("change", ['size', 'mtime', 'summary_file'])
+def test_resume_reprocesses_changed_file(pipeline, recordings, change):
+    items, output_root = recordings
+    BatchRunner(pipeline, output_root).run(items)
+    FakePipeline.runs.clear()
+
+    audio_file = items[1]['audio']
+    if change == 'size':
+        with open(audio_file, 'ab') as f:
+            f.write(b'\x00')
+    elif change == 'mtime':
+        stat = os.stat(audio_file)
+        os.utime(audio_file, (stat.st_atime, stat.st_mtime + 10))
+    else:
+        os.remove(os.path.join(items[1]['output_dir'], "summary.txt"))
+
+    summary = BatchRunner(pipeline, output_root).run(items)
+    assert (summary['done'], summary['skipped']) == (1, 2)
+    assert processed(FakePipeline.runs) == ["b.wav"]
+
+
+def test_failed_file_retried_and_partial_state_line_ignored(pipeline, recordings):
+    items, output_root = recordings
+    FakePipeline.failing = {"b.wav"}
+    summary = BatchRunner(pipeline, output_root).run(items)
+    assert (summary['done'], summary['failed']) == (2, 1)
+
+    # 中断时写了一半的最后一行
+    with open(os.path.join(output_root, STATE_FILE), 'a', encoding='utf-8') as f:
+        f.write('{"audio": "')
+    FakePipeline.failing = set()
+    FakePipeline.runs.clear()
+    summary = BatchRunner(pipeline, output_root).run(items)
+    assert (summary['done'], summary['skipped']) == (1, 2)
+    assert processed(FakePipeline.runs) == ["b.wav"]
+
+
+def test_prefetch_skips_decode_when_results_reusable(pipeline, recordings):
+    items, output_root = recordings
+    BatchRunner(pipeline, output_root).run(items[:2])
+    FakePipeline.decoded.clear()
+    FakePipeline.runs.clear()
+
+    # 不按状态文件跳过：前两个文件的结果可复用，只有第三个需要解码
+    summary = BatchRunner(pipeline, output_root, resume=False).run(items)
+    assert summary['done'] == 3
+    assert FakePipeline.decoded == ["c.wav"]
+    assert FakePipeline.runs == [("a.wav", None), ("b.wav", None), ("c.wav", "waveform:c.wav")]
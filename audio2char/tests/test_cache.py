@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""结果缓存：原子写入、命中统计和按最近使用时间淘汰"""
+
+import os
+
+import numpy as np
+import pytest
+
+from cache import ResultCache
+
+
+def cache_files(cache):
+    return sorted(name for _, _, files in os.walk(cache.cache_dir) for name in files)
+
+
+def age(cache, key, ext, seconds):
+    """把条目的最近使用时间调早，避免依赖文件系统的时间精度"""
+    path = cache._path(key, ext)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_json_and_waveform_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    cache.put_json("a" * 64, {'segments': [{'text': '你好', 'start': 0.5}]})
+    waveform = np.linspace(-1, 1, 1600, dtype=np.float32)
+    cache.put_waveform("b" * 64, waveform)
+
+    assert cache.get_json("a" * 64) == {'segments': [{'text': '你好', 'start': 0.5}]}
+    np.testing.assert_array_equal(cache.get_waveform("b" * 64), waveform)
+    np.testing.assert_array_equal(cache.get_waveform("b" * 64, mmap=True), waveform)
+
+
+def test_hit_and_miss_stats(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    assert cache.get_json("missing") is None
+    cache.put_json("key", [1, 2, 3])
+    assert cache.get_json("key") == [1, 2, 3]
+    assert cache.get_json("key") == [1, 2, 3]
+    # contains() 只查询是否存在，不计入统计
+    assert cache.contains("key") and not cache.contains("other")
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 1)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+
+def test_failed_write_leaves_no_partial_entry(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    cache.put_json("key", {'version': 1})
+
+    def broken(f):
+        f.write(b'{"version": ')
+        raise IOError("磁盘已满")
+
+    cache._store("key", '.json', broken)
+    cache._store("new", '.json', broken)
+
+    # 原有条目保持完整，新条目不存在，也没有残留的临时文件
+    assert cache.get_json("key") == {'version': 1}
+    assert cache.get_json("new") is None
+    assert not any(name.endswith('.tmp') for name in cache_files(cache))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    entry = b'x' * 400 * 1024
+    # 两个条目在上限内，读取 "used" 刷新其使用时间
+    cache = ResultCache(str(tmp_path / "cache"), max_size_mb=1)
+    cache._store("old", '.json', lambda f: f.write(entry))
+    cache._store("used", '.json', lambda f: f.write(entry))
+    age(cache, "old", '.json', 100)
+    age(cache, "used", '.json', 90)
+    cache.get_json("used")
+
+    # 写入第三个条目超过上限，淘汰最久未使用的 "old"
+    cache._store("new", '.json', lambda f: f.write(entry))
+    assert not cache.contains("old")
+    assert cache.contains("used") and cache.contains("new")
+    assert cache.stats()['size_mb'] <= 1
+
+
+def test_store_does_not_scan_below_limit(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache"), max_size_mb=1)
+    cache.put_json("first", {'n': 0})
+
+    scans = []
+    original = cache._entries
+    monkeypatch.setattr(cache, '_entries', lambda: scans.append(1) or original())
+    for i in range(20):
+        cache.put_json(f"key{i}", {'n': i})
+    # 覆盖已有条目时按大小差值累加
+    cache.put_json("key0", {'n': 'x' * 100})
+    assert scans == []
+
+    # 超过上限时才扫描并淘汰，之后总大小与磁盘一致
+    cache._store("big", '.json', lambda f: f.write(b'x' * 1024 * 1024))
+    assert scans
+    assert cache._size == sum(size for _, size, _ in original())
+    assert cache._size <= cache.max_size_bytes
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""时间窗口去重与原先逐个比较全部已保留片段的实现结果一致"""
+
+import random
+
+import pytest
+
+# main 在导入时加载 whisper、pyannote 和 torch
+for module in ('torch', 'whisper', 'pyannote.audio'):
+    pytest.importorskip(module)
+
+from main import deduplicate_segments
+
+
+def reference_deduplicate(segments, similarity_threshold=0.8):
+    """原先的实现：每个片段与全部已保留片段比较"""
+    if not segments:
+        return segments
+
+    segments = sorted(segments, key=lambda x: x['start'])
+
+    def text_similarity(text1, text2):
+        if not text1 or not text2:
+            return 0.0
+        set1 = set(text1)
+        set2 = set(text2)
+        union = set1.union(set2)
+        if not union:
+            return 0.0
+        return len(set1.intersection(set2)) / len(union)
+
+    deduplicated = []
+    for current_seg in segments:
+        is_duplicate = False
+        for prev_seg in deduplicated:
+            similarity = text_similarity(current_seg['text'], prev_seg['text'])
+            if similarity > similarity_threshold and abs(current_seg['start'] - prev_seg['start']) < 5.0:
+                is_duplicate = True
+                break
+        if not is_duplicate:
+            deduplicated.append(current_seg)
+    return deduplicated
+
+
+def random_segments(rng, count):
+    """随机生成重叠片段：文本取自少量词汇，重复和近似重复的片段很多，包括空文本"""
+    vocabulary = ["你好", "今天", "市场", "投资", "科技", "利率", "我们", "讨论", ""]
+    segments = []
+    for i in range(count):
+        start = round(rng.uniform(0, 60), 1)
+        text = "".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 3)))
+        segments.append({'id': i, 'start': start, 'end': start + rng.uniform(0.5, 4), 'text': text})
+    # 同一时间的完全重复片段，以及恰好相隔5秒的片段
+    segments.extend(dict(seg, id=seg['id'] + 1000) for seg in segments[:count // 4])
+    segments.extend(dict(seg, id=seg['id'] + 2000, start=seg['start'] + 5.0) for seg in segments[:count // 8])
+    rng.shuffle(segments)
+    return segments
+
+
+@pytest.mark.parametrize("seed", range(30))
+@pytest.mark.parametrize("threshold", [0.3, 0.8])
+def test_deduplicate_equals_full_scan(seed, threshold):
+    rng = random.Random(seed)
+    segments = random_segments(rng, rng.randint(0, 120))
+    expected = reference_deduplicate(segments, similarity_threshold=threshold)
+    assert deduplicate_segments(segments, similarity_threshold=threshold) == expected
+
+
+def test_deduplicate_keeps_repeats_outside_window():
+    segments = [
+        {'start': 0.0, 'end': 1.0, 'text': '你好'},
+        {'start': 1.0, 'end': 2.0, 'text': '你好'},
+        {'start': 5.0, 'end': 6.0, 'text': '你好'}
+    ]
+    assert [seg['start'] for seg in deduplicate_segments(segments)] == [0.0, 5.0]
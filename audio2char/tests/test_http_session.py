@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""共享HTTP会话的重试规则：429和5xx重试到 HTTP_MAX_RETRIES 次，其他4xx和读取超时不重试"""
+
+import asyncio
+
+import pytest
+import requests
+import urllib3
+
+import http_session
+from http_session import create_session, apost_json, run_async, _start_stub_server
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "你好"}]}
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server, stats = _start_stub_server(**kwargs)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions", stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_until_success(stub, status):
+    url, stats = stub(fail_first=2, status=status)
+    response = create_session(max_retries=3, backoff_factor=0).post(url, json=PAYLOAD, timeout=5)
+    assert response.status_code == 200
+    assert stats['requests'] == 3
+
+
+def test_retries_up_to_max_retries(stub):
+    url, stats = stub(fail_first=100, status=503)
+    # 重试次数取自 HTTP_MAX_RETRIES，用尽后返回最后一次的响应
+    response = create_session(backoff_factor=0).post(url, json=PAYLOAD, timeout=5)
+    assert response.status_code == 503
+    assert stats['requests'] == http_session.DEFAULT_MAX_RETRIES + 1
+
+
+def test_default_retries_follow_config():
+    adapter = create_session().get_adapter("http://127.0.0.1")
+    assert adapter.max_retries.total == http_session.DEFAULT_MAX_RETRIES
+    assert adapter.max_retries.read == 0
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_not_retried(stub, status):
+    url, stats = stub(fail_first=100, status=status)
+    response = create_session(max_retries=3, backoff_factor=0).post(url, json=PAYLOAD, timeout=5)
+    assert response.status_code == status
+    assert stats['requests'] == 1
+
+
+def test_read_timeout_not_retried(stub):
+    url, stats = stub(delay=0.5)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        create_session(max_retries=3, backoff_factor=0).post(url, json=PAYLOAD, timeout=0.1)
+    assert stats['requests'] == 1
+
+
+def test_connection_refused_is_retried(monkeypatch):
+    attempts = []
+    connect = urllib3.connection.HTTPConnection.connect
+    monkeypatch.setattr(urllib3.connection.HTTPConnection, 'connect',
+                        lambda self: attempts.append(1) or connect(self))
+    # 端口1上没有服务，连接被拒绝
+    with pytest.raises(requests.exceptions.ConnectionError):
+        create_session(max_retries=2, backoff_factor=0).post("http://127.0.0.1:1/v1/chat/completions",
+                                                             json=PAYLOAD, timeout=5)
+    assert len(attempts) == 3
+
+
+# =================== 异步请求 ===================
+def post_async(url, **kwargs):
+    pytest.importorskip("aiohttp")
+    return run_async(apost_json(url, PAYLOAD, backend="stub", backoff_factor=0, **kwargs)).result(timeout=10)
+
+
+@pytest.mark.parametrize("status", [429, 502])
+def test_async_retries_until_success(stub, status):
+    url, stats = stub(fail_first=2, status=status)
+    assert post_async(url, max_retries=3)[0] == 200
+    assert stats['requests'] == 3
+
+
+def test_async_retries_up_to_max_retries(stub):
+    url, stats = stub(fail_first=100, status=503)
+    assert post_async(url, max_retries=2)[0] == 503
+    assert stats['requests'] == 3
+
+
+def test_async_client_errors_not_retried(stub):
+    url, stats = stub(fail_first=100, status=400)
+    assert post_async(url, max_retries=3)[0] == 400
+    assert stats['requests'] == 1
+
+
+def test_async_read_timeout_not_retried(stub):
+    url, stats = stub(delay=0.5)
+    with pytest.raises(asyncio.TimeoutError):
+        post_async(url, max_retries=3, timeout=0.1)
+    assert stats['requests'] == 1
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""阶段清单：文件未变时复用记录的哈希和阶段结果，参数变化时只有相关阶段失效"""
+
+import os
+
+import pytest
+
+import manifest
+from cache import ResultCache
+from manifest import (load_manifest, save_manifest, audio_fingerprint, load_stage, save_stage, stage_outputs,
+                      MANIFEST_FILE)
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "meeting.wav"
+    path.write_bytes(b'RIFF' + b'\x00' * 4096)
+    return str(path)
+
+
+@pytest.fixture
+def digest_calls(monkeypatch):
+    calls = []
+    original = manifest.file_digest
+    monkeypatch.setattr(manifest, 'file_digest', lambda path: calls.append(path) or original(path))
+    return calls
+
+
+def test_fingerprint_reused_when_file_unchanged(audio_file, digest_calls):
+    first = audio_fingerprint(audio_file)
+    second = audio_fingerprint(audio_file, first)
+    assert second == first
+    assert len(digest_calls) == 1
+
+
+def test_fingerprint_recomputed_when_file_changes(audio_file, tmp_path, digest_calls):
+    first = audio_fingerprint(audio_file)
+
+    # 内容和大小变化
+    with open(audio_file, 'ab') as f:
+        f.write(b'\x01' * 16)
+    changed = audio_fingerprint(audio_file, first)
+    assert changed['sha256'] != first['sha256']
+
+    # 只有修改时间变化
+    stat = os.stat(audio_file)
+    os.utime(audio_file, (stat.st_atime, stat.st_mtime + 10))
+    touched = audio_fingerprint(audio_file, changed)
+    assert touched['mtime'] != changed['mtime']
+
+    # 同样内容的另一个文件
+    other = tmp_path / "copy.wav"
+    other.write_bytes(open(audio_file, 'rb').read())
+    os.utime(other, (stat.st_atime, touched['mtime']))
+    copied = audio_fingerprint(str(other), touched)
+    assert copied['sha256'] == touched['sha256']
+
+    assert len(digest_calls) == 4
+
+
+def test_rerun_reuses_stages_until_setting_changes(audio_file, tmp_path):
+    output_dir = str(tmp_path / "transcripts")
+    os.makedirs(output_dir)
+    diarization = {'speaker_segments': {'SPEAKER_00': [{'start': 0.0, 'end': 1.0, 'duration': 1.0}]}}
+    alignment = {'SPEAKER_00': [{'start': 0.0, 'end': 1.0, 'text': '你好'}]}
+
+    def keys(min_segment_duration):
+        digest = audio_fingerprint(audio_file)['sha256']
+        diarization_key = ResultCache.make_key('diarization', digest, {'max_speakers': 3})
+        return {
+            'diarization': diarization_key,
+            'alignment': ResultCache.make_key('alignment', digest, {
+                'diarization': diarization_key, 'min_segment_duration': min_segment_duration
+            })
+        }
+
+    # 第一次运行：保存各阶段结果和清单
+    first = load_manifest(output_dir)
+    first['audio'] = audio_fingerprint(audio_file, first.get('audio'))
+    first_keys = keys(0.5)
+    save_stage(output_dir, first, 'diarization', first_keys['diarization'], diarization)
+    save_stage(output_dir, first, 'alignment', first_keys['alignment'], alignment)
+    save_manifest(output_dir, first)
+    assert os.path.exists(os.path.join(output_dir, MANIFEST_FILE))
+
+    # 参数不变时重新运行，全部阶段复用
+    rerun = load_manifest(output_dir)
+    assert rerun['audio'] == first['audio']
+    assert load_stage(output_dir, rerun, 'diarization', first_keys['diarization']) == diarization
+    assert load_stage(output_dir, rerun, 'alignment', first_keys['alignment']) == alignment
+
+    # 只修改 min_segment_duration：说话人分离仍复用，对齐失效
+    changed_keys = keys(1.0)
+    assert changed_keys['diarization'] == first_keys['diarization']
+    assert load_stage(output_dir, rerun, 'diarization', changed_keys['diarization']) == diarization
+    assert load_stage(output_dir, rerun, 'alignment', changed_keys['alignment']) is None
+
+    # 阶段结果文件被删除时同样失效
+    os.remove(os.path.join(output_dir, manifest.STAGE_FILES['diarization']))
+    assert load_stage(output_dir, rerun, 'diarization', first_keys['diarization']) is None
+
+
+def test_stage_outputs_require_same_key_and_files(tmp_path):
+    summary = tmp_path / "summary.txt"
+    full = tmp_path / "full_transcript.txt"
+    speaker = tmp_path / "SPEAKER_00_transcript.txt"
+    for path in (summary, full, speaker):
+        path.write_text("内容", encoding='utf-8')
+    result = {'full_transcript_file': str(full), 'summary_file': str(summary),
+              'speaker_files': {'SPEAKER_00': {'transcript': str(speaker)}}}
+    recorded = {'version': manifest.MANIFEST_VERSION, 'stages': {'output': {'key': 'k1', 'result': result}}}
+
+    assert stage_outputs(recorded, 'k1') == result
+    assert stage_outputs(recorded, 'k2') is None
+    speaker.unlink()
+    assert stage_outputs(recorded, 'k1') is None
+
+
+def test_manifest_version_mismatch_starts_empty(tmp_path):
+    save_manifest(str(tmp_path), {'stages': {'diarization': {'key': 'k', 'file': 'diarization.json'}}})
+    assert load_manifest(str(tmp_path))['stages']
+
+    with open(tmp_path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        f.write('{"version": 0, "stages": {"diarization": {}}}')
+    assert load_manifest(str(tmp_path)) == {'version': manifest.MANIFEST_VERSION, 'stages': {}}
+
+
+def test_pipeline_keys_only_invalidate_dependent_stages():
+    """TranscriptionPipeline 的阶段键：对齐参数只影响对齐阶段"""
+    for module in ('torch', 'whisper', 'pyannote.audio'):
+        pytest.importorskip(module)
+    from main import TranscriptionPipeline
+
+    base = TranscriptionPipeline().cache_keys("0" * 64)
+    changed = TranscriptionPipeline(min_segment_duration=1.5).cache_keys("0" * 64)
+    assert changed['diarization'] == base['diarization']
+    assert changed['transcription'] == base['transcription']
+    assert changed['alignment'] != base['alignment']
+
+    other_model = TranscriptionPipeline(model_size='small').cache_keys("0" * 64)
+    assert other_model['diarization'] == base['diarization']
+    assert other_model['transcription'] != base['transcription']
+    assert other_model['alignment'] != base['alignment']